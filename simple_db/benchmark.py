@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.database import Database
+from sql.executor import SQLExecutor
+from sql.parser import SQLParser
+
+# Reproducible benchmarks for the storage, index, join and parser hot paths.
+#
+# Every scale builds the same synthetic data from a fixed seed: a users
+# table and an orders table of that many rows each, orders.user_id pointing
+# at users.id. Each benchmark runs `repeat` times against it and reports the
+# median and best time (ops/s from the median). Results are JSON, and a run can be compared with a
+# saved one to catch regressions:
+#
+#     python3 benchmark.py --scales 1k,100k --output baseline.json
+#     python3 benchmark.py --scales 1k,100k --baseline baseline.json
+#
+# The comparison exits with status 1 when a benchmark got slower than the
+# baseline by more than the tolerance.
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SCALES = ("1k", "10k", "100k")
+# Statements per repetition for the per-statement benchmarks
+OPS = 1_000
+# Slower than the baseline by more than this fraction is a regression
+DEFAULT_TOLERANCE = 0.25
+CITIES = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Malindi", "Kitale"]
+STATUSES = ["open", "paid", "shipped", "cancelled"]
+
+
+def user_rows(n: int, rng: random.Random, start: int = 0) -> List[Tuple[Any, ...]]:
+    return [(i, f"user{i}", rng.randrange(18, 90), rng.choice(CITIES), round(rng.uniform(0, 100), 2))
+            for i in range(start, start + n)]
+
+
+def order_rows(n: int, users: int, rng: random.Random) -> List[Tuple[Any, ...]]:
+    return [(i, rng.randrange(users), round(rng.uniform(1, 500), 2), rng.choice(STATUSES)) for i in range(n)]
+
+
+def parse_scale(scale: str) -> Tuple[str, int]:
+    # "10k" or a plain row count
+    if scale.lower() in SCALES:
+        return scale.lower(), SCALES[scale.lower()]
+    if scale.isdigit() and int(scale) > 0:
+        return scale, int(scale)
+    raise ValueError(f"Unknown scale '{scale}', expected one of {', '.join(SCALES)} or a row count")
+
+
+class Workload:
+    # The database one scale's benchmarks run against, in a temporary directory
+    def __init__(self, rows: int, seed: int, engine: str):
+        self.rows = rows
+        self.engine = engine
+        self.rng = random.Random(seed)
+        self.dir = tempfile.mkdtemp(prefix="simpledb_bench_")
+        self.path = os.path.join(self.dir, "db")
+        self.db = Database(self.path, engine=engine)
+        self.executor = SQLExecutor(self.db)
+        self.executor.execute("CREATE TABLE users (id int PK, name str, age int, city str, score float)")
+        self.executor.execute("CREATE TABLE orders (id int PK, user_id int, amount float, status str)")
+        self.executor.executemany("INSERT INTO users (id, name, age, city, score) VALUES (?, ?, ?, ?, ?)",
+                                  user_rows(rows, self.rng))
+        self.executor.executemany("INSERT INTO orders (id, user_id, amount, status) VALUES (?, ?, ?, ?)",
+                                  order_rows(rows, rows, self.rng))
+        self.db.checkpoint()
+        # Ids for inserts, past every existing row
+        self.next_id = rows
+
+    def keys(self, count: int) -> List[int]:
+        return [self.rng.randrange(self.rows) for _ in range(count)]
+
+    def reopen(self):
+        self.db.close()
+        self.db = Database(self.path, engine=self.engine)
+        self.executor = SQLExecutor(self.db)
+
+    def close(self):
+        self.db.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+# name -> (function, whether the result depends on the table size). A
+# benchmark does its setup, then returns (ops, run): run() is the timed part.
+BENCHMARKS: Dict[str, Tuple[Callable[[Workload], Tuple[int, Callable[[], None]]], bool]] = {}
+
+
+def benchmark(name: str, scaled: bool = True):
+    def register(func):
+        BENCHMARKS[name] = (func, scaled)
+        return func
+    return register
+
+
+@benchmark("bulk_load")
+def bench_bulk_load(w: Workload):
+    rows = user_rows(w.rows, w.rng)
+    if "bulk" in w.db.table_names():
+        w.db.drop_table("bulk")
+    w.executor.execute("CREATE TABLE bulk (id int PK, name str, age int, city str, score float)")
+
+    def run():
+        w.executor.executemany("INSERT INTO bulk (id, name, age, city, score) VALUES (?, ?, ?, ?, ?)", rows)
+    return len(rows), run
+
+
+@benchmark("startup")
+def bench_startup(w: Workload):
+    # Opening the data directory and loading both tables
+    w.db.checkpoint()
+
+    def run():
+        w.reopen()
+        w.db.get_table("users")
+        w.db.get_table("orders")
+    return 1, run
+
+
+@benchmark("point_lookup")
+def bench_point_lookup(w: Workload):
+    keys = w.keys(OPS)
+
+    def run():
+        for key in keys:
+            w.executor.execute("SELECT * FROM users WHERE id = ?", (key,))
+    return len(keys), run
+
+
+@benchmark("full_scan")
+def bench_full_scan(w: Workload):
+    # Filtered scan returning about a tenth of the rows; ops are rows scanned
+    def run():
+        w.executor.execute("SELECT id, name FROM users WHERE score > 90 AND city != 'Thika'")
+    return w.rows, run
+
+
+@benchmark("aggregate")
+def bench_aggregate(w: Workload):
+    def run():
+        w.executor.execute("SELECT city, COUNT(*), AVG(age), MAX(score) FROM users GROUP BY city")
+    return w.rows, run
+
+
+@benchmark("join")
+def bench_join(w: Workload):
+    # About a quarter of the orders, each joined to its user; ops are orders scanned
+    def run():
+        w.executor.execute("SELECT orders.id, users.name FROM orders JOIN users ON orders.user_id = users.id "
+                           "WHERE orders.status = 'open'")
+    return w.rows, run
+
+
+@benchmark("parse", scaled=False)
+def bench_parse(w: Workload):
+    # Distinct statements through a parser without a statement cache
+    rng = random.Random(0)
+    statements = []
+    for i in range(OPS // 4):
+        statements += [
+            f"SELECT id, name FROM users WHERE age > {rng.randrange(90)} AND city = 'Nairobi' ORDER BY id LIMIT {i + 1}",
+            f"INSERT INTO users (id, name, age, city, score) VALUES ({i}, 'user{i}', 30, 'Kisumu', {i}.5)",
+            f"UPDATE orders SET status = 'paid' WHERE id = {i} OR amount BETWEEN {i} AND {i + 10}",
+            f"SELECT city, COUNT(*) FROM users JOIN orders ON users.id = orders.user_id WHERE score >= {i} "
+            f"GROUP BY city HAVING COUNT(*) > {i}",
+        ]
+    parser = SQLParser(cache_size=0)
+
+    def run():
+        for sql in statements:
+            parser.parse(sql)
+    return len(statements), run
+
+
+@benchmark("insert")
+def bench_insert(w: Workload):
+    rows = user_rows(OPS, w.rng, start=w.next_id)
+    w.next_id += OPS
+
+    def run():
+        for row in rows:
+            w.executor.execute("INSERT INTO users (id, name, age, city, score) VALUES (?, ?, ?, ?, ?)", row)
+    return len(rows), run
+
+
+@benchmark("update_by_key")
+def bench_update_by_key(w: Workload):
+    updates = [(round(w.rng.uniform(0, 100), 2), key) for key in w.keys(OPS)]
+
+    def run():
+        for score, key in updates:
+            w.executor.execute("UPDATE users SET score = ? WHERE id = ?", (score, key))
+    return len(updates), run
+
+
+@benchmark("delete_by_key")
+def bench_delete_by_key(w: Workload):
+    # Rows inserted for the purpose, so reads in later repetitions are unaffected
+    rows = user_rows(OPS, w.rng, start=w.next_id)
+    w.next_id += OPS
+    w.executor.executemany("INSERT INTO users (id, name, age, city, score) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def run():
+        for row in rows:
+            w.executor.execute("DELETE FROM users WHERE id = ?", (row[0],))
+    return len(rows), run
+
+
+def run_benchmarks(scales: Sequence[str] = DEFAULT_SCALES, names: Optional[Sequence[str]] = None,
+                   repeat: int = 3, seed: int = 42, engine: str = "json",
+                   progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    names = list(names or BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark '{name}', expected one of {', '.join(BENCHMARKS)}")
+    report: Dict[str, Any] = {"meta": {
+        "python": platform.python_version(), "implementation": platform.python_implementation(),
+        "platform": platform.platform(), "cpus": os.cpu_count(), "engine": engine,
+        "seed": seed, "repeat": repeat, "ops": OPS, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, "results": []}
+    unscaled_done = set()
+    for scale in scales:
+        label, rows = parse_scale(scale)
+        workload = Workload(rows, seed, engine)
+        try:
+            for name in names:
+                func, scaled = BENCHMARKS[name]
+                if not scaled:
+                    if name in unscaled_done:
+                        continue
+                    unscaled_done.add(name)
+                times = []
+                for _ in range(repeat):
+                    ops, run = func(workload)
+                    start = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - start)
+                median = statistics.median(times)
+                result = {"name": name, "scale": label if scaled else "-", "rows": rows if scaled else None,
+                          "ops": ops, "seconds": [round(t, 6) for t in times], "median": round(median, 6),
+                          "best": round(min(times), 6), "ops_per_sec": round(ops / median, 1) if median else None}
+                report["results"].append(result)
+                if progress:
+                    progress(result)
+        finally:
+            workload.close()
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    # One entry per benchmark present in both runs, matched by name and
+    # scale. Runs are compared by their best time, which noise (other
+    # processes, GC) can only make slower, so it is the most repeatable.
+    previous = {(r["name"], r["scale"]): r for r in baseline["results"]}
+    out = []
+    for r in report["results"]:
+        base = previous.get((r["name"], r["scale"]))
+        if base is None or not base["best"]:
+            continue
+        ratio = r["best"] / base["best"]
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 - tolerance:
+            status = "improvement"
+        else:
+            status = "same"
+        out.append({"name": r["name"], "scale": r["scale"], "baseline": base["best"],
+                    "best": r["best"], "ratio": round(ratio, 3), "status": status})
+    return out
+
+
+def format_result(r: Dict[str, Any]) -> str:
+    rate = r["ops_per_sec"]
+    rate = f"{rate:>14,.0f} ops/s" if rate and rate >= 100 else f"{rate:>14.2f} ops/s" if rate else ""
+    return f"{r['name']:<15} {r['scale']:>5} {r['median'] * 1000:>11.2f} ms {rate}"
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'benchmark':<15} {'scale':>5} {'baseline':>11} {'now':>11}  change"]
+    for c in rows:
+        change = f"{(c['ratio'] - 1) * 100:+.1f}%"
+        flag = {"regression": "  REGRESSION", "improvement": "  faster"}.get(c["status"], "")
+        lines.append(f"{c['name']:<15} {c['scale']:>5} {c['baseline'] * 1000:>8.2f} ms "
+                     f"{c['best'] * 1000:>8.2f} ms  {change}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SimpleDB hot paths")
+    parser.add_argument("--scales", default=",".join(DEFAULT_SCALES),
+                        help=f"comma-separated row counts or {', '.join(SCALES)}")
+    parser.add_argument("--only", help=f"comma-separated benchmarks: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engine", default="json", choices=["json", "paged"])
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with the results saved in this file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown fraction reported as a regression")
+    args = parser.parse_args(argv)
+
+    try:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        report = run_benchmarks(args.scales.split(","), args.only.split(",") if args.only else None,
+                                args.repeat, args.seed, args.engine,
+                                progress=lambda r: print(format_result(r), flush=True))
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline is None:
+        return 0
+    comparison = compare(report, baseline, args.tolerance)
+    print()
+    print(format_comparison(comparison))
+    if baseline.get("meta", {}).get("python") != report["meta"]["python"]:
+        print(f"Note: baseline ran on Python {baseline['meta'].get('python')}")
+    return 1 if any(c["status"] == "regression" for c in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,10 @@ from core.database import Database
 def run_repl(db_path="db_data"):
     print("SimpleDB v1.0")
     print(f"Data directory: {db_path}")
-    print("Type 'exit' or 'quit' to close.")
+    print("Type 'exit' or 'quit' to close, '.timing' for the startup report, '.stats' for query counters.")
     
     db = Database(db_path)
-    executor = SQLExecutor(db)
+    executor = SQLExecutor(db, metrics=True)
     
     while True:
         try:
@@ -17,6 +17,12 @@ def run_repl(db_path="db_data"):
                 break
             if not sql.strip():
                 continue
+            if sql.strip() == ".timing":
+                print(db.format_load_report())
+                continue
+            if sql.strip() == ".stats":
+                print(executor.metrics.format())
+                continue
                 
             result = executor.execute(sql)
             print(result)
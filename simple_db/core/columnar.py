@@ -0,0 +1,264 @@
+from array import array
+from collections.abc import MutableSequence
+from itertools import compress
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Column-at-a-time record storage for tables created with layout="columnar".
+#
+# int, float and bool columns are typed arrays (array module: 8-byte ints,
+# doubles, bytes) with a parallel byte per row marking NULLs; str columns
+# are dictionary-encoded: an array of codes into a list of the distinct
+# strings, with -1 for NULL. A value that does not fit its column's array
+# (an int beyond 64 bits) turns that column into a plain list. Float
+# columns store ints as floats.
+#
+# ColumnStore behaves like the list of records a row-layout table keeps in
+# Table.slots (tuples in column order, None for deleted rows), so the table
+# code runs unchanged on it; sql.vectorized reads the arrays directly to
+# filter and aggregate whole columns at once.
+
+TYPECODES = {"int": "q", "float": "d", "bool": "b"}
+# Records produced per step when iterating, bounding the temporary lists
+CHUNK = 4096
+
+
+class NumericVector:
+    def __init__(self, col_type: str):
+        self.col_type = col_type
+        self.values = array(TYPECODES[col_type])
+        self.nulls = bytearray()
+        self.null_count = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def _store(self, val: Any) -> Any:
+        # Float columns hold ints as floats; anything else the array
+        # rejects with TypeError, see ColumnStore._checked
+        if self.col_type == "float" and isinstance(val, int):
+            return float(val)
+        return val
+
+    def append(self, val: Any):
+        if val is None:
+            self.values.append(0)
+            self.nulls.append(1)
+            self.null_count += 1
+        else:
+            self.values.append(self._store(val))
+            self.nulls.append(0)
+
+    def get(self, i: int) -> Any:
+        if self.nulls[i]:
+            return None
+        val = self.values[i]
+        return bool(val) if self.col_type == "bool" else val
+
+    def set(self, i: int, val: Any):
+        if val is None:
+            self.values[i] = 0
+            self.null_count += not self.nulls[i]
+            self.nulls[i] = 1
+        else:
+            self.values[i] = self._store(val)
+            self.null_count -= self.nulls[i]
+            self.nulls[i] = 0
+
+    def delete(self, index):
+        self.null_count -= self.nulls[index].count(1) if isinstance(index, slice) else self.nulls[index]
+        del self.values[index]
+        del self.nulls[index]
+
+    def insert(self, i: int, val: Any):
+        self.values.insert(i, 0 if val is None else self._store(val))
+        self.nulls.insert(i, val is None)
+        self.null_count += val is None
+
+    def to_list(self, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        values = self.values[start:stop]
+        out = list(map(bool, values)) if self.col_type == "bool" else values.tolist()
+        if self.null_count:
+            for i in compress(range(len(out)), self.nulls[start:stop]):
+                out[i] = None
+        return out
+
+
+class DictionaryVector:
+    col_type = "str"
+
+    def __init__(self):
+        self.codes = array("q")
+        self.dictionary: List[str] = []
+        self.code_of: Dict[str, int] = {}
+        # dictionary plus a trailing None, so code -1 decodes to NULL
+        self._decode: List[Optional[str]] = [None]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def encode(self, val: Optional[str]) -> int:
+        if val is None:
+            return -1
+        code = self.code_of.get(val)
+        if code is None:
+            code = self.code_of[val] = len(self.dictionary)
+            self.dictionary.append(val)
+            self._decode.insert(-1, val)
+        return code
+
+    def append(self, val: Any):
+        self.codes.append(self.encode(val))
+
+    def get(self, i: int) -> Any:
+        return self._decode[self.codes[i]]
+
+    def set(self, i: int, val: Any):
+        self.codes[i] = self.encode(val)
+
+    def delete(self, index):
+        del self.codes[index]
+
+    def insert(self, i: int, val: Any):
+        self.codes.insert(i, self.encode(val))
+
+    def to_list(self, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        return list(map(self._decode.__getitem__, self.codes[start:stop]))
+
+
+class ObjectVector:
+    # Fallback for values a typed array cannot hold
+    def __init__(self, col_type: str, values: List[Any]):
+        self.col_type = col_type
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, val: Any):
+        self.values.append(val)
+
+    def get(self, i: int) -> Any:
+        return self.values[i]
+
+    def set(self, i: int, val: Any):
+        self.values[i] = val
+
+    def delete(self, index):
+        del self.values[index]
+
+    def insert(self, i: int, val: Any):
+        self.values.insert(i, val)
+
+    def to_list(self, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        return self.values[start:stop]
+
+
+def make_vector(col_type: str):
+    if col_type in TYPECODES:
+        return NumericVector(col_type)
+    if col_type == "str":
+        return DictionaryVector()
+    return ObjectVector(col_type, [])
+
+
+class ColumnStore(MutableSequence):
+    def __init__(self, col_types: Sequence[Tuple[str, str]], records: Iterable[Optional[tuple]] = ()):
+        # col_types: (name, type) per column, in record order
+        self.names = [name for name, _ in col_types]
+        self.vectors = [make_vector(col_type) for _, col_type in col_types]
+        # 1 per live row, 0 per deleted row
+        self.live = bytearray()
+        self.extend(records)
+
+    def vector(self, name: str):
+        return self.vectors[self.names.index(name)]
+
+    def __len__(self):
+        return len(self.live)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if not self.live[index]:
+            return None
+        return tuple([vector.get(index) for vector in self.vectors])
+
+    def __setitem__(self, index, record):
+        if isinstance(index, slice):
+            raise TypeError("ColumnStore does not support slice assignment")
+        if record is None:
+            self.live[index] = 0
+            return
+        for pos, (vector, val) in enumerate(zip(self.vectors, record)):
+            self._checked(pos, vector.set, index, val)
+        self.live[index] = 1
+
+    def __delitem__(self, index):
+        for vector in self.vectors:
+            vector.delete(index)
+        del self.live[index]
+
+    def insert(self, index: int, record: Optional[tuple]):
+        if index < 0:
+            index += len(self)
+        index = max(0, min(index, len(self)))
+        if index == len(self):
+            self.append(record)
+            return
+        for pos, (vector, val) in enumerate(zip(self.vectors, record or (None,) * len(self.vectors))):
+            self._checked(pos, vector.insert, index, val)
+        self.live.insert(index, 0 if record is None else 1)
+
+    def append(self, record: Optional[tuple]):
+        if record is None:
+            record = (None,) * len(self.vectors)
+            self.live.append(0)
+        else:
+            self.live.append(1)
+        for pos, (vector, val) in enumerate(zip(self.vectors, record)):
+            self._checked(pos, vector.append, val)
+
+    def extend(self, records: Iterable[Optional[tuple]]):
+        for record in records:
+            self.append(record)
+
+    def _checked(self, pos: int, method, *args):
+        try:
+            method(*args)
+        except (OverflowError, TypeError):
+            # A value the array cannot hold (an int beyond 64 bits, or a
+            # value of another type written by UPDATE): keep this column as a list
+            vector = self.vectors[pos]
+            self.vectors[pos] = ObjectVector(vector.col_type, vector.to_list())
+            getattr(self.vectors[pos], method.__name__)(*args)
+
+    def __iter__(self) -> Iterator[Optional[tuple]]:
+        # Decodes a chunk of every column at a time and zips the chunks into
+        # records, so the per-row work stays in C
+        for start in range(0, len(self), CHUNK):
+            stop = start + CHUNK
+            records = zip(*[vector.to_list(start, stop) for vector in self.vectors])
+            live = self.live[start:stop]
+            if live.count(0):
+                for ok, record in zip(live, records):
+                    yield record if ok else None
+            else:
+                yield from records
+
+    def column_values(self, name: str) -> Iterator[Any]:
+        # One column for every slot, deleted rows included; used to build indexes
+        vector = self.vector(name)
+        for start in range(0, len(self), CHUNK):
+            yield from vector.to_list(start, start + CHUNK)
+
+    def nbytes(self) -> int:
+        # Approximate memory held by the column data
+        total = len(self.live)
+        for vector in self.vectors:
+            if isinstance(vector, NumericVector):
+                total += vector.values.itemsize * len(vector.values) + len(vector.nulls)
+            elif isinstance(vector, DictionaryVector):
+                total += vector.codes.itemsize * len(vector.codes) + sum(len(s) + 49 for s in vector.dictionary)
+            else:
+                total += 8 * len(vector.values)
+        return total
@@ -0,0 +1,176 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class HashIndex:
+    # value -> row id for unique indexes, value -> set of row ids otherwise.
+    # NULLs are never indexed.
+    kind = "hash"
+
+    def __init__(self, name: str, column: str, unique: bool = False):
+        self.name = name
+        self.column = column
+        self.unique = unique
+        self.map: Dict[Any, Any] = {}
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.map
+
+    def __len__(self):
+        return len(self.map)
+
+    def add(self, value: Any, pos: int):
+        if value is None:
+            return
+        if self.unique:
+            self.map[value] = pos
+        else:
+            self.map.setdefault(value, set()).add(pos)
+
+    def remove(self, value: Any, pos: int):
+        if value is None or value not in self.map:
+            return
+        if self.unique:
+            if self.map[value] == pos:
+                del self.map[value]
+        else:
+            positions: Set[int] = self.map[value]
+            positions.discard(pos)
+            if not positions:
+                del self.map[value]
+
+    def build(self, pairs: Iterable[Tuple[int, Any]]):
+        # Bulk load from (row id, column value) pairs
+        for pos, value in pairs:
+            self.add(value, pos)
+
+    def lookup(self, value: Any) -> List[int]:
+        found = self.map.get(value)
+        if found is None:
+            return []
+        if self.unique:
+            return [found]
+        return sorted(found)
+
+    def clear(self):
+        self.map = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "column": self.column, "kind": self.kind}
+
+
+class SortedIndex:
+    # Ordered index: a sorted array of the distinct values plus value -> set of
+    # row ids. Supports point lookups, range scans, ordered scans and
+    # O(log n) min/max. NULL rows are kept aside so ordered scans still see them.
+    kind = "sorted"
+
+    def __init__(self, name: str, column: str, unique: bool = False):
+        self.name = name
+        self.column = column
+        self.unique = unique
+        self.keys: List[Any] = []
+        self.map: Dict[Any, Set[int]] = {}
+        self.nulls: Set[int] = set()
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.map
+
+    def __len__(self):
+        return len(self.map)
+
+    def add(self, value: Any, pos: int):
+        if value is None:
+            self.nulls.add(pos)
+            return
+        positions = self.map.get(value)
+        if positions is None:
+            # Found before anything changes, so a key that cannot be ordered
+            # with the others leaves the index as it was
+            at = self._position(value)
+            self.keys.insert(at, value)
+            positions = self.map[value] = set()
+        positions.add(pos)
+
+    def _position(self, value: Any) -> int:
+        try:
+            return bisect_left(self.keys, value)
+        except TypeError:
+            raise ValueError(f"Value {value!r} cannot be ordered with the values in index {self.name}") from None
+
+    def remove(self, value: Any, pos: int):
+        if value is None:
+            self.nulls.discard(pos)
+            return
+        positions = self.map.get(value)
+        if positions is None:
+            return
+        positions.discard(pos)
+        if not positions:
+            del self.map[value]
+            del self.keys[bisect_left(self.keys, value)]
+
+    def build(self, pairs: Iterable[Tuple[int, Any]]):
+        # Bulk load: sort the new distinct values once and merge them into
+        # keys (timsort merges the two sorted runs in linear time) instead of
+        # paying an insort per value. The new values are sorted and checked
+        # against the existing keys before the index changes.
+        pairs = list(pairs)
+        try:
+            new_keys = sorted({value for _, value in pairs if value is not None and value not in self.map})
+        except TypeError:
+            raise ValueError(f"Values of mixed types cannot be ordered in index {self.name}") from None
+        if new_keys and self.keys:
+            self._position(new_keys[0])
+        for pos, value in pairs:
+            if value is None:
+                self.nulls.add(pos)
+            else:
+                self.map.setdefault(value, set()).add(pos)
+        if new_keys:
+            self.keys.extend(new_keys)
+            self.keys.sort()
+
+    def lookup(self, value: Any) -> List[int]:
+        return sorted(self.map.get(value, ()))
+
+    def range(self, low: Any = None, high: Any = None, low_inclusive: bool = True,
+              high_inclusive: bool = True, reverse: bool = False) -> Iterator[int]:
+        # Row ids with low <(=) value <(=) high in value order; None means unbounded
+        keys = self.keys
+        start = 0 if low is None else (bisect_left(keys, low) if low_inclusive else bisect_right(keys, low))
+        end = len(keys) if high is None else (bisect_right(keys, high) if high_inclusive else bisect_left(keys, high))
+        span = range(end - 1, start - 1, -1) if reverse else range(start, end)
+        for i in span:
+            yield from sorted(self.map[keys[i]], reverse=reverse)
+
+    def ordered(self, reverse: bool = False) -> Iterator[int]:
+        # Every row id in value order, NULLs first (last when reversed)
+        if not reverse:
+            yield from sorted(self.nulls)
+        yield from self.range(reverse=reverse)
+        if reverse:
+            yield from sorted(self.nulls, reverse=True)
+
+    def min(self) -> Optional[Any]:
+        return self.keys[0] if self.keys else None
+
+    def max(self) -> Optional[Any]:
+        return self.keys[-1] if self.keys else None
+
+    def clear(self):
+        self.keys = []
+        self.map = {}
+        self.nulls = set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "column": self.column, "kind": self.kind}
+
+
+INDEX_KINDS = {"hash": HashIndex, "sorted": SortedIndex, "btree": SortedIndex}
+
+
+def make_index(name: str, column: str, kind: str = "hash", unique: bool = False):
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index type '{kind}'")
+    return INDEX_KINDS[kind](name, column, unique)
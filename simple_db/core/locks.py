@@ -0,0 +1,82 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class RWLock:
+    # Many readers or one writer. Waiting writers block new readers so a
+    # stream of SELECTs cannot starve an UPDATE, except that a thread already
+    # holding the lock may always take it again for reading, and the writer
+    # may take it again for writing (a transaction reads and writes the
+    # tables it has locked). Upgrading a read lock to a write lock would
+    # deadlock against another upgrader and is refused.
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self, owner: Optional[int] = None):
+        # owner: the thread that acquired the lock, when releasing on its behalf
+        me = owner or threading.get_ident()
+        with self._cond:
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                self._cond.notify_all()
+
+    def acquire_write(self, timeout: Optional[float] = None):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise ValueError("Cannot write a table while reading it in the same thread")
+            self._waiting_writers += 1
+            try:
+                acquired = self._cond.wait_for(lambda: self._writer is None and not self._readers, timeout)
+            finally:
+                self._waiting_writers -= 1
+            if not acquired:
+                # Readers held back for this writer may go ahead now
+                self._cond.notify_all()
+                raise ValueError("Lock wait timeout exceeded")
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self, timeout: Optional[float] = None):
+        self.acquire_write(timeout)
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,83 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+from .storage import atomic_file
+
+MANIFEST_FILE = "MANIFEST"
+DELTA_EXTENSION = ".delta"
+
+
+class Manifest:
+    # The files that make up the last complete checkpoint. Per table, or
+    # per partition of a partitioned table (see below):
+    #   file        - the table image
+    #   delta       - log records committed after the image was written,
+    #                 one JSON record per line (None when there are none)
+    #   delta_bytes - how much of the delta file belongs to the checkpoint;
+    #                 anything after it is from a checkpoint that never finished
+    #   delta_rows  - rows those records change, to decide when rewriting
+    #                 the image is cheaper than replaying the delta
+    # The manifest is replaced atomically, so a checkpoint is either fully
+    # visible after a crash or not at all, and startup does not have to scan
+    # the directory or open any table file.
+    #
+    # A partitioned table's entry holds "partition_by", the table's planner
+    # "statistics" and "partitions": one entry as above per partition.
+    def __init__(self, path: str):
+        self.path = path
+        # lsn of the last checkpoint
+        self.lsn = 0
+        self.tables: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        self.lsn = data["lsn"]
+        self.tables = data["tables"]
+        return True
+
+    def save(self, fsync: bool = True):
+        with atomic_file(self.path, 'w', fsync) as f:
+            json.dump({"lsn": self.lsn, "tables": self.tables}, f, indent=2, sort_keys=True)
+
+    def set_image(self, name: str, filename: str, part: Optional[int] = None):
+        # A new image contains everything: the table (or partition) starts without a delta
+        segment = {"file": filename, "delta": None, "delta_bytes": 0, "delta_rows": 0}
+        if part is None:
+            self.tables[name] = segment
+        else:
+            self.tables[name]["partitions"][part] = segment
+
+    def set_partitioned(self, name: str, partition_by: str, partitions: int):
+        self.tables[name] = {"partition_by": partition_by, "statistics": None, "partitions": [None] * partitions}
+
+
+def record_rows(record: Dict[str, Any]) -> int:
+    # Rows a log record changes
+    op = record.get("op")
+    if op == "insert_many":
+        return len(record.get("records") or record.get("values") or ())
+    if op in ("update", "delete"):
+        return len(record.get("rows") or ())
+    return 1
+
+
+def append_records(path: str, offset: int, records: List[Dict[str, Any]], fsync: bool = True) -> int:
+    # Appends records to the delta file at path, dropping whatever an
+    # unfinished checkpoint left after offset. Returns the new length.
+    with open(path, 'ab') as f:
+        f.truncate(offset)
+        f.write("".join(json.dumps(r, separators=(',', ':')) + "\n" for r in records).encode('utf-8'))
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+        return f.tell()
+
+
+def read_records(path: str, length: Optional[int] = None) -> List[Dict[str, Any]]:
+    # The first length bytes of a delta file as log records
+    with open(path, 'rb') as f:
+        data = f.read() if length is None else f.read(length)
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line.strip()]
@@ -0,0 +1,345 @@
+import heapq
+import itertools
+import zlib
+from collections.abc import Sequence
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from .table import Column, Record, Table, _true, _versions
+
+
+def partition_of(value: Any, count: int) -> int:
+    # The partition a value of the partition column belongs to. Strings are
+    # hashed with crc32 because hash() of a str differs between processes;
+    # numbers hash the same everywhere, 1 and 1.0 alike.
+    if isinstance(value, str):
+        return zlib.crc32(value.encode('utf-8')) % count
+    if value is None:
+        return 0
+    return hash(value) % count
+
+
+class PartitionedSlots(Sequence):
+    # Read-only view of a partitioned table's records by global row id. Ids
+    # past the end of a shorter partition read as None, like tombstones.
+    def __init__(self, slots: List[Sequence]):
+        self._slots = slots
+        self._count = len(slots)
+
+    def __len__(self):
+        return self._count * max(len(slots) for slots in self._slots)
+
+    def __getitem__(self, rid):
+        if isinstance(rid, slice):
+            return [self[i] for i in range(*rid.indices(len(self)))]
+        if rid < 0:
+            rid += len(self)
+        local, part = divmod(rid, self._count)
+        slots = self._slots[part]
+        return slots[local] if local < len(slots) else None
+
+    def __iter__(self) -> Iterator[Optional[Record]]:
+        for group in itertools.zip_longest(*self._slots):
+            yield from group
+
+
+class PartitionedIndex:
+    # One index of a partitioned table over global row ids, answered from
+    # the partitions' own indexes. Values of the partition column are only
+    # looked up in the partition they hash to.
+    def __init__(self, table: "PartitionedTable", name: str):
+        self.table = table
+        self.name = name
+        first = table.parts[0].indexes[name]
+        self.column = first.column
+        self.kind = first.kind
+        self.unique = first.unique
+        self.pruned = first.column == table.partition_by
+
+    def _indexes(self) -> list:
+        return [part.indexes[self.name] for part in self.table.parts]
+
+    def __contains__(self, value: Any) -> bool:
+        if self.pruned:
+            return value in self.table.part_for(value).indexes[self.name]
+        return any(value in index for index in self._indexes())
+
+    def __len__(self):
+        # Distinct values: partitions share none of the partition column's
+        # or a unique column's; otherwise the largest partition is a cheap guess
+        sizes = [len(index) for index in self._indexes()]
+        return sum(sizes) if self.pruned or self.unique else max(sizes)
+
+    def lookup(self, value: Any) -> List[int]:
+        count = self.table.partition_count
+        if self.pruned:
+            part = partition_of(value, count)
+            return [local * count + part for local in self.table.parts[part].indexes[self.name].lookup(value)]
+        return sorted(local * count + part for part, index in enumerate(self._indexes())
+                      for local in index.lookup(value))
+
+    def range(self, low: Any = None, high: Any = None, low_inclusive: bool = True,
+              high_inclusive: bool = True, reverse: bool = False) -> Iterator[int]:
+        return self._merge([index.range(low, high, low_inclusive, high_inclusive, reverse)
+                            for index in self._indexes()], reverse)
+
+    def ordered(self, reverse: bool = False) -> Iterator[int]:
+        # NULLs first (last when reversed), as in SortedIndex.ordered
+        count = self.table.partition_count
+        nulls = sorted((local * count + part for part, index in enumerate(self._indexes())
+                        for local in index.nulls), reverse=reverse)
+        if not reverse:
+            yield from nulls
+        yield from self.range(reverse=reverse)
+        if reverse:
+            yield from nulls
+
+    def _merge(self, runs: List[Iterator[int]], reverse: bool) -> Iterator[int]:
+        # Each partition's rids come in value order; merge them by value
+        table = self.table
+        count, pos = table.partition_count, table.positions[self.column]
+
+        def keyed(part, rids):
+            slots = table.parts[part].slots
+            for local in rids:
+                yield slots[local][pos], local * count + part
+        merged = heapq.merge(*(keyed(part, rids) for part, rids in enumerate(runs)),
+                             key=itemgetter(0), reverse=reverse)
+        return (rid for _, rid in merged)
+
+    def min(self) -> Optional[Any]:
+        values = [v for v in (index.min() for index in self._indexes()) if v is not None]
+        return min(values) if values else None
+
+    def max(self) -> Optional[Any]:
+        values = [v for v in (index.max() for index in self._indexes()) if v is not None]
+        return max(values) if values else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "column": self.column, "kind": self.kind}
+
+
+class PartitionedTable(Table):
+    # A table split by a hash of one column into partitions. Each partition
+    # is an ordinary Table with its own records and indexes, and its own
+    # image and delta on disk (see Database). Row ids interleave the
+    # partitions' rids, rid = local rid * partition_count + partition, so a
+    # partition's rows keep their ids when another partition grows or is
+    # vacuumed.
+    #
+    # Lookups on the partition column read one partition and full scans run
+    # partition by partition, on the process pool for large tables. A
+    # mutation is applied to and logged for each partition it touches (the
+    # log records carry "part"), so a checkpoint only writes the partitions
+    # that changed. Rows never move between partitions: the partition column
+    # cannot be updated.
+    def __init__(self, name: str, columns: List[Column], partition_by: str, partitions: int, layout: str = "row"):
+        if layout != "row":
+            raise ValueError("Partitioned tables use the row layout")
+        if partition_by not in [c.name for c in columns]:
+            raise ValueError(f"Column {partition_by} not found in table {name}")
+        if partitions < 1:
+            raise ValueError("A partitioned table needs at least one partition")
+        self.partition_by = partition_by
+        self.partition_count = partitions
+        super().__init__(name, columns, layout)
+
+    @staticmethod
+    def from_parts(parts: List[Table], partition_by: str) -> "PartitionedTable":
+        # Partitions read back from their images
+        first = parts[0]
+        table = PartitionedTable(first.name, list(first.columns.values()), partition_by, len(parts))
+        table.parts = parts
+        table.index_defs = list(first.index_defs)
+        # Images written at different checkpoints: log records are replayed
+        # from the oldest one and each partition skips what it already has
+        table.lsn = min(part.lsn for part in parts)
+        return table
+
+    def _init_rows(self):
+        columns = list(self.columns.values())
+        self.parts = [Table(self.name, columns) for _ in range(self.partition_count)]
+        self._views: Optional[Dict[str, PartitionedIndex]] = None
+
+    @property
+    def slots(self) -> PartitionedSlots:
+        return PartitionedSlots([part.slots for part in self.parts])
+
+    @property
+    def tombstones(self) -> int:
+        # Deleted rows plus the ids past the end of shorter partitions
+        return len(self.slots) - len(self)
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    @property
+    def indexes(self) -> Dict[str, PartitionedIndex]:
+        if self._views is None:
+            self._views = {name: PartitionedIndex(self, name) for name in self.parts[0].indexes}
+        return self._views
+
+    def part_for(self, value: Any) -> Table:
+        return self.parts[partition_of(value, self.partition_count)]
+
+    def get(self, rid: int) -> Optional[Dict[str, Any]]:
+        local, part = divmod(rid, self.partition_count)
+        return self.parts[part].get(local)
+
+    def set_records(self, records: Sequence[Record]):
+        for part, group in zip(self.parts, self._group(records)):
+            part.set_records(group)
+        self.version = next(_versions)
+        self.statistics = None
+        self._views = None
+
+    def _group(self, records: Iterable[Record]) -> List[List[Record]]:
+        groups: List[List[Record]] = [[] for _ in self.parts]
+        pos, count = self.positions[self.partition_by], self.partition_count
+        for rec in records:
+            groups[partition_of(rec[pos], count)].append(rec)
+        return groups
+
+    def _by_part(self, rids: Iterable[int]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for rid in rids:
+            local, part = divmod(rid, self.partition_count)
+            groups.setdefault(part, []).append(local)
+        return groups
+
+    def _on_part(self, part: int, method: Callable, *args) -> Any:
+        # Runs a Table method on one partition. While a transaction owns the
+        # table, the partition's undo entries go to this table's undo log.
+        table = self.parts[part]
+        if self.undo_log is None:
+            return method(table, *args)
+        table.undo_log = []
+        try:
+            return method(table, *args)
+        finally:
+            self.undo_log.extend(("part", part, entry) for entry in table.undo_log)
+            table.undo_log = None
+
+    def _changed(self, rows: int):
+        if rows:
+            self.version = next(_versions)
+            self.changes += rows
+
+    def _init_indexes(self):
+        for part in self.parts:
+            part.index_defs = list(self.index_defs)
+            part._init_indexes()
+        self._views = None
+
+    def _rebuild_indexes(self):
+        for part in self.parts:
+            part.index_defs = list(self.index_defs)
+            part._rebuild_indexes()
+        self._views = None
+
+    def create_index(self, name: str, column: str, kind: str = "hash"):
+        if column not in self.columns:
+            raise ValueError(f"Column {column} not found in table {self.name}")
+        if name in self.indexes:
+            raise ValueError(f"Index {name} already exists on table {self.name}")
+        for part in self.parts:
+            part.create_index(name, column, kind)
+        self.index_defs = list(self.parts[0].index_defs)
+        self._views = None
+        self._log("create_index", {"index": self.index_defs[-1]})
+
+    def drop_index(self, name: str):
+        if not any(d["name"] == name for d in self.index_defs):
+            raise ValueError(f"Index {name} not found on table {self.name}")
+        for part in self.parts:
+            part.drop_index(name)
+        self.index_defs = list(self.parts[0].index_defs)
+        self._views = None
+        self._log("drop_index", {"name": name})
+
+    def insert_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        final_rows = self._check_inserts(rows)
+        for part, records in enumerate(self._group(final_rows)):
+            if records:
+                self._on_part(part, Table._store, records)
+                self._log_inserts(records, {"part": part})
+        self._changed(len(final_rows))
+        return len(final_rows)
+
+    def matching_rids(self, record_filter, candidates: Optional[Iterable[int]] = None) -> List[int]:
+        # Full scans filter partition by partition; large tables spread the
+        # partitions over the process pool
+        if candidates is not None:
+            slots = self.slots
+            return [rid for rid in candidates if record_filter(slots[rid])]
+        parts, count = self.parts, self.partition_count
+
+        def matching(start, stop):
+            return [local * count + part for part in range(start, stop)
+                    for local in parts[part].matching_rids(record_filter)]
+        return list(itertools.chain.from_iterable(self.parallel.map(matching, count, len(self))))
+
+    def scan_records(self, record_filter=None, candidates: Optional[Iterable[int]] = None) -> Iterator[Record]:
+        if candidates is None:
+            return itertools.chain.from_iterable(part.scan_records(record_filter) for part in self.parts)
+        slots = self.slots
+        records = (slots[rid] for rid in candidates)
+        return records if record_filter is None else filter(record_filter, records)
+
+    def delete(self, where_func=None, candidates: Optional[Iterable[int]] = None, record_filter=None):
+        rids = self.matching_rids(self._record_filter(where_func, record_filter) or _true, candidates)
+        for part, local in self._by_part(rids).items():
+            self._on_part(part, Table._delete_rids, local)
+            self._log("delete", {"part": part, "rows": local})
+        self._changed(len(rids))
+        return len(rids)
+
+    def update(self, updates: Dict[str, Any], where_func=None, candidates: Optional[Iterable[int]] = None,
+               record_filter=None):
+        rids = self.matching_rids(self._record_filter(where_func, record_filter) or _true, candidates)
+        if not rids:
+            return 0
+        updates = self._check_updates(rids, updates)
+        if self.partition_by in updates:
+            pos, value, slots = self.positions[self.partition_by], updates[self.partition_by], self.slots
+            if any(slots[rid][pos] != value for rid in rids):
+                raise ValueError(f"Cannot update partition column '{self.partition_by}'")
+        for part, local in self._by_part(rids).items():
+            self._on_part(part, Table._update_rids, local, updates)
+            self._log("update", {"part": part, "rows": local, "set": updates})
+        self._changed(len(rids))
+        return len(rids)
+
+    def vacuum(self, parts: Optional[Iterable[int]] = None) -> int:
+        # Compacts the given partitions (all by default); each is renumbered
+        # and logged on its own
+        reclaimed = 0
+        for part in (range(self.partition_count) if parts is None else parts):
+            table = self.parts[part]
+            if not table.tombstones:
+                continue
+            if self.undo_log is not None:
+                raise ValueError("VACUUM cannot run inside a transaction")
+            reclaimed += table.vacuum()
+            self._log("vacuum", {"part": part})
+        if reclaimed:
+            self.version = next(_versions)
+        return reclaimed
+
+    def rollback(self, undo_log: List[tuple]):
+        self.undo_log = None
+        self.version = next(_versions)
+        for _, part, entry in reversed(undo_log):
+            self.parts[part].rollback([entry])
+
+    def apply_log(self, record: Dict[str, Any]):
+        # A partition's records replay on it; index changes on every
+        # partition whose image is older than the record
+        part = record.get("part")
+        for p in (range(self.partition_count) if part is None else [part]):
+            if record["lsn"] > self.parts[p].lsn:
+                self.parts[p].apply_log(record)
+        if part is None:
+            self.index_defs = list(self.parts[0].index_defs)
+            self._views = None
+        self.version = next(_versions)
+        self.lsn = record["lsn"]
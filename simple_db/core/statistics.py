@@ -0,0 +1,186 @@
+import random
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+# Planner statistics. analyze() reads a table (or a random sample of it, for
+# big tables) and records, per column, the fraction of NULLs, an estimate of
+# the number of distinct values, min/max, the most common values with their
+# frequencies and, for orderable columns, an equi-depth histogram of the
+# remaining values. The planner turns them into row estimates for
+# predicates; see sql.planner.selectivity.
+#
+# Row counts are always exact (len(table)). Everything else describes the
+# rows at the time of the last analyze(); Table.current_statistics()
+# gathers them again once enough rows have changed since.
+
+# Rows read by analyze(); larger tables are sampled
+SAMPLE_ROWS = 30_000
+# Most common values kept per column
+MCV_COUNT = 10
+# A value counts as common when it appears this many times more often than
+# the average value in the sample
+MCV_MIN_RATIO = 1.25
+HISTOGRAM_BUCKETS = 32
+# Table.current_statistics() analyzes again after this many changed rows
+# plus this fraction of the rows at the last analyze
+AUTO_ANALYZE_MIN_ROWS = 50
+AUTO_ANALYZE_FRACTION = 0.1
+ORDERED_TYPES = ("int", "float", "str")
+
+# Selectivities used when a column has no statistics or a value cannot be
+# compared with the column's values
+DEFAULT_EQ = 0.005
+DEFAULT_RANGE = 1 / 3
+
+
+def _estimate_distinct(sample_size: int, total: int, counts: Counter) -> float:
+    # Haas and Stokes' Duj1 estimator: scales the distinct values seen in a
+    # sample by how many of them were seen only once
+    distinct = len(counts)
+    if sample_size >= total or not distinct:
+        return distinct
+    singles = sum(1 for c in counts.values() if c == 1)
+    if not singles:
+        return distinct
+    estimate = sample_size * distinct / (sample_size - singles + singles * sample_size / total)
+    return min(max(estimate, distinct), total)
+
+
+class ColumnStats:
+    def __init__(self, null_frac: float = 0.0, distinct: float = 0.0, low: Any = None, high: Any = None,
+                 mcv: Optional[List[List[Any]]] = None, histogram: Optional[List[Any]] = None):
+        self.null_frac = null_frac
+        # Estimated distinct non-NULL values
+        self.distinct = distinct
+        self.low = low
+        self.high = high
+        # [value, fraction of all rows] pairs, most common first
+        self.mcv = mcv or []
+        # Bucket bounds over the non-NULL values that are not in mcv; each
+        # bucket holds the same number of rows
+        self.histogram = histogram or []
+        self._mcv_map = {value: frac for value, frac in self.mcv}
+        self._mcv_total = sum(self._mcv_map.values())
+
+    @property
+    def rest_frac(self) -> float:
+        # Fraction of rows with a value that is neither NULL nor common
+        return max(1.0 - self.null_frac - self._mcv_total, 0.0)
+
+    def eq_fraction(self, value: Any) -> float:
+        if value is None:
+            return 0.0
+        if value in self._mcv_map:
+            return self._mcv_map[value]
+        try:
+            if self.low is not None and (value < self.low or value > self.high):
+                return 0.0
+        except TypeError:
+            return DEFAULT_EQ
+        others = self.distinct - len(self.mcv)
+        if others < 1:
+            return 0.0
+        return self.rest_frac / others
+
+    def range_fraction(self, low: Any = None, high: Any = None, low_inclusive: bool = True,
+                       high_inclusive: bool = True) -> float:
+        # Fraction of rows with low <(=) value <(=) high; None leaves a side open
+        try:
+            def inside(v):
+                return (low is None or v > low or (low_inclusive and v == low)) and \
+                    (high is None or v < high or (high_inclusive and v == high))
+            frac = sum(f for v, f in self.mcv if inside(v))
+            if self.histogram:
+                upper = 1.0 if high is None else self._below(high, high_inclusive)
+                lower = 0.0 if low is None else self._below(low, not low_inclusive)
+                frac += max(upper - lower, 0.0) * self.rest_frac
+            elif self.rest_frac:
+                return DEFAULT_RANGE
+            return min(frac, 1.0)
+        except TypeError:
+            return DEFAULT_RANGE
+
+    def _below(self, value: Any, inclusive: bool) -> float:
+        # Fraction of the histogram's rows below value (or at most value)
+        bounds = self.histogram
+        buckets = len(bounds) - 1
+        if buckets < 1:
+            return 0.0 if value < bounds[0] else 1.0
+        pos = (bisect_right if inclusive else bisect_left)(bounds, value)
+        if pos == 0:
+            return 0.0
+        if pos > buckets:
+            return 1.0
+        # Inside bucket pos - 1: interpolate between its bounds for numbers
+        lo, hi = bounds[pos - 1], bounds[pos]
+        part = 0.5
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and hi != lo:
+            part = (value - lo) / (hi - lo)
+        return (pos - 1 + part) / buckets
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"null_frac": self.null_frac, "distinct": self.distinct, "low": self.low, "high": self.high,
+                "mcv": self.mcv, "histogram": self.histogram}
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "ColumnStats":
+        return ColumnStats(data["null_frac"], data["distinct"], data.get("low"), data.get("high"),
+                           data.get("mcv"), data.get("histogram"))
+
+
+class TableStats:
+    def __init__(self, rows: int, columns: Dict[str, ColumnStats]):
+        # Live rows when the statistics were gathered
+        self.rows = rows
+        self.columns = columns
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "columns": {name: c.to_dict() for name, c in self.columns.items()}}
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "TableStats":
+        return TableStats(data["rows"], {name: ColumnStats.from_dict(c) for name, c in data["columns"].items()})
+
+
+def _column_stats(values: Sequence[Any], total: int, ordered: bool) -> ColumnStats:
+    sample_size = len(values)
+    if not sample_size:
+        return ColumnStats()
+    counts = Counter(v for v in values if v is not None)
+    nonnull = sum(counts.values())
+    null_frac = (sample_size - nonnull) / sample_size
+    if not counts:
+        return ColumnStats(null_frac=null_frac)
+    distinct = _estimate_distinct(sample_size, total, counts)
+
+    # Common values: seen more than once, and well above the average frequency
+    mcv = []
+    if len(counts) < nonnull:
+        threshold = max(2, MCV_MIN_RATIO * nonnull / len(counts))
+        mcv = [[v, c / sample_size] for v, c in counts.most_common(MCV_COUNT) if c >= threshold]
+    low = high = histogram = None
+    if ordered:
+        common = {v for v, _ in mcv}
+        keys = sorted(counts)
+        low, high = keys[0], keys[-1]
+        rest = sorted(v for v in values if v is not None and v not in common)
+        if rest:
+            buckets = min(HISTOGRAM_BUCKETS, len(rest) - 1) or 1
+            histogram = [rest[(len(rest) - 1) * i // buckets] for i in range(buckets + 1)]
+    return ColumnStats(null_frac, distinct, low, high, mcv, histogram)
+
+
+def analyze(names: Sequence[str], types: Sequence[str], slots: Sequence[Any], live_rows: int,
+            sample_rows: int = SAMPLE_ROWS, seed: int = 0) -> TableStats:
+    # Statistics for records stored in slots (None marks a deleted row)
+    if len(slots) <= sample_rows:
+        records = [rec for rec in slots if rec is not None]
+    else:
+        rids = random.Random(seed).sample(range(len(slots)), sample_rows)
+        records = [rec for rec in (slots[rid] for rid in sorted(rids)) if rec is not None]
+    columns = {}
+    for pos, (name, col_type) in enumerate(zip(names, types)):
+        values = [rec[pos] for rec in records]
+        columns[name] = _column_stats(values, live_rows, col_type in ORDERED_TYPES)
+    return TableStats(live_rows, columns)
@@ -0,0 +1,287 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from .statistics import TableStats
+from .table import Table, Column
+
+
+@contextmanager
+def atomic_file(path: str, mode: str = 'w', fsync: bool = True):
+    # Writes go to a temporary file next to path that replaces it once
+    # complete, so a crash leaves the old file or the new one, never a mix.
+    # With fsync the new contents (and the rename) are on disk on return.
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    if fsync:
+        sync_dir(os.path.dirname(path) or ".")
+
+
+def sync_dir(path: str):
+    # Makes renames and new files in path durable; a no-op where directories
+    # cannot be opened (Windows)
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JSONStorage:
+    # One pretty-printed JSON document per table; easy to inspect by hand.
+    name = "json"
+    extension = ".json"
+
+    def write(self, table: Table, path: str, fsync: bool = True):
+        with atomic_file(path, 'w', fsync) as f:
+            json.dump(table.to_dict(), f, indent=2)
+
+    def read(self, path: str) -> Table:
+        with open(path, 'r') as f:
+            return Table.from_dict(json.load(f))
+
+
+# Paged file layout
+#   header:  magic, page_size, header_pages, data_pages, row_count, meta_len
+#            followed by the table metadata as JSON and a u16 row count per
+#            data page, padded to a whole number of pages
+#   pages:   u16 row count, then (u16 length, record) pairs
+# Records are a sequence of type-tagged values in column order.
+MAGIC = b"SDBPAGE1"
+HEADER = struct.Struct(">8sIIIQI")
+U16 = struct.Struct(">H")
+I64 = struct.Struct(">q")
+F64 = struct.Struct(">d")
+U32 = struct.Struct(">I")
+
+TAG_NULL, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_BIGINT = range(7)
+
+
+def encode_value(val: Any, out: bytearray):
+    if val is None:
+        out.append(TAG_NULL)
+    elif val is True:
+        out.append(TAG_TRUE)
+    elif val is False:
+        out.append(TAG_FALSE)
+    elif isinstance(val, int):
+        if -2**63 <= val < 2**63:
+            out.append(TAG_INT)
+            out += I64.pack(val)
+        else:
+            data = str(val).encode()
+            out.append(TAG_BIGINT)
+            out += U32.pack(len(data)) + data
+    elif isinstance(val, float):
+        out.append(TAG_FLOAT)
+        out += F64.pack(val)
+    else:
+        data = str(val).encode('utf-8')
+        out.append(TAG_STR)
+        out += U32.pack(len(data)) + data
+
+
+def decode_value(buf, pos: int):
+    # Returns (value, position after the value)
+    tag = buf[pos]
+    pos += 1
+    if tag == TAG_NULL:
+        return None, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    if tag == TAG_INT:
+        return I64.unpack_from(buf, pos)[0], pos + 8
+    if tag == TAG_FLOAT:
+        return F64.unpack_from(buf, pos)[0], pos + 8
+    length = U32.unpack_from(buf, pos)[0]
+    data = bytes(buf[pos + 4:pos + 4 + length])
+    if tag == TAG_BIGINT:
+        return int(data), pos + 4 + length
+    return data.decode('utf-8'), pos + 4 + length
+
+
+def skip_value(buf, pos: int) -> int:
+    tag = buf[pos]
+    if tag in (TAG_INT, TAG_FLOAT):
+        return pos + 9
+    if tag in (TAG_STR, TAG_BIGINT):
+        return pos + 5 + U32.unpack_from(buf, pos + 1)[0]
+    return pos + 1
+
+
+class PagedRows(Sequence):
+    # Read-only, list-like view over the data pages of a paged table file.
+    # Nothing is decoded up front; each access decodes just the row it needs.
+    def __init__(self, mm: mmap.mmap, column_names: List[str], page_size: int,
+                 first_page: int, page_counts: List[int]):
+        self._mm = mm
+        self._names = column_names
+        self._page_size = page_size
+        self._first_page = first_page
+        self._counts = page_counts
+        # Row number of the first row on each page, built on first access
+        self._starts: Optional[List[int]] = None
+        self._len = sum(page_counts)
+
+    def __len__(self):
+        return self._len
+
+    def _page_offset(self, page_no: int) -> int:
+        return (self._first_page + page_no) * self._page_size
+
+    def _record_offset(self, index: int) -> int:
+        if self._starts is None:
+            self._starts = [0] + list(accumulate(self._counts))[:-1]
+        page_no = bisect_right(self._starts, index) - 1
+        pos = self._page_offset(page_no) + 2
+        for _ in range(index - self._starts[page_no]):
+            pos += 2 + U16.unpack_from(self._mm, pos)[0]
+        return pos + 2
+
+    def _decode(self, pos: int) -> Tuple[Any, ...]:
+        # A table record: the values in column order
+        values = []
+        for _ in self._names:
+            val, pos = decode_value(self._mm, pos)
+            values.append(val)
+        return tuple(values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("row index out of range")
+        return self._decode(self._record_offset(index))
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        for pos in self._record_offsets():
+            yield self._decode(pos)
+
+    def _record_offsets(self) -> Iterator[int]:
+        for page_no, count in enumerate(self._counts):
+            pos = self._page_offset(page_no) + 2
+            for _ in range(count):
+                length = U16.unpack_from(self._mm, pos)[0]
+                yield pos + 2
+                pos += 2 + length
+
+    def column_values(self, name: str) -> Iterator[Any]:
+        # Decodes a single column of every row, skipping over the others;
+        # used to build indexes without materializing whole rows
+        col_idx = self._names.index(name)
+        for pos in self._record_offsets():
+            for _ in range(col_idx):
+                pos = skip_value(self._mm, pos)
+            yield decode_value(self._mm, pos)[0]
+
+
+class PagedStorage:
+    # Binary storage engine with fixed-size pages and mmap-backed lazy reads.
+    name = "paged"
+    extension = ".sdb"
+
+    def __init__(self, page_size: int = 4096):
+        if not 512 <= page_size <= 65536:
+            raise ValueError("page_size must be between 512 and 65536 bytes")
+        self.page_size = page_size
+
+    def write(self, table: Table, path: str, fsync: bool = True):
+        page_size = self.page_size
+        pages: List[bytes] = []
+        counts: List[int] = []
+        page = bytearray(2)
+        count = 0
+        for rec in table.scan_records():
+            record = bytearray()
+            for val in rec:
+                encode_value(val, record)
+            if len(record) + 4 > page_size:
+                raise ValueError(f"Row of {len(record)} bytes does not fit in a {page_size} byte page")
+            if len(page) + 2 + len(record) > page_size:
+                U16.pack_into(page, 0, count)
+                pages.append(bytes(page.ljust(page_size, b"\0")))
+                counts.append(count)
+                page = bytearray(2)
+                count = 0
+            page += U16.pack(len(record)) + record
+            count += 1
+        if count:
+            U16.pack_into(page, 0, count)
+            pages.append(bytes(page.ljust(page_size, b"\0")))
+            counts.append(count)
+
+        meta_bytes = json.dumps(table.metadata(), separators=(',', ':')).encode('utf-8')
+        directory = struct.pack(f">{len(counts)}H", *counts)
+        header_len = HEADER.size + len(meta_bytes) + len(directory)
+        header_pages = -(-header_len // page_size)
+        header = HEADER.pack(MAGIC, page_size, header_pages, len(pages), sum(counts), len(meta_bytes))
+
+        # Write next to the old file and swap it in, so readers that still
+        # have the previous version mapped keep seeing consistent pages
+        with atomic_file(path, 'wb', fsync) as f:
+            f.write((header + meta_bytes + directory).ljust(header_pages * page_size, b"\0"))
+            for p in pages:
+                f.write(p)
+
+    def _open(self, path: str):
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, page_size, header_pages, data_pages, row_count, meta_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a paged table file")
+        meta = json.loads(mm[HEADER.size:HEADER.size + meta_len])
+        dir_start = HEADER.size + meta_len
+        counts = list(struct.unpack_from(f">{data_pages}H", mm, dir_start))
+        return mm, meta, page_size, header_pages, counts
+
+    def read_schema(self, path: str) -> Dict[str, Any]:
+        mm, meta, _, _, _ = self._open(path)
+        mm.close()
+        return meta
+
+    def read(self, path: str) -> Table:
+        mm, meta, page_size, header_pages, counts = self._open(path)
+        cols = [Column.from_dict(c) for c in meta["columns"]]
+        table = Table(meta["name"], cols, meta.get("layout", "row"))
+        table.index_defs = meta.get("indexes", [])
+        table.set_records(PagedRows(mm, [c.name for c in cols], page_size, header_pages, counts))
+        table.statistics = TableStats.from_dict(meta["statistics"]) if meta.get("statistics") else None
+        table.lsn = meta.get("lsn", 0)
+        table._indexes = None  # built on first use
+        return table
+
+
+ENGINES = {engine.name: engine for engine in (JSONStorage, PagedStorage)}
+
+
+def get_engine(name: str):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown storage engine '{name}'")
+    return ENGINES[name]()
+
+
+def engine_for_file(filename: str):
+    for engine in ENGINES.values():
+        if filename.endswith(engine.extension):
+            return engine()
+    return None
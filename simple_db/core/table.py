@@ -1,6 +1,16 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import itertools
 import json
 import os
+from collections.abc import MutableSequence
+from operator import itemgetter
+from .columnar import ColumnStore
+from .index import HashIndex, SortedIndex, make_index
+from .locks import RWLock
+from .parallel import SERIAL, Parallelism
+from .statistics import AUTO_ANALYZE_FRACTION, AUTO_ANALYZE_MIN_ROWS, TableStats, analyze
+
+LAYOUTS = ("row", "columnar")
 
 class Column:
     def __init__(self, name: str, col_type: str, is_primary_key: bool = False, is_unique: bool = False, nullable: bool = True):
@@ -29,126 +39,528 @@ class Column:
             nullable=data.get("nullable", True)
         )
 
+
+# Rows are stored as records: tuples of values in column order (the order of
+# Table.columns). A tuple costs a fraction of the memory of a dict keyed by
+# every column name. Dicts are built only where rows leave the table
+# (rows, get, select, scan); the executor filters, sorts and aggregates
+# records directly, compiling column access to positions (Table.positions).
+Record = Tuple[Any, ...]
+
+
+def _null(record: Record) -> Any:
+    return None
+
+
+def _true(record: Record) -> bool:
+    return True
+
+
+class RowView(Sequence):
+    # Read-only list of rows as dicts over a table's records, built lazily
+    def __init__(self, records: Sequence[Record], names: Sequence[str]):
+        self._records = records
+        self._names = names
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [dict(zip(self._names, rec)) for rec in self._records[index]]
+        return dict(zip(self._names, self._records[index]))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        names = self._names
+        for rec in self._records:
+            yield dict(zip(names, rec))
+
+
+# Source of Table.version values, shared by all tables so a table that is
+# dropped and created again never repeats a version
+_versions = itertools.count(1)
+
+
 class Table:
-    def __init__(self, name: str, columns: List[Column]):
+    def __init__(self, name: str, columns: List[Column], layout: str = "row"):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown table layout '{layout}', expected one of {', '.join(LAYOUTS)}")
         self.name = name
         self.columns = {col.name: col for col in columns}
-        self.rows: List[Dict[str, Any]] = []
-        self.indexes: Dict[str, Dict[Any, int]] = {} # index_name -> {value -> row_idx in self.rows}
-        # Ideally indexes point to a stable ID, but for simplicity we'll point to list index
-        # NOTE: Deletion will require re-building indexes or using a stable row ID map.
-        # Let's use a simple auto-increment generic ID for internal tracking if needed, 
-        # or just linear scan for MVP and rebuild.
-        # Better approach for MVP: Indexes map value -> List[row_index]. 
-        
+        # "row": slots is a list of records; "columnar": a core.columnar.ColumnStore
+        self.layout = layout
+        self.names = tuple(self.columns)
+        # Column name -> position in a record
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self._init_rows()
+        # PK/UNIQUE columns get an index named after the column; secondary
+        # indexes created with create_index are listed here by definition.
+        self.index_defs: List[Dict[str, Any]] = []
+
+        # Set by the owning Database: called as journal(table, op, data) after
+        # every successful mutation so it can be appended to the write-ahead log.
+        self.journal: Optional[Callable[["Table", str, Dict[str, Any]], None]] = None
+        # lsn of the last log record reflected in the rows
+        self.lsn = 0
+        # Set while a transaction owns the table: mutations record how to undo
+        # themselves here, see rollback()
+        self.undo_log: Optional[List[tuple]] = None
+        # Readers/writer lock for concurrent use. Table methods do not take it
+        # themselves; the executor, transactions and checkpoints do.
+        self.lock = RWLock()
+        # Set by the owning Database: when full scans with a filter run on a
+        # process pool, see core.parallel
+        self.parallel: Parallelism = SERIAL
+        # Changes before every mutation of the rows (never back to an earlier
+        # value), so a result computed at one version is valid while the
+        # version stays the same; see sql.result_cache
+        self.version = next(_versions)
+        # Planner statistics from the last analyze(), and the number of rows
+        # inserted, updated or deleted since; see core.statistics
+        self.statistics: Optional[TableStats] = None
+        self.changes = 0
+
         self._init_indexes()
 
+    def _init_rows(self):
+        # Record storage addressed by stable row ids (rid = position in slots).
+        # Deleted rows leave a None tombstone so other rids never move;
+        # vacuum() compacts. slots is a list, or a read-only sequence (e.g.
+        # core.storage.PagedRows) that a storage engine decodes lazily; see _materialize
+        self.slots: List[Optional[Record]] = self._new_slots(())
+        self.tombstones = 0
+        self._indexes: Optional[Dict[str, HashIndex]] = {} # index_name -> index over rids
+
+    @property
+    def rows(self) -> Sequence[Dict[str, Any]]:
+        # Live rows in rid order, as dicts
+        if not self.tombstones:
+            return RowView(self.slots, self.names)
+        return RowView([rec for rec in self.slots if rec is not None], self.names)
+
+    @rows.setter
+    def rows(self, rows: Iterable[Dict[str, Any]]):
+        self.set_records([tuple(row.get(name) for name in self.names) for row in rows])
+
+    def set_records(self, records: Sequence[Record]):
+        # Replaces every row; records may be a lazily decoded sequence, which
+        # a columnar table converts right away
+        self.version = next(_versions)
+        if self.layout == "columnar" and not isinstance(records, ColumnStore):
+            records = self._new_slots(records)
+        self.slots = records
+        self.tombstones = 0
+        self._indexes = None
+        self.statistics = None
+
+    def __len__(self):
+        return len(self.slots) - self.tombstones
+
+    def analyze(self) -> TableStats:
+        self.statistics = analyze(self.names, [c.col_type for c in self.columns.values()], self.slots, len(self))
+        self.changes = 0
+        return self.statistics
+
+    def current_statistics(self) -> TableStats:
+        # Statistics for the planner, gathered again once the rows changed
+        # since the last analyze() are more than a fraction of the table
+        stats = self.statistics
+        if stats is None or self.changes > AUTO_ANALYZE_MIN_ROWS + AUTO_ANALYZE_FRACTION * stats.rows:
+            stats = self.analyze()
+        return stats
+
+    def get(self, rid: int) -> Optional[Dict[str, Any]]:
+        rec = self.slots[rid]
+        return None if rec is None else self.as_dict(rec)
+
+    def as_dict(self, record: Record) -> Dict[str, Any]:
+        return dict(zip(self.names, record))
+
+    def getter(self, column: str) -> Callable[[Record], Any]:
+        # Fast accessor for one column of a record; unknown columns read as NULL
+        pos = self.positions.get(column)
+        return _null if pos is None else itemgetter(pos)
+
+    @property
+    def indexes(self) -> Dict[str, HashIndex]:
+        # Engines that load rows lazily leave _indexes as None until first use
+        if self._indexes is None:
+            self._rebuild_indexes()
+        return self._indexes
+
     def _init_indexes(self):
-        self.indexes = {}
+        self._indexes = {}
         for col in self.columns.values():
             if col.is_primary_key or col.is_unique:
-                self.indexes[col.name] = {}
+                self._indexes[col.name] = make_index(col.name, col.name, unique=True)
+        for d in self.index_defs:
+            self._indexes[d["name"]] = make_index(d["name"], d["column"], d.get("kind", "hash"))
 
     def _rebuild_indexes(self):
         self._init_indexes()
-        for idx, row in enumerate(self.rows):
-            for col_name in self.indexes:
-                val = row.get(col_name)
-                if val is not None:
-                    self.indexes[col_name][val] = idx
+        for index in self._indexes.values():
+            self._fill_index(index)
+
+    def _fill_index(self, index):
+        column_values = getattr(self.slots, "column_values", None)
+        if column_values and not self.tombstones:
+            pairs = enumerate(column_values(index.column))
+        else:
+            pos = self.positions[index.column]
+            pairs = ((rid, rec[pos]) for rid, rec in enumerate(self.slots) if rec is not None)
+        index.build(pairs)
+
+    def _new_slots(self, records: Iterable[Optional[Record]]):
+        if self.layout == "columnar":
+            return ColumnStore([(c.name, c.col_type) for c in self.columns.values()], records)
+        return list(records)
+
+    def _materialize(self):
+        # Lazily loaded rows are read-only; copy them into a list before the first write
+        if not isinstance(self.slots, MutableSequence):
+            self.slots = self._new_slots(self.slots)
+
+    def create_index(self, name: str, column: str, kind: str = "hash"):
+        if column not in self.columns:
+            raise ValueError(f"Column {column} not found in table {self.name}")
+        if name in self.indexes:
+            raise ValueError(f"Index {name} already exists on table {self.name}")
+        index = make_index(name, column, kind)
+        self._fill_index(index)
+        self.index_defs.append(index.to_dict())
+        self._indexes[name] = index
+        self._log("create_index", {"index": index.to_dict()})
+
+    def drop_index(self, name: str):
+        if not any(d["name"] == name for d in self.index_defs):
+            raise ValueError(f"Index {name} not found on table {self.name}")
+        self.index_defs = [d for d in self.index_defs if d["name"] != name]
+        if self._indexes is not None:
+            self._indexes.pop(name, None)
+        self._log("drop_index", {"name": name})
+
+    def index_on(self, column: str) -> Optional[HashIndex]:
+        # Best index for an equality lookup on column: unique ones first, then hash
+        candidates = [i for i in self.indexes.values() if i.column == column]
+        candidates.sort(key=lambda i: (not i.unique, i.kind != "hash"))
+        return candidates[0] if candidates else None
+
+    def sorted_index_on(self, column: str) -> Optional[SortedIndex]:
+        for index in self.indexes.values():
+            if index.column == column and index.kind == "sorted":
+                return index
+        return None
+
+    def _validate(self, row_data: Dict[str, Any]) -> Record:
+        # Schema checks and type coercion for one row; uniqueness is checked
+        # by the caller against the whole batch
+        return tuple(self._coerce(col, row_data.get(col_name)) for col_name, col in self.columns.items())
+
+    def _coerce(self, col: Column, val: Any) -> Any:
+        # Type check (basic)
+        col_name = col.name
+        if val is not None:
+            if col.col_type == 'int' and not isinstance(val, int):
+                try: val = int(val)
+                except: raise ValueError(f"Column {col_name} expects int")
+            elif col.col_type == 'float' and not isinstance(val, (float, int)):
+                 try: val = float(val)
+                 except: raise ValueError(f"Column {col_name} expects float")
+            elif col.col_type == 'str' and not isinstance(val, str):
+                val = str(val)
+            elif col.col_type == 'bool' and not isinstance(val, bool):
+                val = bool(val)
+
+        # Constraint Check: Not Null
+        if val is None and not col.nullable:
+             raise ValueError(f"Column {col_name} cannot be null")
+        return val
 
     def insert(self, row_data: Dict[str, Any]):
-        # Validate schema and constraints
-        final_row = {}
-        
-        for col_name, col in self.columns.items():
-            val = row_data.get(col_name)
-            
-            # Type check (basic)
-            if val is not None:
-                if col.col_type == 'int' and not isinstance(val, int):
-                    try: val = int(val)
-                    except: raise ValueError(f"Column {col_name} expects int")
-                elif col.col_type == 'float' and not isinstance(val, (float, int)):
-                     try: val = float(val)
-                     except: raise ValueError(f"Column {col_name} expects float")
-                elif col.col_type == 'str' and not isinstance(val, str):
-                    val = str(val)
-                elif col.col_type == 'bool' and not isinstance(val, bool):
-                    val = bool(val)
-
-            # Constraint Check: Not Null
-            if val is None and not col.nullable:
-                 raise ValueError(f"Column {col_name} cannot be null")
-            
-            # Constraint Check: Primary Key / Unique
-            if (col.is_primary_key or col.is_unique) and val is not None:
-                if val in self.indexes[col_name]:
+        self.insert_many([row_data])
+
+    def insert_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        final_rows = self._check_inserts(rows)
+        self._store(final_rows)
+        # Logged positionally too: one list of values per row
+        self._log_inserts(final_rows, {})
+        return len(final_rows)
+
+    def _check_inserts(self, rows: Iterable[Dict[str, Any]]) -> List[Record]:
+        # All rows are validated, and PK/UNIQUE values checked against the
+        # existing index and the rest of the batch, before any is stored, so
+        # a failing batch leaves the table and the log unchanged
+        final_rows = [self._validate(row) for row in rows]
+        for pos, (col_name, col) in enumerate(self.columns.items()):
+            if not (col.is_primary_key or col.is_unique):
+                continue
+            index = self.indexes[col_name]
+            seen = set()
+            for row in final_rows:
+                val = row[pos]
+                if val is None:
+                    continue
+                if val in index or val in seen:
                     raise ValueError(f"Duplicate value '{val}' for unique column '{col_name}'")
+                seen.add(val)
+        return final_rows
 
-            final_row[col_name] = val
+    def _store(self, final_rows: List[Record]):
+        self._materialize()
+        self.version = next(_versions)
+        start = len(self.slots)
+        self.slots.extend(final_rows)
+        self.changes += len(final_rows)
+        if self.undo_log is not None:
+            self.undo_log.append(("insert", start))
 
-        # Insert
-        self.rows.append(final_row)
-        new_idx = len(self.rows) - 1
-        
         # Update Indexes
-        for col_name, idx_map in self.indexes.items():
-            val = final_row.get(col_name)
-            if val is not None:
-                idx_map[val] = new_idx
-
-    def select(self, where_func=None):
-        if where_func is None:
-            return self.rows
-        return [row for row in self.rows if where_func(row)]
-
-    def delete(self, where_func):
-        # This is expensive as it requires rebuilding indexes
-        # But required for correctness if we track by list index
-        initial_len = len(self.rows)
-        self.rows = [row for row in self.rows if not where_func(row)]
-        if len(self.rows) != initial_len:
-            self._rebuild_indexes()
-        return initial_len - len(self.rows)
-
-    def update(self, updates: Dict[str, Any], where_func):
-        updated_count = 0
-        for i, row in enumerate(self.rows):
-            if where_func(row):
-                # We essentially need to re-validate constraints if we update PK/Unique
-                # Simpler MVP: Don't allow updating PKs? Or just check explicitly.
-                
-                # Check constraints for updates
-                for col_name, new_val in updates.items():
-                    col = self.columns.get(col_name)
-                    if not col: continue
-                    if col.is_primary_key or col.is_unique:
-                        if new_val != row.get(col_name):
-                            if new_val in self.indexes[col_name]:
-                                raise ValueError(f"Duplicate value '{new_val}' for unique column '{col_name}'")
-
-                # Apply updates
-                for key, val in updates.items():
-                    if key in self.columns:
-                        row[key] = val
-                updated_count += 1
-        
-        if updated_count > 0:
+        for index in self.indexes.values():
+            pos = self.positions[index.column]
+            if len(final_rows) == 1:
+                index.add(final_rows[0][pos], start)
+            else:
+                index.build((rid, row[pos]) for rid, row in enumerate(final_rows, start))
+
+    def _log_inserts(self, final_rows: List[Record], data: Dict[str, Any]):
+        if len(final_rows) == 1:
+            self._log("insert", dict(data, record=final_rows[0]))
+        elif final_rows:
+            self._log("insert_many", dict(data, records=final_rows))
+
+    def lookup(self, index_name: str, value: Any) -> List[int]:
+        # Point lookup through a named index; returns matching rids
+        return self.indexes[index_name].lookup(value)
+
+    def index_range(self, index_name: str, low: Any = None, high: Any = None, low_inclusive: bool = True,
+                    high_inclusive: bool = True, reverse: bool = False) -> Iterator[int]:
+        # rids from an ordered index, in value order
+        return self.indexes[index_name].range(low, high, low_inclusive, high_inclusive, reverse)
+
+    def index_order(self, index_name: str, reverse: bool = False) -> Iterator[int]:
+        return self.indexes[index_name].ordered(reverse)
+
+    # Filters come in two forms: where_func takes a row dict (convenient, but
+    # builds a dict per row), record_filter takes a record (what the
+    # executor's compiled predicates do).
+    def _record_filter(self, where_func, record_filter):
+        if record_filter is not None or where_func is None:
+            return record_filter
+        names = self.names
+        return lambda rec: where_func(dict(zip(names, rec)))
+
+    def matching_rids(self, record_filter, candidates: Optional[Iterable[int]] = None) -> List[int]:
+        # rids of rows passing record_filter, optionally restricted to
+        # candidate rids produced by an index lookup. Large full scans are
+        # split into row ranges filtered in parallel.
+        if candidates is None:
+            slots = self.slots
+
+            def matching(start, stop):
+                records = slots if stop - start == len(slots) else slots[start:stop]
+                return [rid for rid, rec in enumerate(records, start) if rec is not None and record_filter(rec)]
+            if record_filter is _true:
+                return matching(0, len(slots))
+            return list(itertools.chain.from_iterable(self.parallel.map(matching, len(slots))))
+        return [rid for rid in candidates if record_filter(self.slots[rid])]
+
+    def scan_records(self, record_filter=None, candidates: Optional[Iterable[int]] = None) -> Iterator[Record]:
+        # Records are produced as the caller consumes them
+        if candidates is None:
+            records = (rec for rec in self.slots if rec is not None) if self.tombstones else iter(self.slots)
+        else:
+            records = (self.slots[rid] for rid in candidates)
+        if record_filter is None:
+            return records
+        return filter(record_filter, records)
+
+    def scan(self, where_func=None, candidates: Optional[Iterable[int]] = None,
+             record_filter=None) -> Iterator[Dict[str, Any]]:
+        # Lazy version of select: rows are produced as the caller consumes them
+        names = self.names
+        records = self.scan_records(self._record_filter(where_func, record_filter), candidates)
+        return (dict(zip(names, rec)) for rec in records)
+
+    def select(self, where_func=None, candidates: Optional[Iterable[int]] = None, record_filter=None):
+        record_filter = self._record_filter(where_func, record_filter)
+        if candidates is None and record_filter is not None and self.parallel.applies(len(self.slots)):
+            candidates, record_filter = self.matching_rids(record_filter), None
+        return list(self.scan(None, candidates, record_filter))
+
+    def delete(self, where_func=None, candidates: Optional[Iterable[int]] = None, record_filter=None):
+        rids = self.matching_rids(self._record_filter(where_func, record_filter) or _true, candidates)
+        if rids:
+            self._delete_rids(rids)
+            self._log("delete", {"rows": rids})
+        return len(rids)
+
+    def _delete_rids(self, rids: List[int]):
+        # Tombstone the rows and drop only their own index entries
+        self._materialize()
+        self.version = next(_versions)
+        indexes = [(index, self.positions[index.column]) for index in self.indexes.values()]
+        if self.undo_log is not None:
+            self.undo_log.append(("delete", [(rid, self.slots[rid]) for rid in rids]))
+        for rid in rids:
+            rec = self.slots[rid]
+            for index, pos in indexes:
+                index.remove(rec[pos], rid)
+            self.slots[rid] = None
+        self.tombstones += len(rids)
+        self.changes += len(rids)
+
+    def update(self, updates: Dict[str, Any], where_func=None, candidates: Optional[Iterable[int]] = None,
+               record_filter=None):
+        rids = self.matching_rids(self._record_filter(where_func, record_filter) or _true, candidates)
+        if not rids:
+            return 0
+        updates = self._check_updates(rids, updates)
+        self._update_rids(rids, updates)
+        self._log("update", {"rows": rids, "set": updates})
+        return len(rids)
+
+    def _check_updates(self, rids: List[int], updates: Dict[str, Any]) -> Dict[str, Any]:
+        # Check constraints for updates before touching any row, so a failed
+        # UPDATE leaves both the table and the log unchanged. Values are
+        # coerced as on insert; returns the updates to apply and log.
+        checked = {}
+        for col_name, new_val in updates.items():
+            col = self.columns.get(col_name)
+            if not col: continue
+            new_val = checked[col_name] = self._coerce(col, new_val)
+            if col.is_primary_key and new_val is None:
+                raise ValueError(f"Primary key column {col_name} cannot be null")
+            if (col.is_primary_key or col.is_unique) and new_val is not None:
+                if len(rids) > 1:
+                    raise ValueError(f"Duplicate value '{new_val}' for unique column '{col_name}'")
+                if new_val != self.slots[rids[0]][self.positions[col_name]] and new_val in self.indexes[col_name]:
+                    raise ValueError(f"Duplicate value '{new_val}' for unique column '{col_name}'")
+        return checked
+
+    def _update_rids(self, rids: List[int], updates: Dict[str, Any]):
+        # Only indexes on updated columns move, and only for the updated rows
+        self._materialize()
+        self.version = next(_versions)
+        changed = [(index, self.positions[index.column]) for index in self.indexes.values()
+                   if index.column in updates]
+        assignments = [(self.positions[key], val) for key, val in updates.items() if key in self.positions]
+        before = [(rid, self.slots[rid]) for rid in rids]
+        try:
+            for rid, old in before:
+                new = list(old)
+                for pos, val in assignments:
+                    new[pos] = val
+                self.slots[rid] = tuple(new)
+                for index, pos in changed:
+                    index.remove(old[pos], rid)
+                    index.add(new[pos], rid)
+        except Exception:
+            # An index refused a value: put back the rows already changed
+            self._restore(before)
+            raise
+        if self.undo_log is not None:
+            self.undo_log.append(("update", before))
+        self.changes += len(rids)
+
+    def vacuum(self) -> int:
+        # Compacts away tombstones. This renumbers rids, so it is logged and
+        # replayed like any other mutation.
+        reclaimed = self.tombstones
+        if reclaimed and self.undo_log is not None:
+            raise ValueError("VACUUM cannot run inside a transaction")
+        if reclaimed:
+            self.slots = self._new_slots(rec for rec in self.slots if rec is not None)
+            self.tombstones = 0
             self._rebuild_indexes()
-        return updated_count
+            self._log("vacuum", {})
+        return reclaimed
 
-    def to_dict(self):
+    def rollback(self, undo_log: List[tuple]):
+        # Undo a transaction's mutations, newest first. Inserts only ever
+        # append, so undoing one truncates slots back to where it started.
+        self.undo_log = None
+        self.version = next(_versions)
+        for entry in reversed(undo_log):
+            kind = entry[0]
+            indexes = [(index, self.positions[index.column]) for index in self.indexes.values()]
+            if kind == "insert":
+                start = entry[1]
+                for rid in range(start, len(self.slots)):
+                    rec = self.slots[rid]
+                    for index, pos in indexes:
+                        index.remove(rec[pos], rid)
+                del self.slots[start:]
+            elif kind == "delete":
+                for rid, rec in entry[1]:
+                    self.slots[rid] = rec
+                    for index, pos in indexes:
+                        index.add(rec[pos], rid)
+                self.tombstones -= len(entry[1])
+            elif kind == "update":
+                self._restore(entry[1])
+
+    def _restore(self, before: List[Tuple[int, Record]]):
+        # Puts back records as they were before an update, moving only the
+        # index entries of values that changed
+        indexes = [(index, self.positions[index.column]) for index in self.indexes.values()]
+        for rid, old in before:
+            new = self.slots[rid]
+            self.slots[rid] = old
+            for index, pos in indexes:
+                if new[pos] != old[pos]:
+                    index.remove(new[pos], rid)
+                    index.add(old[pos], rid)
+
+    def _log(self, op: str, data: Dict[str, Any]):
+        if self.journal:
+            self.journal(self, op, data)
+
+    def apply_log(self, record: Dict[str, Any]):
+        # Replays a record produced by _log on the image it was logged against
+        op = record["op"]
+        if op == "insert":
+            # "row"/"values" (dicts) are the format of logs written before records
+            self.insert_many([self.as_dict(record["record"])] if "record" in record else [record["row"]])
+        elif op == "insert_many":
+            if "records" in record:
+                self.insert_many([self.as_dict(values) for values in record["records"]])
+            else:
+                self.insert_many(record["values"])
+        elif op == "update":
+            self._update_rids(record["rows"], record["set"])
+        elif op == "delete":
+            self._delete_rids(record["rows"])
+        elif op == "vacuum":
+            self.vacuum()
+        elif op == "create_index":
+            self.create_index(record["index"]["name"], record["index"]["column"], record["index"]["kind"])
+        elif op == "drop_index":
+            self.drop_index(record["name"])
+        self.lsn = record["lsn"]
+
+    def metadata(self) -> Dict[str, Any]:
+        # Everything to_dict() holds except the rows
         return {
             "name": self.name,
             "columns": [c.to_dict() for c in self.columns.values()],
-            "rows": self.rows
+            "lsn": self.lsn,
+            "layout": self.layout,
+            "indexes": self.index_defs,
+            "statistics": self.statistics.to_dict() if self.statistics else None,
         }
 
+    def to_dict(self):
+        data = self.metadata()
+        data["rows"] = list(self.rows)
+        return data
+
     @staticmethod
     def from_dict(data: Dict[str, Any]):
         cols = [Column.from_dict(c) for c in data["columns"]]
-        table = Table(data["name"], cols)
+        table = Table(data["name"], cols, data.get("layout", "row"))
+        table.index_defs = data.get("indexes", [])
         table.rows = data["rows"]
+        table.statistics = TableStats.from_dict(data["statistics"]) if data.get("statistics") else None
+        table.lsn = data.get("lsn", 0)
         table._rebuild_indexes()
         return table
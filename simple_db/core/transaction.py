@@ -0,0 +1,41 @@
+from typing import Any, Dict, List
+from .table import Table
+
+
+class Transaction:
+    # An explicit transaction, started with Database.begin(). Tables join the
+    # transaction through touch() before their first write: from then on their
+    # mutations record undo entries and their log records are held here
+    # instead of going to the write-ahead log. Database.commit() writes the
+    # records and a commit marker in one batch; Database.rollback() replays
+    # the undo entries.
+    #
+    # touch() also takes the table's write lock, held until the transaction
+    # ends, so a table belongs to at most one transaction at a time. Two
+    # transactions locking the same tables in opposite order deadlock; the
+    # second to wait gives up after lock_timeout seconds.
+    def __init__(self, lock_timeout: float = 10.0):
+        self.records: List[Dict[str, Any]] = []
+        self.tables: Dict[str, Table] = {}
+        self.undo: Dict[str, List[tuple]] = {}
+        self.active = True
+        self.lock_timeout = lock_timeout
+
+    def touch(self, table: Table):
+        if not self.active:
+            raise ValueError("Transaction is no longer active")
+        if table.name in self.tables:
+            return
+        table.lock.acquire_write(self.lock_timeout)
+        self.tables[table.name] = table
+        table.undo_log = self.undo[table.name] = []
+        table.journal = self._journal
+
+    def release(self):
+        for table in self.tables.values():
+            table.lock.release_write()
+
+    def _journal(self, table: Table, op: str, data: Dict[str, Any]):
+        record = {"table": table.name, "op": op}
+        record.update(data)
+        self.records.append(record)
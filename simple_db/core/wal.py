@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List
+
+SYNC_MODES = ("full", "normal", "off")
+
+
+class WriteAheadLog:
+    # Append-only log of table mutations, one compact JSON record per line.
+    # Every record carries a monotonically increasing log sequence number (lsn)
+    # so a table image written at checkpoint time knows which records it
+    # already contains.
+    #
+    # Records are appended to an in-memory buffer and reach the file on
+    # commit(). Commits use group commit: the first committer to find no
+    # write in progress becomes the leader and writes (and syncs) everything
+    # buffered so far, including records of commits that arrived while it
+    # waited; those followers just wait for the leader instead of issuing
+    # their own write and fsync.
+    #
+    # Records of a transaction carry a "txn" id and only count once the
+    # matching {"op": "commit", "txn": id} record is in the log.
+    def __init__(self, path: str):
+        self.path = path
+        self.lsn = 0
+        self.records_since_checkpoint = 0
+        # Number of file writes and fsyncs issued, for monitoring and tests
+        self.writes = 0
+        self.syncs = 0
+        self._fh = None
+        self._buffer: List[str] = []
+        self._cond = threading.Condition()
+        # Commit batches handed out / made durable, and whether a leader is writing
+        self._commit_seq = 0
+        self._written_seq = 0
+        self._writing = False
+
+    def open(self) -> List[Dict[str, Any]]:
+        # Read whatever is in the log, then reopen it for appending.
+        records = []
+        open_txns: Dict[Any, List[Dict[str, Any]]] = {}
+        # End of the last complete record; a torn write after it is cut off
+        # before appending, or the next record would be glued onto it
+        valid = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line) if line.strip() else None
+                    except ValueError:
+                        # A torn final write: everything before it is still valid
+                        break
+                    valid += len(line)
+                    if record is None:
+                        continue
+                    self.lsn = max(self.lsn, record.get("lsn", 0))
+                    op = record.get("op")
+                    if op == "checkpoint":
+                        continue
+                    if op == "commit":
+                        records.extend(open_txns.pop(record["txn"], []))
+                    elif "txn" in record:
+                        open_txns.setdefault(record["txn"], []).append(record)
+                    else:
+                        records.append(record)
+        # Transactions without a commit record never happened
+        self.records_since_checkpoint = len(records)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > valid:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+        self._fh = open(self.path, 'a')
+        return records
+
+    def append(self, record: Dict[str, Any]) -> int:
+        with self._cond:
+            return self._append(record)
+
+    def append_transaction(self, records: List[Dict[str, Any]]) -> List[int]:
+        # The records of one transaction followed by its commit marker, with
+        # consecutive lsns. The txn id is the first record's lsn, which is
+        # unique for the life of the log.
+        with self._cond:
+            txn = self.lsn + 1
+            lsns = []
+            for record in records:
+                record["txn"] = txn
+                lsns.append(self._append(record))
+            self._append({"op": "commit", "txn": txn})
+            self.records_since_checkpoint -= 1
+            return lsns
+
+    def _append(self, record: Dict[str, Any]) -> int:
+        self.lsn += 1
+        record["lsn"] = self.lsn
+        self._buffer.append(json.dumps(record, separators=(',', ':')) + "\n")
+        self.records_since_checkpoint += 1
+        return self.lsn
+
+    def commit(self, sync: str = "normal"):
+        # Make every record appended so far durable according to sync:
+        #   full   - written and fsynced before commit returns
+        #   normal - written to the OS (survives a process crash, not power loss)
+        #   off    - left in the buffer until a later commit or a checkpoint
+        if sync == "off":
+            return
+        with self._cond:
+            self._commit_seq += 1
+            seq = self._commit_seq
+            while self._written_seq < seq:
+                if self._writing:
+                    self._cond.wait()
+                    continue
+                # Become the leader for every commit queued so far
+                self._writing = True
+                batch, self._buffer = self._buffer, []
+                upto = self._commit_seq
+                self._cond.release()
+                try:
+                    self._write(batch, sync == "full")
+                finally:
+                    self._cond.acquire()
+                    self._writing = False
+                    self._written_seq = max(self._written_seq, upto)
+                    self._cond.notify_all()
+
+    def _write(self, lines: List[str], fsync: bool):
+        if lines:
+            self._fh.write("".join(lines))
+            self.writes += 1
+        self._fh.flush()
+        if fsync:
+            os.fsync(self._fh.fileno())
+            self.syncs += 1
+
+    def flush(self):
+        with self._cond:
+            self._wait_for_writer()
+            if self._fh:
+                batch, self._buffer = self._buffer, []
+                self._write(batch, False)
+
+    def sync(self):
+        # Everything appended so far, written and fsynced
+        with self._cond:
+            self._wait_for_writer()
+            if self._fh:
+                batch, self._buffer = self._buffer, []
+                self._write(batch, True)
+
+    def _wait_for_writer(self):
+        while self._writing:
+            self._cond.wait()
+
+    def truncate(self, sync: bool = False):
+        # Called once every table image is at least as new as the log, so
+        # buffered records are no longer needed either.
+        # The marker keeps the lsn sequence going across restarts.
+        with self._cond:
+            self._wait_for_writer()
+            self._buffer = []
+            self._written_seq = self._commit_seq
+            self._cond.notify_all()
+            if self._fh:
+                self._fh.close()
+            self._fh = open(self.path, 'w')
+            self._fh.write(json.dumps({"op": "checkpoint", "lsn": self.lsn}, separators=(',', ':')) + "\n")
+            self._fh.flush()
+            if sync:
+                os.fsync(self._fh.fileno())
+            self.records_since_checkpoint = 0
+
+    def close(self):
+        with self._cond:
+            self._wait_for_writer()
+            if self._fh:
+                self._write(self._buffer, False)
+                self._buffer = []
+                self._fh.close()
+                self._fh = None
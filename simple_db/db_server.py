@@ -0,0 +1,41 @@
+import argparse
+from sql.executor import SQLExecutor
+from core.database import Database
+from core.parallel import DEFAULT_MIN_ROWS
+from core.wal import SYNC_MODES
+from net.server import QueryServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a SimpleDB database over TCP")
+    parser.add_argument("db_path", nargs="?", default="db_data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5433)
+    parser.add_argument("--sync", default="normal", choices=SYNC_MODES)
+    parser.add_argument("--result-cache-mb", type=int, default=0,
+                        help="memory for cached SELECT results (0 disables the cache)")
+    parser.add_argument("--parallel-workers", type=int, default=1,
+                        help="processes for large table scans (0 = one per CPU, 1 disables)")
+    parser.add_argument("--parallel-min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="only tables with at least this many rows are scanned in parallel")
+    parser.add_argument("--slow-query-log", metavar="PATH",
+                        help="append statements slower than --slow-query-ms to this file as JSON lines")
+    parser.add_argument("--slow-query-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    db = Database(args.db_path, sync=args.sync, parallel_workers=args.parallel_workers,
+                  parallel_min_rows=args.parallel_min_rows)
+    executor = SQLExecutor(db, args.result_cache_mb * 1024 * 1024,
+                           slow_query_log=args.slow_query_log, slow_query_ms=args.slow_query_ms)
+    server = QueryServer(executor, args.host, args.port)
+    print(f"SimpleDB server on {args.host}:{args.port}, data directory: {args.db_path}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
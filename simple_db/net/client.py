@@ -0,0 +1,203 @@
+import queue
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+from net import protocol
+from net.protocol import U16, U32
+
+
+class Result:
+    # One statement's answer: columns and rows for a SELECT, otherwise the
+    # executor's message ("1 row inserted.", ...)
+    def __init__(self, columns: Optional[List[str]], rows: List[Tuple[Any, ...]], message: Optional[str]):
+        self.columns = columns
+        self.rows = rows
+        self.message = message
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __repr__(self) -> str:
+        if self.columns is None:
+            return f"Result({self.message!r})"
+        return f"Result(columns={self.columns!r}, rows={len(self.rows)})"
+
+
+class Statement:
+    # A statement prepared on the server: parsed once, executed by id
+    def __init__(self, conn: "Connection", stmt_id: int, param_count: int):
+        self.conn = conn
+        self.id = stmt_id
+        self.param_count = param_count
+
+    def execute(self, params: Sequence[Any] = ()) -> Result:
+        return self.conn._request(protocol.execute(self.id, params))
+
+    def close(self):
+        self.conn._request(protocol.frame(protocol.CLOSE, U32.pack(self.id)))
+
+
+class Pipeline:
+    # Requests queued locally and sent in one write; replies are read back
+    # in order by run(), saving a network round trip per statement
+    def __init__(self, conn: "Connection"):
+        self.conn = conn
+        self._requests: List[bytes] = []
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> "Pipeline":
+        self._requests.append(protocol.query(sql, params))
+        return self
+
+    def execute_prepared(self, stmt: Statement, params: Sequence[Any] = ()) -> "Pipeline":
+        self._requests.append(protocol.execute(stmt.id, params))
+        return self
+
+    def run(self) -> List[Any]:
+        # One Result per request, or the ValueError of a request that failed;
+        # a failure does not stop the requests queued after it
+        requests, self._requests = self._requests, []
+        self.conn._sock.sendall(b"".join(requests))
+        results = []
+        for _ in requests:
+            try:
+                results.append(self.conn._read_result())
+            except ValueError as e:
+                results.append(e)
+        return results
+
+
+class Connection:
+    # A client connection to a QueryServer. Not thread safe: share
+    # connections between threads through a ConnectionPool. Statement errors
+    # raise ValueError; transactions (BEGIN ... COMMIT) span the requests of
+    # one connection.
+    def __init__(self, host: str = "127.0.0.1", port: int = 5433, timeout: Optional[float] = None):
+        self._sock = socket.create_connection((host, port), timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        self.closed = False
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> Result:
+        return self._request(protocol.query(sql, params))
+
+    def prepare(self, sql: str) -> Statement:
+        self._sock.sendall(protocol.frame(protocol.PREPARE, protocol.encode_text(sql)))
+        kind, payload = self._read_frame()
+        if kind == protocol.ERROR:
+            raise ValueError(protocol.decode_text(payload))
+        self._expect(kind, protocol.PREPARED)
+        return Statement(self, U32.unpack_from(payload, 0)[0], U16.unpack_from(payload, 4)[0])
+
+    def pipeline(self) -> Pipeline:
+        return Pipeline(self)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._file.close()
+            self._sock.close()
+
+    def __enter__(self) -> "Connection":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, data: bytes) -> Result:
+        self._sock.sendall(data)
+        return self._read_result()
+
+    def _read_result(self) -> Result:
+        # Reads the whole reply to one request. An ERROR is raised only after
+        # its frame is consumed, so the connection stays usable.
+        columns, rows = None, []
+        while True:
+            kind, payload = self._read_frame()
+            if kind == protocol.DONE:
+                return Result(columns, rows, protocol.decode_text(payload))
+            if kind == protocol.ERROR:
+                raise ValueError(protocol.decode_text(payload))
+            if kind == protocol.COLUMNS:
+                columns = protocol.decode_values(payload, 0)[0]
+            else:
+                self._expect(kind, protocol.ROWS)
+                rows.extend(protocol.decode_rows(payload, len(columns)))
+
+    def _read_frame(self) -> Tuple[int, bytes]:
+        header = self._file.read(protocol.HEADER.size)
+        if len(header) < protocol.HEADER.size:
+            self.close()
+            raise ConnectionError("Server closed the connection")
+        length, kind = protocol.parse_header(header)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            self.close()
+            raise ConnectionError("Server closed the connection")
+        return kind, payload
+
+    def _expect(self, kind: int, expected: int):
+        if kind != expected:
+            self.close()
+            raise ConnectionError(f"Protocol error: unexpected message type {kind}")
+
+
+class ConnectionPool:
+    # Up to size connections shared by the threads of one process. A
+    # connection is checked out for the duration of a connection() block;
+    # callers wait when all of them are in use.
+    def __init__(self, host: str = "127.0.0.1", port: int = 5433, size: int = 4,
+                 timeout: Optional[float] = None):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._all: List[Connection] = []
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        # A block that raises may have left a transaction open or replies
+        # unread, so its connection is closed rather than handed to the next
+        # caller; the server rolls back whatever the connection left open
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            raise
+        finally:
+            if conn is not None and not conn.closed:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def _checkout(self) -> Connection:
+        # Connections are opened lazily; closed ones are replaced
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = Connection(self.host, self.port, self.timeout)
+                with self._lock:
+                    self._all = [c for c in self._all if not c.closed] + [conn]
+                return conn
+            if not conn.closed:
+                return conn
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> Result:
+        with self.connection() as conn:
+            return conn.execute(sql, params)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
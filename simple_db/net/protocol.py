@@ -0,0 +1,107 @@
+import struct
+from typing import Any, List, Optional, Sequence, Tuple
+from core.storage import decode_value, encode_value
+
+# Wire protocol shared by the query server and the client.
+#
+# Every message is a frame: a u32 length (of everything after it), a u8
+# message type and a payload. Values use the same type-tagged encoding as
+# paged table files, so ints, floats, strings, booleans and NULL round-trip
+# exactly.
+#
+#   client -> server
+#     QUERY    sql, params        run a statement
+#     PREPARE  sql                parse once, answered by PREPARED
+#     EXECUTE  u32 id, params     run a prepared statement
+#     CLOSE    u32 id             forget a prepared statement, answered by DONE
+#   server -> client
+#     PREPARED u32 id, u16 param count
+#     COLUMNS  u16 n, n names     start of a SELECT result
+#     ROWS     u32 n, n rows      a batch of rows, values in column order
+#     DONE     message or NULL    end of a result
+#     ERROR    message            the request failed; ends its result
+#
+# params is a u16 count followed by the values. A SELECT answers with
+# COLUMNS, any number of ROWS frames and DONE; other statements answer with
+# DONE carrying the executor's message. Requests are answered strictly in
+# order, so a client may send several before reading any reply.
+QUERY, PREPARE, EXECUTE, CLOSE = range(1, 5)
+PREPARED, COLUMNS, ROWS, DONE, ERROR = range(16, 21)
+
+HEADER = struct.Struct(">IB")
+U16 = struct.Struct(">H")
+U32 = struct.Struct(">I")
+# Refuse frames larger than this instead of buffering them
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def frame(kind: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(len(payload) + 1, kind) + payload
+
+
+def parse_header(data: bytes) -> Tuple[int, int]:
+    # (payload length, message type)
+    length, kind = HEADER.unpack(data)
+    if not 1 <= length <= MAX_FRAME:
+        raise ValueError(f"Invalid frame length {length}")
+    return length - 1, kind
+
+
+def encode_values(values: Sequence[Any], out: bytearray):
+    out += U16.pack(len(values))
+    for val in values:
+        encode_value(val, out)
+
+
+def decode_values(buf, pos: int) -> Tuple[List[Any], int]:
+    count = U16.unpack_from(buf, pos)[0]
+    pos += 2
+    values = []
+    for _ in range(count):
+        val, pos = decode_value(buf, pos)
+        values.append(val)
+    return values, pos
+
+
+def encode_text(text: Optional[str]) -> bytes:
+    out = bytearray()
+    encode_value(text, out)
+    return bytes(out)
+
+
+def decode_text(buf, pos: int = 0) -> Optional[str]:
+    return decode_value(buf, pos)[0]
+
+
+def query(sql: str, params: Sequence[Any] = ()) -> bytes:
+    out = bytearray()
+    encode_value(sql, out)
+    encode_values(params, out)
+    return frame(QUERY, bytes(out))
+
+
+def execute(stmt_id: int, params: Sequence[Any] = ()) -> bytes:
+    out = bytearray(U32.pack(stmt_id))
+    encode_values(params, out)
+    return frame(EXECUTE, bytes(out))
+
+
+def rows_frame(rows: Sequence[Sequence[Any]]) -> bytes:
+    out = bytearray(U32.pack(len(rows)))
+    for row in rows:
+        for val in row:
+            encode_value(val, out)
+    return frame(ROWS, bytes(out))
+
+
+def decode_rows(buf, width: int) -> List[Tuple[Any, ...]]:
+    count = U32.unpack_from(buf, 0)[0]
+    pos = 4
+    rows = []
+    for _ in range(count):
+        row = []
+        for _ in range(width):
+            val, pos = decode_value(buf, pos)
+            row.append(val)
+        rows.append(tuple(row))
+    return rows
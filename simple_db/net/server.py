@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Set
+from sql.executor import SQLExecutor
+from net import protocol
+from net.protocol import U16, U32
+
+
+class Session:
+    # The server side of one client connection. Statements run on the
+    # session's own worker thread: transactions and the read locks of a
+    # streaming SELECT belong to a thread, so every request of a connection
+    # has to run on the same one.
+    def __init__(self, executor: SQLExecutor, batch_size: int):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.cursor = executor.cursor()
+        self.statements: Dict[int, Dict[str, Any]] = {}
+        self.next_id = 1
+        # True while a SELECT has rows left to send
+        self.streaming = False
+
+    def request(self, kind: int, payload: bytes) -> bytes:
+        try:
+            if kind == protocol.QUERY:
+                sql, pos = protocol.decode_value(payload, 0)
+                params, _ = protocol.decode_values(payload, pos)
+                start = time.perf_counter()
+                cmd = self.executor.parser.parse(sql)
+                return self._run(cmd, params, sql, time.perf_counter() - start)
+            if kind == protocol.EXECUTE:
+                params, _ = protocol.decode_values(payload, 4)
+                return self._run(self._statement(payload), params)
+            if kind == protocol.PREPARE:
+                cmd = self.executor.parser.parse(protocol.decode_text(payload))
+                stmt_id, self.next_id = self.next_id, self.next_id + 1
+                self.statements[stmt_id] = cmd
+                return protocol.frame(protocol.PREPARED, U32.pack(stmt_id) + U16.pack(cmd["param_count"]))
+            if kind == protocol.CLOSE:
+                self.statements.pop(U32.unpack_from(payload, 0)[0], None)
+                return protocol.frame(protocol.DONE, protocol.encode_text(None))
+            raise ValueError(f"Unknown message type {kind}")
+        except Exception as e:
+            return self._error(e)
+
+    def _statement(self, payload: bytes) -> Dict[str, Any]:
+        stmt_id = U32.unpack_from(payload, 0)[0]
+        if stmt_id not in self.statements:
+            raise ValueError(f"Unknown prepared statement {stmt_id}")
+        return self.statements[stmt_id]
+
+    def _run(self, cmd: Dict[str, Any], params, sql: Optional[str] = None, parse_time: float = 0.0) -> bytes:
+        self.cursor.run(cmd, params, sql, parse_time)
+        if self.cursor.columns is None:
+            return protocol.frame(protocol.DONE, protocol.encode_text(self.cursor.message))
+        names = bytearray()
+        protocol.encode_values(self.cursor.columns, names)
+        self.streaming = True
+        return protocol.frame(protocol.COLUMNS, bytes(names)) + self.more()
+
+    def more(self) -> bytes:
+        # The next batch of rows, followed by DONE once the result is exhausted
+        try:
+            rows = self.cursor.fetchmany(self.batch_size)
+        except Exception as e:
+            return self._error(e)
+        out = protocol.rows_frame(rows) if rows else b""
+        if len(rows) < self.batch_size:
+            self.streaming = False
+            self.cursor.close()
+            out += protocol.frame(protocol.DONE, protocol.encode_text(None))
+        return out
+
+    def _error(self, e: Exception) -> bytes:
+        self.streaming = False
+        self.cursor.close()
+        return protocol.frame(protocol.ERROR, protocol.encode_text(str(e)))
+
+    def close(self):
+        # Runs on the worker thread: a transaction left open by a client that
+        # went away is rolled back
+        self.cursor.close()
+        if self.executor.txn:
+            self.executor.dispatch({"type": "ROLLBACK", "table": None})
+
+
+class QueryServer:
+    # Serves one database to many client processes over TCP (see
+    # net/protocol.py). The event loop only moves frames; statements run on
+    # a worker thread per connection, so a slow query never holds up other
+    # connections and concurrent clients share the executor's table locks
+    # like threads of one process.
+    def __init__(self, executor: SQLExecutor, host: str = "127.0.0.1", port: int = 5433,
+                 batch_size: int = 500):
+        self.executor = executor
+        self.host = host
+        self.port = port
+        # Rows per ROWS frame
+        self.batch_size = batch_size
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._thread: Optional[threading.Thread] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve(self):
+        if self._server is None:
+            await self.start()
+        await self._stop.wait()
+        self._server.close()
+        await self._server.wait_closed()
+        # Closing the sockets ends each connection's read loop
+        for writer in list(self._writers):
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers))
+
+    def run(self):
+        # Blocks until stop() is called from another thread
+        asyncio.run(self.serve())
+
+    def start_background(self) -> "QueryServer":
+        # Serves from a daemon thread; returns once the server is listening
+        ready = threading.Event()
+
+        async def main():
+            await self.start()
+            ready.set()
+            await self.serve()
+
+        self._thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        session = Session(self.executor, self.batch_size)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(protocol.HEADER.size)
+                    length, kind = protocol.parse_header(header)
+                    payload = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                data = await loop.run_in_executor(session.worker, session.request, kind, payload)
+                writer.write(data)
+                while session.streaming:
+                    await writer.drain()
+                    writer.write(await loop.run_in_executor(session.worker, session.more))
+                # Only waits when the client is not reading its replies
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            await loop.run_in_executor(session.worker, session.close)
+            session.worker.shutdown(wait=False)
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
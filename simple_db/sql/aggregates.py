@@ -0,0 +1,120 @@
+from typing import Any
+
+# Streaming accumulators for aggregate functions: each group keeps one
+# accumulator per aggregate and folds rows into it as they arrive, so no
+# group ever holds its rows. NULL inputs are ignored (COUNT(*) counts rows).
+# merge() folds in an accumulator of the same kind fed with other rows, for
+# partial aggregates computed on separate row ranges.
+
+
+class CountStar:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def step(self, value: Any):
+        self.count += 1
+
+    def merge(self, other: "CountStar"):
+        self.count += other.count
+
+    def result(self) -> Any:
+        return self.count
+
+
+class Count:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def step(self, value: Any):
+        if value is not None:
+            self.count += 1
+
+    def merge(self, other: "Count"):
+        self.count += other.count
+
+    def result(self) -> Any:
+        return self.count
+
+
+class Sum:
+    __slots__ = ("total",)
+
+    def __init__(self):
+        self.total = None
+
+    def step(self, value: Any):
+        if value is not None:
+            self.total = value if self.total is None else self.total + value
+
+    def merge(self, other: "Sum"):
+        self.step(other.total)
+
+    def result(self) -> Any:
+        return self.total
+
+
+class Avg:
+    __slots__ = ("total", "count")
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def step(self, value: Any):
+        if value is not None:
+            self.total += value
+            self.count += 1
+
+    def merge(self, other: "Avg"):
+        self.total += other.total
+        self.count += other.count
+
+    def result(self) -> Any:
+        return self.total / self.count if self.count else None
+
+
+class Min:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def step(self, value: Any):
+        if value is not None and (self.value is None or value < self.value):
+            self.value = value
+
+    def merge(self, other: "Min"):
+        self.step(other.value)
+
+    def result(self) -> Any:
+        return self.value
+
+
+class Max:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def step(self, value: Any):
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def merge(self, other: "Max"):
+        self.step(other.value)
+
+    def result(self) -> Any:
+        return self.value
+
+
+AGGREGATES = {"COUNT": Count, "SUM": Sum, "AVG": Avg, "MIN": Min, "MAX": Max}
+
+
+def make_accumulator(func: str, star: bool = False):
+    if star:
+        return CountStar()
+    return AGGREGATES[func]()
@@ -0,0 +1,76 @@
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sql.executor import SQLExecutor
+
+
+class Cursor:
+    # Streaming access to query results as Python values, modelled on DB-API
+    # cursors. A SELECT is not run up front: rows are pulled through the
+    # executor's generator pipeline as they are fetched, so fetching the first
+    # rows of a big table (or a LIMIT) only reads those rows. Until the rows
+    # are exhausted or the cursor is closed, writers to the tables it reads
+    # wait. Errors raise ValueError instead of coming back as "Error: ..." text.
+    arraysize = 100
+
+    def __init__(self, executor: "SQLExecutor"):
+        self.executor = executor
+        self.columns: Optional[List[str]] = None
+        self.message: Optional[str] = None
+        self.rownumber = 0
+        self._rows: Iterator[Dict[str, Any]] = iter(())
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> "Cursor":
+        start = time.perf_counter()
+        cmd = self.executor.parser.parse(sql)
+        return self.run(cmd, params, sql, time.perf_counter() - start)
+
+    def run(self, cmd: Dict[str, Any], params: Sequence[Any] = (), sql: Optional[str] = None,
+            parse_time: float = 0.0) -> "Cursor":
+        # Executes an already parsed statement, e.g. a prepared one
+        cmd = self.executor.bind(cmd, params)
+        self.close()
+        self.rownumber = 0
+        if cmd["type"] == "SELECT":
+            self.columns, self._rows = self.executor.select(cmd, sql, parse_time)
+            self.message = None
+        else:
+            self.columns, self._rows = None, iter(())
+            self.message = self.executor.dispatch(cmd, sql, parse_time)
+        return self
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        row = next(self._rows, None)
+        if row is None:
+            return None
+        self.rownumber += 1
+        return tuple(row.get(col) for col in self.columns)
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Tuple[Any, ...]]:
+        batch = []
+        for _ in range(self.arraysize if size is None else size):
+            row = self.fetchone()
+            if row is None:
+                break
+            batch.append(row)
+        return batch
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return list(self)
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        # Ends the pipeline early; this releases the table read locks a
+        # SELECT holds while its rows are being fetched
+        close = getattr(self._rows, "close", None)
+        if close:
+            close()
+        self._rows = iter(())
+        self.columns = None
@@ -1,34 +1,205 @@
-from typing import Any, Dict, List, Callable
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Callable, Optional, Sequence, Tuple
 from core.database import Database
 from core.table import Column
-from sql.parser import SQLParser
+from core.transaction import Transaction
+from sql.parser import SQLParser, bind_params, check_count
+from sql.planner import QueryPlanner
+from sql.joins import hash_join, index_nested_loop_join, merge_join, parallel_hash_join
+from sql.predicates import compile_condition
+from sql.aggregates import make_accumulator
+from sql import vectorized
+from sql.cursor import Cursor
+from sql.result_cache import ResultCache, statement_key
+from sql.instrumentation import QueryMetrics, QueryObserver, QueryStats, SlowQueryLog
+
+
+class PreparedStatement:
+    # A statement parsed once and executed many times with different ? parameters
+    def __init__(self, executor: "SQLExecutor", sql: str, cmd: Dict[str, Any]):
+        self.executor = executor
+        self.sql = sql
+        self.cmd = cmd
+        self.param_count = cmd["param_count"]
+
+    def execute(self, params: Sequence[Any] = ()) -> str:
+        return self.executor.run(self.cmd, params, self.sql)
+
+    def executemany(self, param_sets: Iterable[Sequence[Any]]) -> str:
+        return self.executor.run_many(self.cmd, param_sets, self.sql)
 
 
 class SQLExecutor:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, result_cache_bytes: int = 0, metrics: bool = False,
+                 slow_query_log: Optional[str] = None, slow_query_ms: float = 100.0):
         self.db = db
         self.parser = SQLParser()
+        self.planner = QueryPlanner(db)
+        # Opt-in cache of SELECT results, bounded to result_cache_bytes
+        self.result_cache = ResultCache(result_cache_bytes) if result_cache_bytes else None
+        # Transactions are per thread, so one executor can serve many threads
+        self._local = threading.local()
+        # Receive a QueryStats per statement; see sql.instrumentation
+        self.observers: List[QueryObserver] = []
+        self.metrics = self.add_observer(QueryMetrics()) if metrics else None
+        self.slow_log = self.add_observer(SlowQueryLog(slow_query_log, slow_query_ms)) if slow_query_log else None
+
+    @property
+    def txn(self) -> Optional[Transaction]:
+        # Open transaction started with BEGIN on this thread; None in autocommit mode
+        return getattr(self._local, "txn", None)
+
+    @txn.setter
+    def txn(self, txn: Optional[Transaction]):
+        self._local.txn = txn
 
-    def execute(self, sql: str) -> str:
+    @property
+    def _stats(self) -> Optional[QueryStats]:
+        # Measurements of the statement running on this thread, if observed
+        return getattr(self._local, "stats", None)
+
+    def add_observer(self, observer: QueryObserver) -> QueryObserver:
+        self.observers.append(observer)
+        return observer
+
+    def remove_observer(self, observer: QueryObserver):
+        self.observers.remove(observer)
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> str:
+        start = time.perf_counter()
         try:
             cmd = self.parser.parse(sql)
         except ValueError as e:
             return f"Syntax Error: {e}"
+        return self.run(cmd, params or (), sql, time.perf_counter() - start)
 
+    def executemany(self, sql: str, param_sets: Iterable[Sequence[Any]]) -> str:
+        start = time.perf_counter()
         try:
-            if cmd["type"] == "CREATE":
-                return self._exec_create(cmd)
-            elif cmd["type"] == "INSERT":
-                return self._exec_insert(cmd)
-            elif cmd["type"] == "SELECT":
-                return self._exec_select(cmd)
-            elif cmd["type"] == "UPDATE":
-                return self._exec_update(cmd)
-            elif cmd["type"] == "DELETE":
-                return self._exec_delete(cmd)
+            cmd = self.parser.parse(sql)
+        except ValueError as e:
+            return f"Syntax Error: {e}"
+        return self.run_many(cmd, param_sets, sql, time.perf_counter() - start)
+
+    def prepare(self, sql: str) -> PreparedStatement:
+        # Raises ValueError for invalid SQL instead of returning the message
+        return PreparedStatement(self, sql, self.parser.parse(sql))
+
+    def cursor(self) -> "Cursor":
+        return Cursor(self)
+
+    def bind(self, cmd: Dict[str, Any], params: Sequence[Any]) -> Dict[str, Any]:
+        if len(params) != cmd["param_count"]:
+            raise ValueError(f"Expected {cmd['param_count']} parameters, got {len(params)}")
+        if not params:
+            return cmd
+        cmd = bind_params(cmd, list(params))
+        select = cmd["statement"] if cmd["type"] == "EXPLAIN" else cmd
+        if select["type"] == "SELECT":
+            check_count("LIMIT", select.get("limit"))
+            check_count("OFFSET", select.get("offset"))
+        return cmd
+
+    def run(self, cmd: Dict[str, Any], params: Sequence[Any] = (), sql: Optional[str] = None,
+            parse_time: float = 0.0) -> str:
+        try:
+            return self.dispatch(self.bind(cmd, params), sql, parse_time)
         except Exception as e:
             return f"Error: {e}"
-        
+
+    def run_many(self, cmd: Dict[str, Any], param_sets: Iterable[Sequence[Any]], sql: Optional[str] = None,
+                 parse_time: float = 0.0) -> str:
+        # INSERTs become one batch: validated together, logged as one record
+        # and flushed once. Other statements run once per parameter set.
+        param_sets = list(param_sets)
+        if cmd["type"] != "INSERT":
+            return "\n".join(self.run(cmd, params, sql) for params in param_sets)
+        try:
+            rows = [values for params in param_sets for values in self.bind(cmd, params)["rows"]]
+            return self.dispatch(dict(cmd, rows=rows), sql, parse_time)
+        except Exception as e:
+            return f"Error: {e}"
+
+    def dispatch(self, cmd: Dict[str, Any], sql: Optional[str] = None, parse_time: float = 0.0) -> str:
+        # Runs a bound statement; errors propagate as exceptions. Observers
+        # get its QueryStats once it is done.
+        if cmd["type"] == "EXPLAIN" and cmd.get("analyze"):
+            return self._explain_analyze(cmd["statement"], sql, parse_time)
+        if not self.observers or self._stats is not None:
+            return self._dispatch(cmd)
+        return self._measured(QueryStats(cmd, sql, parse_time), cmd)
+
+    def _measured(self, stats: QueryStats, cmd: Dict[str, Any]) -> str:
+        self._local.stats = stats
+        start = time.perf_counter()
+        try:
+            return self._dispatch(cmd)
+        except Exception as e:
+            stats.error = str(e)
+            raise
+        finally:
+            stats.run_time = time.perf_counter() - start
+            self._local.stats = None
+            self._report(stats)
+
+    def _report(self, stats: QueryStats):
+        stats.settle()
+        for observer in self.observers:
+            observer.on_query(stats)
+
+    def _explain_analyze(self, cmd: Dict[str, Any], sql: Optional[str], parse_time: float) -> str:
+        # Runs the statement (a write is applied), then shows its plan with
+        # the measured numbers
+        if cmd["type"] == "EXPLAIN":
+            raise ValueError("EXPLAIN ANALYZE cannot analyze an EXPLAIN")
+        estimated = self.planner.plan(cmd, estimate=True)
+        stats = QueryStats(cmd, sql, parse_time)
+        self._measured(stats, cmd)
+        return self.planner.explain(estimated) + "\n" + stats.format()
+
+    def _dispatch(self, cmd: Dict[str, Any]) -> str:
+        if self.txn and cmd["type"] in ("CREATE", "CREATE_INDEX", "DROP_INDEX", "VACUUM", "ANALYZE"):
+            raise ValueError(f"{cmd['type'].replace('_', ' ')} cannot run inside a transaction")
+        if cmd["type"] == "BEGIN":
+            if self.txn:
+                raise ValueError("A transaction is already in progress")
+            self.txn = self.db.begin()
+            return "Transaction started."
+        elif cmd["type"] in ("COMMIT", "ROLLBACK"):
+            if not self.txn:
+                raise ValueError("No transaction in progress")
+            txn, self.txn = self.txn, None
+            if cmd["type"] == "COMMIT":
+                with self._persisting():
+                    self.db.commit(txn)
+                return "Transaction committed."
+            self.db.rollback(txn)
+            return "Transaction rolled back."
+        elif cmd["type"] == "CREATE":
+            return self._exec_create(cmd)
+        elif cmd["type"] == "INSERT":
+            return self._exec_insert(cmd)
+        elif cmd["type"] == "SELECT":
+            return self._exec_select(cmd)
+        elif cmd["type"] == "UPDATE":
+            return self._exec_update(cmd)
+        elif cmd["type"] == "DELETE":
+            return self._exec_delete(cmd)
+        elif cmd["type"] == "CREATE_INDEX":
+            return self._exec_create_index(cmd)
+        elif cmd["type"] == "DROP_INDEX":
+            return self._exec_drop_index(cmd)
+        elif cmd["type"] == "VACUUM":
+            return f"{self.db.vacuum(cmd['table'])} rows reclaimed."
+        elif cmd["type"] == "ANALYZE":
+            count = self.db.analyze(cmd["table"])
+            return "1 table analyzed." if count == 1 else f"{count} tables analyzed."
+        elif cmd["type"] == "EXPLAIN":
+            return self.planner.explain(self.planner.plan(cmd["statement"], estimate=True))
         return "Unknown command"
 
     def _exec_create(self, cmd):
@@ -38,123 +209,426 @@ class SQLExecutor:
                 c["name"], 
                 c["type"], 
                 is_primary_key=c["pk"],
-                is_unique=c["unique"]
+                is_unique=c["unique"],
+                nullable=c["nullable"]
             ))
-        self.db.create_table(cmd["table"], cols)
+        partition = cmd.get("partition")
+        if partition:
+            self.db.create_table(cmd["table"], cols, cmd.get("layout", "row"), partition["column"], partition["count"])
+        else:
+            self.db.create_table(cmd["table"], cols, cmd.get("layout", "row"))
         return f"Table '{cmd['table']}' created."
 
-    def _exec_insert(self, cmd):
+    def _exec_create_index(self, cmd):
         table = self.db.get_table(cmd["table"])
-        table.insert(cmd["data"])
+        with table.lock.writing():
+            table.create_index(cmd["name"], cmd["column"], cmd["kind"])
         self.db.save_table(table.name)
-        return "1 row inserted."
+        return f"Index '{cmd['name']}' created."
+
+    def _exec_drop_index(self, cmd):
+        names = [cmd["table"]] if cmd["table"] else self.db.table_names()
+        for name in names:
+            table = self.db.get_table(name)
+            if any(d["name"] == cmd["name"] for d in table.index_defs):
+                with table.lock.writing():
+                    table.drop_index(cmd["name"])
+                self.db.save_table(table.name)
+                return f"Index '{cmd['name']}' dropped."
+        raise ValueError(f"Index {cmd['name']} not found.")
+
+    def _exec_insert(self, cmd):
+        table = self._write_target(cmd["table"])
+        columns = cmd["columns"]
+        with table.lock.writing():
+            count = table.insert_many([dict(zip(columns, values)) for values in cmd["rows"]])
+        self._statement_done(table, count)
+        return "1 row inserted." if count == 1 else f"{count} rows inserted."
+
+    def _write_target(self, name: str):
+        # Inside a transaction the table joins it before its first change
+        table = self.db.get_table(name)
+        if self.txn:
+            self.txn.touch(table)
+        return table
+
+    def _statement_done(self, table, count: int):
+        # Autocommit: every statement commits on its own. Inside a
+        # transaction nothing is logged until COMMIT.
+        if self._stats is not None:
+            self._stats.rows_affected = count
+        if not self.txn:
+            with self._persisting():
+                self.db.save_table(table.name)
+
+    @contextmanager
+    def _persisting(self):
+        # Time spent making changes durable (log writes, checkpoints)
+        stats = self._stats
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if stats is not None:
+                stats.persist_time += time.perf_counter() - start
+
+    def _plan(self, cmd):
+        stats = self._stats
+        if stats is None:
+            return self.planner.plan(cmd)
+        start = time.perf_counter()
+        plan = stats.plan = self.planner.plan(cmd)
+        stats.plan_time += time.perf_counter() - start
+        if plan.get("access") in ("index", "range", "index_order"):
+            stats.index_lookups += 1
+        elif plan.get("access") == "index_minmax":
+            stats.index_lookups += len(plan["aggregate"]["indexes"])
+        return plan
+
+    def _where_func(self, cond, table=None):
+        # Compiled once per query; the same callable serves select, update and
+        # delete. With a table it reads that table's records, otherwise dicts.
+        return compile_condition(cond, table.positions if table is not None else None)
+
+    def _candidates(self, table, plan):
+        # Row positions to test, or None for a full scan
+        reverse = bool(plan.get("ordered") and plan["order_by"]["desc"])
+        if plan["access"] == "index":
+            return table.lookup(plan["index"], plan["key"])
+        if plan["access"] == "range":
+            return table.index_range(plan["index"], plan["low"], plan["high"],
+                                     plan["low_inclusive"], plan["high_inclusive"], reverse)
+        if plan["access"] == "index_order":
+            return table.index_order(plan["index"], reverse)
+        if plan["access"] == "vector_scan":
+            return vectorized.filter_rids(table, plan["vector_filter"])
+        return None
+
+    def _counted_candidates(self, table, candidates, stats, plan):
+        # The rids a scan will read, passed through a counter. A full scan
+        # gets the live rids so it can be counted the same way.
+        if plan["access"] == "vector_scan":
+            return candidates
+        if candidates is None:
+            slots = table.slots
+            candidates = range(len(slots)) if not table.tombstones else \
+                (rid for rid, rec in enumerate(slots) if rec is not None)
+        return stats.counted(candidates)
 
     def _exec_select(self, cmd):
+        columns, rows = self.select(cmd)
+        rows = list(rows)
+        if self._stats is not None:
+            self._stats.rows_returned = len(rows)
+        return self._format_result(columns, rows)
+
+    def select(self, cmd: Dict[str, Any], sql: Optional[str] = None,
+               parse_time: float = 0.0) -> Tuple[List[str], Iterator[Dict[str, Any]]]:
+        # Returns the output column names and a (not yet started) generator
+        # over the result rows. Rows are only read from the table as the
+        # caller consumes them, so LIMIT stops the scan early unless a sort
+        # has to see every row first.
+        columns, rows = self._select(cmd)
+        if self.observers and self._stats is None:
+            rows = self._observed_rows(QueryStats(cmd, sql, parse_time), rows)
+        return columns, rows
+
+    def _select(self, cmd):
         table = self.db.get_table(cmd["table"])
-        
-        # Handle JOIN
-        # For simplified join, we do a nested loop or hash join if possible
-        # We need to return rows combined
-        
-        rows = table.rows
-        
-        # Simplistic filtering
-        if cmd["where"]:
-            rows = [r for r in rows if self._eval_where(r, cmd["where"])]
-
-        # Handle JOIN
-        if cmd["join"]:
-            join_table_name = cmd["join"]["table"]
-            join_table = self.db.get_table(join_table_name)
-            condition = cmd["join"]["on"]
-            
-            # Very basic nested loop join
-            joined_rows = []
-            for row_a in rows:
-                for row_b in join_table.rows:
-                    if self._eval_join_condition(row_a, row_b, table.name, join_table_name, condition):
-                         # Merge rows
-                         merged = {**row_a, **{f"{join_table_name}.{k}": v for k,v in row_b.items()}}
-                         joined_rows.append(merged)
-            rows = joined_rows
-
-        # Projection
+        inner = self.db.get_table(cmd["join"]["table"]) if cmd.get("join") else None
         if cmd["columns"]:
-            projected = []
-            for r in rows:
-                new_r = {}
-                for col in cmd["columns"]:
-                    # Handle aliasing or table prefixes if needed
-                    val = r.get(col)
-                    if val is None and "." in col:
-                        # try lookup with table prefix or without
-                        t, c = col.split('.')
-                        # If table prefix matches main table, look for c
-                        if t == table.name:
-                            val = r.get(c)
-                        # If key in row is actually prefixed (joined table)
-                        elif col in r:
-                            val = r[col]
-                    new_r[col] = val 
-                projected.append(new_r)
-            rows = projected
-            
-        return self._format_result(rows)
+            columns = cmd["columns"]
+        else:
+            columns = list(table.columns)
+            if inner:
+                columns += [f"{inner.name}.{c}" for c in inner.columns]
+        # Inside a transaction results may include uncommitted changes, which
+        # must not be served to other threads from the cache
+        if self.result_cache is not None and not self.txn:
+            return columns, self._cached_rows(cmd, table, inner)
+        return columns, self._select_rows(cmd, table, inner)
+
+    def _observed_rows(self, stats, rows):
+        # A SELECT outside dispatch (a cursor): measured while its rows are
+        # pulled, reported when they run out or the generator is closed
+        try:
+            while True:
+                self._local.stats = stats
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    stats.run_time += time.perf_counter() - start
+                    self._local.stats = None
+                stats.rows_returned += 1
+                yield row
+        except Exception as e:
+            stats.error = str(e)
+            raise
+        finally:
+            rows.close()
+            self._report(stats)
+
+    def _cached_rows(self, cmd, table, inner):
+        # A hit is served without locks or touching the table rows. A miss
+        # runs the query and caches its rows if they were all read and no
+        # table changed version from before the scan until after it.
+        key = statement_key(cmd)
+        tables = [table] if inner is None else [table, inner]
+        rows = self.result_cache.get(key, tables)
+        if rows is not None:
+            if self._stats is not None:
+                self._stats.cache_hit = True
+            yield from rows
+            return
+        versions = tuple(t.version for t in tables)
+        result = []
+        pipeline = self._select_rows(cmd, table, inner)
+        try:
+            for row in pipeline:
+                result.append(row)
+                yield row
+        finally:
+            pipeline.close()
+        if tuple(t.version for t in tables) == versions:
+            self.result_cache.put(key, versions, result)
+
+    def _select_rows(self, cmd, table, inner):
+        # The SELECT pipeline as a chain of generators. It runs under read
+        # locks on the tables it reads, taken on the first fetch and released
+        # once the rows are exhausted or the generator is closed.
+        owner = threading.get_ident()
+        locked = []
+        try:
+            for t in sorted({table, inner} - {None}, key=lambda t: t.name):
+                t.lock.acquire_read()
+                locked.append(t)
+            plan = self._plan(cmd)
+            aggregate = plan.get("aggregate")
+            stats = self._stats
+
+            # Rows stay table records (tuples) until a join or an aggregate
+            # turns them into dicts, or the projection at the end does.
+            # value_of(col) gives a reader for a column of the current rows.
+            def dict_value(col):
+                return lambda r: self._column_value(r, col, table.name)
+
+            def record_value(col):
+                prefix = table.name + "."
+                return table.getter(col[len(prefix):] if col.startswith(prefix) else col)
+
+            value_of = dict_value
+            if aggregate and aggregate["fast"]:
+                rows = iter([self._fast_aggregate(table, aggregate)])
+            elif aggregate and aggregate.get("vectorized"):
+                rows = iter(vectorized.aggregate(table, aggregate, plan.get("vector_filter")))
+                if stats is not None:
+                    stats.rows_scanned += len(table)
+            else:
+                record_filter = self._where_func(plan["filter"], table) if plan["filter"] else None
+                candidates = self._candidates(table, plan)
+                # Large full scans split into row ranges on the process pool
+                parallel = plan["access"] == "scan" and table.parallel.applies(len(table.slots))
+                join = plan.get("join")
+                if stats is not None:
+                    # Masks and parallel workers read every row; otherwise
+                    # count the records as the scan reads them
+                    if parallel or plan["access"] == "vector_scan":
+                        stats.rows_scanned += len(table)
+                    if not parallel:
+                        candidates = self._counted_candidates(table, candidates, stats, plan)
+
+                # Handle JOIN: the planner picked hash, merge or index nested loop
+                if join:
+                    if parallel and join["strategy"] == "hash" and join["build"] == "inner":
+                        inner_table = self.db.get_table(join["table"])
+                        rows = parallel_hash_join(table, record_filter, inner_table,
+                                                  join["outer_column"], join["inner_column"])
+                    else:
+                        outer = table.scan(None, candidates, record_filter)
+                        if stats is not None and join["strategy"] == "index_nested_loop":
+                            outer = stats.counted(outer, "index_lookups")
+                        rows = self._join(outer, join)
+                    if plan.get("post_filter"):
+                        post_filter = self._where_func(plan["post_filter"])
+                        rows = (r for r in rows if post_filter(r))
+                    if aggregate:
+                        rows = self._aggregate(rows, aggregate, value_of)
+                elif aggregate:
+                    if parallel:
+                        rows = self._parallel_aggregate(table, record_filter, aggregate, record_value)
+                    else:
+                        rows = self._aggregate(table.scan_records(record_filter, candidates), aggregate, record_value)
+                else:
+                    # Without ORDER BY a LIMIT stops a serial scan early
+                    if parallel and record_filter and (cmd.get("order_by") or cmd.get("limit") is None):
+                        candidates, record_filter = table.matching_rids(record_filter), None
+                    rows = table.scan_records(record_filter, candidates)
+                    value_of = record_value
+
+            if aggregate and aggregate["having"]:
+                having = self._where_func(aggregate["having"])
+                rows = (r for r in rows if having(r))
+
+            limit = cmd.get("limit")
+            offset = cmd.get("offset") or 0
+
+            # ORDER BY: rows from an ordered index access are already sorted;
+            # otherwise sort, keeping only the first OFFSET + LIMIT rows when there is a LIMIT
+            order_by = cmd.get("order_by")
+            if order_by and not plan["ordered"]:
+                get = value_of(order_by["column"])
+
+                def sort_key(r):
+                    val = get(r)
+                    return (val is not None, val)
+                if limit is not None:
+                    pick = heapq.nlargest if order_by["desc"] else heapq.nsmallest
+                    rows = iter(pick(offset + limit, rows, key=sort_key))
+                else:
+                    rows = iter(sorted(rows, key=sort_key, reverse=order_by["desc"]))
+
+            if offset or limit is not None:
+                rows = islice(rows, offset, None if limit is None else offset + limit)
+
+            # Projection
+            if cmd["columns"]:
+                columns = cmd["columns"]
+                getters = [value_of(col) for col in columns]
+                rows = (dict(zip(columns, [get(r) for get in getters])) for r in rows)
+            elif value_of is record_value:
+                names = table.names
+                rows = (dict(zip(names, r)) for r in rows)
+            yield from rows
+        finally:
+            for t in locked:
+                t.lock.release_read(owner)
+
+    def _aggregate(self, rows, aggregate, value_of):
+        # Hash aggregation: one accumulator per aggregate per group, fed as
+        # rows stream past. Without GROUP BY there is exactly one group.
+        yield from self._aggregate_rows(self._group(rows, aggregate, value_of), aggregate)
+
+    def _parallel_aggregate(self, table, record_filter, aggregate, value_of):
+        # Each row range of a full scan is grouped in a worker. Partial groups
+        # merge in range order, so groups keep their order of first appearance.
+        slots = table.slots
+
+        def group_range(start, stop):
+            records = filter(None, slots[start:stop])
+            return self._group(records if record_filter is None else filter(record_filter, records),
+                               aggregate, value_of)
+        parts = table.parallel.map(group_range, len(slots))
+        groups = parts[0]
+        for part in parts[1:]:
+            for key, accs in part.items():
+                mine = groups.get(key)
+                if mine is None:
+                    groups[key] = accs
+                else:
+                    for acc, other in zip(mine, accs):
+                        acc.merge(other)
+        yield from self._aggregate_rows(groups, aggregate)
+
+    def _group(self, rows, aggregate, value_of) -> Dict[tuple, list]:
+        group_by = aggregate["group_by"]
+        specs = aggregate["aggregates"]
+        key_getters = [value_of(col) for col in group_by]
+        # COUNT(*) accumulators ignore the value they are given
+        steps = [(i, value_of(a["column"]) if a["column"] else (lambda r: None)) for i, a in enumerate(specs)]
+        groups: Dict[tuple, list] = {}
+        for r in rows:
+            key = tuple([get(r) for get in key_getters])
+            accs = groups.get(key)
+            if accs is None:
+                accs = groups[key] = [make_accumulator(a["func"], a["column"] is None) for a in specs]
+            for i, get in steps:
+                accs[i].step(get(r))
+        return groups
+
+    def _aggregate_rows(self, groups, aggregate):
+        group_by = aggregate["group_by"]
+        specs = aggregate["aggregates"]
+        if not groups and not group_by:
+            groups[()] = [make_accumulator(a["func"], a["column"] is None) for a in specs]
+        for key, accs in groups.items():
+            out = dict(zip(group_by, key))
+            for a, acc in zip(specs, accs):
+                out[a["name"]] = acc.result()
+            yield out
+
+    def _fast_aggregate(self, table, aggregate):
+        # Answers chosen by the planner without scanning: the live row count
+        # for COUNT(*), the first/last key of an ordered index for MIN/MAX
+        specs = aggregate["aggregates"]
+        if aggregate["fast"] == "count":
+            return {a["name"]: len(table) for a in specs}
+        out = {}
+        for a, name in zip(specs, aggregate["indexes"]):
+            index = table.indexes[name]
+            out[a["name"]] = index.min() if a["func"] == "MIN" else index.max()
+        return out
+
+    def _write_candidates(self, table, plan):
+        # _candidates for UPDATE/DELETE, noting the rows they will read when measured
+        candidates = self._candidates(table, plan)
+        stats = self._stats
+        if stats is not None:
+            if candidates is None or plan["access"] == "vector_scan":
+                stats.rows_scanned += len(table)
+            else:
+                candidates = stats.counted(candidates)
+        return candidates
 
     def _exec_update(self, cmd):
-        table = self.db.get_table(cmd["table"])
-        count = table.update(cmd["updates"], lambda r: self._eval_where(r, cmd["where"]) if cmd["where"] else True)
-        self.db.save_table(table.name)
+        table = self._write_target(cmd["table"])
+        with table.lock.writing():
+            plan = self._plan(cmd)
+            candidates = self._write_candidates(table, plan)
+            count = table.update(cmd["updates"], candidates=candidates,
+                                 record_filter=self._where_func(plan["filter"], table))
+        self._statement_done(table, count)
         return f"{count} rows updated."
 
     def _exec_delete(self, cmd):
-        table = self.db.get_table(cmd["table"])
-        count = table.delete(lambda r: self._eval_where(r, cmd["where"]) if cmd["where"] else True)
-        self.db.save_table(table.name)
+        table = self._write_target(cmd["table"])
+        with table.lock.writing():
+            plan = self._plan(cmd)
+            count = table.delete(candidates=self._write_candidates(table, plan),
+                                 record_filter=self._where_func(plan["filter"], table))
+        self._statement_done(table, count)
         return f"{count} rows deleted."
 
-    def _eval_where(self, row: Dict[str, Any], where_clause: str) -> bool:
-        # Extremely naive eval: "col = val" or "col > val"
-        # Security risk: eval() - but for a toy RDBMS challenge it's the standard shortcut
-        # To be safer/cleaner, we should parse the condition.
-        # Let's support simple "col = val" parsing without eval()
-        
-        parts = where_clause.split('=')
-        if len(parts) == 2:
-            col = parts[0].strip()
-            val_str = parts[1].strip()
-            
-            # Determine if val_str is a string literal or number
-            val = self.parser._clean_val(val_str)
-            
-            return row.get(col) == val
-            
-        return False # Fallback or complex condition not supported
-
-    def _eval_join_condition(self, row_a, row_b, name_a, name_b, condition):
-        # condition e.g. "users.id = posts.user_id"
-        left, right = condition.split('=')
-        left = left.strip()
-        right = right.strip()
-        
-        def get_val(ref):
-            if '.' in ref:
-                t, c = ref.split('.')
-                if t == name_a: return row_a.get(c)
-                if t == name_b: return row_b.get(c)
-            else:
-                return row_a.get(ref) # Default to left table?
-        
-        return get_val(left) == get_val(right)
+    def _column_value(self, row: Dict[str, Any], col: str, table_name: str) -> Any:
+        # Handle aliasing or table prefixes if needed
+        val = row.get(col)
+        if val is None and "." in col:
+            # try lookup with table prefix or without
+            t, c = col.split('.', 1)
+            # If table prefix matches main table, look for c
+            if t == table_name:
+                val = row.get(c)
+        return val
+
+    def _join(self, rows, join):
+        inner = self.db.get_table(join["table"])
+        outer_col, inner_col = join["outer_column"], join["inner_column"]
+        if join["strategy"] == "merge":
+            inner_rows = inner.scan(candidates=inner.index_order(join["index"]))
+            return merge_join(rows, inner_rows, outer_col, inner_col, inner.name)
+        if join["strategy"] == "index_nested_loop":
+            return index_nested_loop_join(rows, inner, join["index"], outer_col, inner.name)
+        return hash_join(rows, inner.scan(), outer_col, inner_col, inner.name, join["build"] == "outer")
 
-    def _format_result(self, rows: List[Dict[str, Any]]) -> str:
+    def _format_result(self, columns: List[str], rows: List[Dict[str, Any]]) -> str:
         if not rows:
             return "Empty set"
         
         # Simple ASCII table
-        headers = list(rows[0].keys())
         lines = []
-        lines.append("\t".join(headers))
+        lines.append("\t".join(columns))
         for r in rows:
-            lines.append("\t".join([str(r.get(h, 'NULL')) for h in headers]))
+            lines.append("\t".join([str(r.get(h, 'NULL')) for h in columns]))
         return "\n".join(lines)
@@ -0,0 +1,216 @@
+import bisect
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol
+
+# Per-statement measurements and the observers that consume them. With at
+# least one observer attached to an SQLExecutor, every statement it runs
+# gets a QueryStats filled in as it executes and passed to each observer's
+# on_query() once it is done (for a cursor's SELECT: once its rows run out
+# or the cursor is closed). Without observers nothing is measured.
+# EXPLAIN ANALYZE measures one statement the same way and prints the result.
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+# Latencies kept for percentiles: the most recent statements only
+RECENT_LATENCIES = 1024
+
+
+def _plural(n: int, word: str) -> str:
+    return f"{n} {word}" if n == 1 else f"{n} {word}s"
+
+
+class QueryStats:
+    def __init__(self, cmd: Dict[str, Any], sql: Optional[str] = None, parse_time: float = 0.0):
+        self.sql = sql
+        self.type = cmd["type"]
+        self.table = cmd.get("table")
+        self.started = time.time()
+        # Seconds; run_time is the whole execution, plan and persistence included
+        self.parse_time = parse_time
+        self.plan_time = 0.0
+        self.persist_time = 0.0
+        self.run_time = 0.0
+        self.plan: Optional[Dict[str, Any]] = None
+        # Rows read from the statement's table (before filtering), rows sent
+        # back by a SELECT, rows changed by a write
+        self.rows_scanned = 0
+        self.rows_returned = 0
+        self.rows_affected = 0
+        self.index_lookups = 0
+        self.cache_hit = False
+        self.error: Optional[str] = None
+        self._counters: List[tuple] = []
+
+    def counted(self, rows: Iterable[Any], field: str = "rows_scanned") -> Iterator[Any]:
+        # Passes rows through, adding how many were consumed to field when the
+        # statement finishes. zip and itemgetter keep the counting in C, and
+        # zip stops at the end of rows without advancing the counter.
+        counter = itertools.count()
+        self._counters.append((field, counter))
+        return map(itemgetter(0), zip(rows, counter))
+
+    def settle(self):
+        for field, counter in self._counters:
+            setattr(self, field, getattr(self, field) + next(counter))
+        self._counters.clear()
+
+    @property
+    def total_time(self) -> float:
+        return self.parse_time + self.run_time
+
+    @property
+    def execute_time(self) -> float:
+        # Execution alone: planning and persistence are reported separately
+        return max(self.run_time - self.plan_time - self.persist_time, 0.0)
+
+    @property
+    def access(self) -> Optional[str]:
+        return self.plan.get("access") if self.plan else None
+
+    @property
+    def join_strategy(self) -> Optional[str]:
+        join = self.plan.get("join") if self.plan else None
+        return join["strategy"] if join else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "sql": self.sql, "type": self.type, "table": self.table,
+            "total_ms": round(self.total_time * 1000, 3), "parse_ms": round(self.parse_time * 1000, 3),
+            "plan_ms": round(self.plan_time * 1000, 3), "execute_ms": round(self.execute_time * 1000, 3),
+            "persist_ms": round(self.persist_time * 1000, 3),
+            "rows_scanned": self.rows_scanned, "rows_returned": self.rows_returned,
+            "rows_affected": self.rows_affected, "index_lookups": self.index_lookups,
+            "access": self.access, "join": self.join_strategy, "cache_hit": self.cache_hit,
+            "error": self.error, "plan": self.plan,
+        }
+
+    def format(self) -> str:
+        # The lines EXPLAIN ANALYZE adds under the plan
+        if self.type == "SELECT":
+            rows = _plural(self.rows_returned, "row") + " returned"
+        else:
+            rows = _plural(self.rows_affected, "row") + " affected"
+        actual = [rows, _plural(self.rows_scanned, "row") + " scanned",
+                  _plural(self.index_lookups, "index lookup")]
+        if self.cache_hit:
+            actual.append("from result cache")
+        return "\n".join([
+            f"Actual: {', '.join(actual)}",
+            f"Time: parse {self.parse_time * 1000:.3f} ms, plan {self.plan_time * 1000:.3f} ms, "
+            f"execute {self.execute_time * 1000:.3f} ms, persist {self.persist_time * 1000:.3f} ms, "
+            f"total {self.total_time * 1000:.3f} ms",
+        ])
+
+
+class QueryObserver(Protocol):
+    def on_query(self, stats: QueryStats) -> None: ...
+
+
+class QueryMetrics:
+    # Cumulative counters since creation (or reset): statements per type,
+    # errors, rows, queries/sec and a latency histogram, plus percentiles
+    # over the most recent statements. Safe to share between threads.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.queries = 0
+            self.errors = 0
+            self.by_type: Dict[str, int] = {}
+            self.total_time = 0.0
+            self.max_time = 0.0
+            self.rows_scanned = 0
+            self.rows_returned = 0
+            self.rows_affected = 0
+            self.cache_hits = 0
+            # One count per bucket of LATENCY_BUCKETS_MS, plus one for slower
+            self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            self.recent = deque(maxlen=RECENT_LATENCIES)
+
+    def on_query(self, stats: QueryStats):
+        ms = stats.total_time * 1000
+        with self._lock:
+            self.queries += 1
+            self.errors += stats.error is not None
+            self.by_type[stats.type] = self.by_type.get(stats.type, 0) + 1
+            self.total_time += stats.total_time
+            self.max_time = max(self.max_time, stats.total_time)
+            self.rows_scanned += stats.rows_scanned
+            self.rows_returned += stats.rows_returned
+            self.rows_affected += stats.rows_affected
+            self.cache_hits += stats.cache_hit
+            self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            self.recent.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = time.time() - self.started
+            recent = sorted(self.recent)
+
+            def percentile(p):
+                return round(recent[min(int(len(recent) * p), len(recent) - 1)], 3) if recent else None
+            bounds = [str(b) for b in LATENCY_BUCKETS_MS] + ["+inf"]
+            return {
+                "uptime_s": round(uptime, 3),
+                "queries": self.queries,
+                "errors": self.errors,
+                "queries_per_sec": round(self.queries / uptime, 2) if uptime else None,
+                "by_type": dict(self.by_type),
+                "rows_scanned": self.rows_scanned,
+                "rows_returned": self.rows_returned,
+                "rows_affected": self.rows_affected,
+                "cache_hits": self.cache_hits,
+                "latency_ms": {
+                    "avg": round(self.total_time * 1000 / self.queries, 3) if self.queries else None,
+                    "max": round(self.max_time * 1000, 3),
+                    "p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                },
+                # Statements whose latency was at most the bound (and above the previous one)
+                "histogram_ms": dict(zip(bounds, self.histogram)),
+            }
+
+    def format(self) -> str:
+        s = self.snapshot()
+        latency = s["latency_ms"]
+        lines = [
+            f"Queries: {s['queries']} ({s['queries_per_sec']}/s over {s['uptime_s']:.0f} s), errors: {s['errors']}",
+            "By type: " + (", ".join(f"{k} {v}" for k, v in sorted(s["by_type"].items())) or "-"),
+            f"Rows: {s['rows_scanned']} scanned, {s['rows_returned']} returned, {s['rows_affected']} affected; "
+            f"result cache hits: {s['cache_hits']}",
+            f"Latency ms: avg {latency['avg']}, p50 {latency['p50']}, p95 {latency['p95']}, "
+            f"p99 {latency['p99']}, max {latency['max']}",
+            "Histogram ms: " + ", ".join(f"<={k} {v}" for k, v in s["histogram_ms"].items() if v),
+        ]
+        return "\n".join(lines)
+
+
+class SlowQueryLog:
+    # Appends one JSON line per statement that took at least threshold_ms
+    def __init__(self, path: str, threshold_ms: float = 100.0):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+
+    def on_query(self, stats: QueryStats):
+        if stats.total_time * 1000 < self.threshold_ms:
+            return
+        line = json.dumps(stats.to_dict(), default=repr)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def read(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
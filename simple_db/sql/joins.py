@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, Iterator, List
+from core.table import Table
+
+# Equi-join algorithms. Each takes the outer (left) rows as produced by the
+# access path and yields merged rows: the outer row's columns as they are,
+# the inner row's columns prefixed with "<inner table>.". NULL keys never match.
+
+
+def merge_rows(row_a: Dict[str, Any], row_b: Dict[str, Any], inner_name: str) -> Dict[str, Any]:
+    return {**row_a, **{f"{inner_name}.{k}": v for k, v in row_b.items()}}
+
+
+def hash_join(outer: Iterable[Dict[str, Any]], inner: Iterable[Dict[str, Any]], outer_col: str,
+              inner_col: str, inner_name: str, build_outer: bool = False) -> Iterator[Dict[str, Any]]:
+    # Build a hash table on one side and probe it with the other: O(n + m).
+    # Building on the inner side keeps the outer row order.
+    if build_outer:
+        buckets: Dict[Any, List[Dict[str, Any]]] = {}
+        for row_a in outer:
+            key = row_a.get(outer_col)
+            if key is not None:
+                buckets.setdefault(key, []).append(row_a)
+        for row_b in inner:
+            for row_a in buckets.get(row_b.get(inner_col), ()):
+                yield merge_rows(row_a, row_b, inner_name)
+    else:
+        buckets = {}
+        for row_b in inner:
+            key = row_b.get(inner_col)
+            if key is not None:
+                buckets.setdefault(key, []).append(row_b)
+        for row_a in outer:
+            for row_b in buckets.get(row_a.get(outer_col), ()):
+                yield merge_rows(row_a, row_b, inner_name)
+
+
+def index_nested_loop_join(outer: Iterable[Dict[str, Any]], inner: Table, index_name: str,
+                           outer_col: str, inner_name: str) -> Iterator[Dict[str, Any]]:
+    # Probe the inner table's index once per outer row: O(n) lookups, no build step
+    for row_a in outer:
+        key = row_a.get(outer_col)
+        if key is None:
+            continue
+        for rid in inner.lookup(index_name, key):
+            yield merge_rows(row_a, inner.get(rid), inner_name)
+
+
+def merge_join(outer: Iterable[Dict[str, Any]], inner: Iterable[Dict[str, Any]], outer_col: str,
+               inner_col: str, inner_name: str) -> Iterator[Dict[str, Any]]:
+    # Both inputs must arrive in ascending join key order: O(n + m)
+    outer_iter = (r for r in outer if r.get(outer_col) is not None)
+    inner_iter = (r for r in inner if r.get(inner_col) is not None)
+    row_a = next(outer_iter, None)
+    row_b = next(inner_iter, None)
+    while row_a is not None and row_b is not None:
+        key_a = row_a.get(outer_col)
+        key_b = row_b.get(inner_col)
+        if key_a < key_b:
+            row_a = next(outer_iter, None)
+        elif key_a > key_b:
+            row_b = next(inner_iter, None)
+        else:
+            # Collect the run of equal inner keys, then pair it with every equal outer row
+            group = []
+            while row_b is not None and row_b.get(inner_col) == key_a:
+                group.append(row_b)
+                row_b = next(inner_iter, None)
+            while row_a is not None and row_a.get(outer_col) == key_a:
+                for match in group:
+                    yield merge_rows(row_a, match, inner_name)
+                row_a = next(outer_iter, None)
+
+
+def parallel_hash_join(outer: Table, outer_filter, inner: Table, outer_col: str,
+                       inner_col: str) -> Iterator[Dict[str, Any]]:
+    # hash_join building on the inner side, with the outer full scan, its
+    # filter and the probes split into row ranges on outer.parallel. Workers
+    # return (outer rid, inner rid) pairs; rows come out in hash_join's order.
+    get_inner = inner.getter(inner_col)
+    buckets: Dict[Any, List[int]] = {}
+    for rid, rec in enumerate(inner.slots):
+        if rec is not None:
+            key = get_inner(rec)
+            if key is not None:
+                buckets.setdefault(key, []).append(rid)
+    get_outer = outer.getter(outer_col)
+    slots = outer.slots
+
+    def probe(start, stop):
+        pairs = []
+        for rid, rec in enumerate(slots[start:stop], start):
+            if rec is not None and (outer_filter is None or outer_filter(rec)):
+                for inner_rid in buckets.get(get_outer(rec), ()):
+                    pairs.append((rid, inner_rid))
+        return pairs
+    for part in outer.parallel.map(probe, len(slots)):
+        for rid, inner_rid in part:
+            yield merge_rows(outer.get(rid), inner.get(inner_rid), inner.name)
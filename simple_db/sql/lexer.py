@@ -0,0 +1,65 @@
+import re
+from typing import Any, List, NamedTuple
+
+# Token kinds
+IDENT = "IDENT"      # names and keywords; keywords are matched case-insensitively by the parser
+NUMBER = "NUMBER"
+STRING = "STRING"
+PARAM = "PARAM"      # ? placeholder of a prepared statement
+OP = "OP"            # comparison operators
+PUNCT = "PUNCT"      # ( ) , . * ;
+EOF = "EOF"
+
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>\d+\.\d*|\.\d+|\d+)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<sstring>'(?:[^']|'')*')
+  | (?P<dstring>"(?:[^"]|"")*")
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<param>\?)
+  | (?P<punct>[(),.*;-])
+""", re.VERBOSE)
+
+
+class Token(NamedTuple):
+    kind: str
+    value: Any
+    pos: int
+
+    def matches(self, kind: str, value: Any = None) -> bool:
+        if self.kind != kind:
+            return False
+        if value is None:
+            return True
+        if kind == IDENT:
+            return self.value.upper() == value
+        return self.value == value
+
+
+def tokenize(sql: str) -> List[Token]:
+    tokens: List[Token] = []
+    pos = 0
+    while pos < len(sql):
+        match = TOKEN_RE.match(sql, pos)
+        if not match:
+            raise ValueError(f"Unexpected character {sql[pos]!r} at position {pos}")
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "number":
+            tokens.append(Token(NUMBER, float(text) if "." in text else int(text), pos))
+        elif kind == "ident":
+            tokens.append(Token(IDENT, text, pos))
+        elif kind == "sstring":
+            tokens.append(Token(STRING, text[1:-1].replace("''", "'"), pos))
+        elif kind == "dstring":
+            tokens.append(Token(STRING, text[1:-1].replace('""', '"'), pos))
+        elif kind == "op":
+            tokens.append(Token(OP, "!=" if text == "<>" else text, pos))
+        elif kind == "param":
+            tokens.append(Token(PARAM, "?", pos))
+        elif kind == "punct":
+            tokens.append(Token(PUNCT, text, pos))
+        pos = match.end()
+    tokens.append(Token(EOF, None, pos))
+    return tokens
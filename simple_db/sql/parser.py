@@ -1,144 +1,444 @@
-import re
+import threading
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
+from sql.lexer import tokenize, Token, IDENT, NUMBER, STRING, PARAM, OP, PUNCT, EOF
+
+
+AGGREGATE_FUNCS = ("COUNT", "SUM", "AVG", "MIN", "MAX")
+
+
+class Param:
+    # Placeholder for the index-th ? of a prepared statement
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __repr__(self):
+        return "?"
+
+
+def bind_params(node: Any, params: List[Any]) -> Any:
+    # Copy of a parsed statement with every Param replaced by its value
+    if isinstance(node, Param):
+        return params[node.index]
+    if isinstance(node, dict):
+        return {k: bind_params(v, params) for k, v in node.items()}
+    if isinstance(node, list):
+        return [bind_params(v, params) for v in node]
+    return node
+
+
+def check_count(word: str, value: Any) -> Any:
+    # LIMIT and OFFSET take non-negative integers, whether written in the
+    # statement or bound to a ? parameter
+    if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+        raise ValueError(f"{word} expects a non-negative integer")
+    return value
+
 
 class SQLParser:
+    # Recursive-descent parser over the tokens from sql.lexer. Statements come
+    # back as nested dicts (the AST the planner and executor work on); WHERE
+    # clauses are condition trees:
+    #   {"op": "AND" | "OR", "args": [...]}     {"op": "NOT", "arg": cond}
+    #   {"op": "=" | "!=" | "<" | "<=" | ">" | ">=", "column": c, "value": v}
+    #   {"op": "BETWEEN", "column": c, "low": v, "high": v}
+    #   {"op": "IN", "column": c, "values": [...]}
+    #   {"op": "IS NULL" | "IS NOT NULL", "column": c}
+    # Parsed statements are cached by SQL text, so callers must treat them as read-only.
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
     def parse(self, sql: str) -> Dict[str, Any]:
-        sql = sql.strip().rstrip(';')
-        # Naive tokenziation by space might fail on string literals with spaces.
-        # But for simple RDBMS without complex string parser, we'll try regex matching for whole commands.
-        
-        # CREATE TABLE
-        match = re.match(r"CREATE\s+TABLE\s+(\w+)\s*\((.+)\)", sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return self._parse_create(match)
-
-        # INSERT INTO
-        match = re.match(r"INSERT\s+INTO\s+(\w+)\s*\((.+)\)\s*VALUES\s*\((.+)\)", sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return self._parse_insert(match)
-
-        # SELECT
-        # Supports: SELECT col1, col2 FROM table [JOIN table2 ON cond] [WHERE cond]
-        match = re.match(r"SELECT\s+(.+)\s+FROM\s+(\w+)(.*)", sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return self._parse_select(match)
-
-        # UPDATE
-        match = re.match(r"UPDATE\s+(\w+)\s+SET\s+(.+?)(?:\s+WHERE\s+(.+))?$", sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return self._parse_update(match)
-
-        # DELETE
-        match = re.match(r"DELETE\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+))?$", sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            return self._parse_delete(match)
-
-        raise ValueError(f"Unsupported or invalid SQL: {sql}")
-
-    def _parse_create(self, match) -> Dict[str, Any]:
-        table_name = match.group(1)
-        columns_def = match.group(2)
-        columns = []
-        # Split by comma but careful about potential futures like size (int(11)) - though we stick to simple types
-        raw_cols = [c.strip() for c in columns_def.split(',')]
-        for rc in raw_cols:
-            parts = rc.split()
-            col_name = parts[0]
-            col_type = parts[1]
-            is_pk = 'PK' in parts or 'PRIMARY KEY' in rc.upper()
-            is_unique = 'UNIQUE' in parts
-            columns.append({
-                "name": col_name,
-                "type": col_type,
-                "pk": is_pk,
-                "unique": is_unique
-            })
-        return {"type": "CREATE", "table": table_name, "columns": columns}
-
-    def _parse_insert(self, match) -> Dict[str, Any]:
-        table_name = match.group(1)
-        cols_str = match.group(2)
-        vals_str = match.group(3)
-        
-        columns = [c.strip() for c in cols_str.split(',')]
-        
-        # Handle values - naive split by comma, doesn't support strings with commas yet properly
-        # For a "Simple RDBMS" challenge this is usually acceptable unless specified otherwise
-        # Better: use regex or a generic csv splitter
-        values = [self._clean_val(v.strip()) for v in vals_str.split(',')]
-        
-        if len(columns) != len(values):
-            raise ValueError("Column count doesn't match value count")
-            
-        return {"type": "INSERT", "table": table_name, "data": dict(zip(columns, values))}
-
-    def _clean_val(self, val_str: str) -> Any:
-        if (val_str.startswith("'") and val_str.endswith("'")) or (val_str.startswith('"') and val_str.endswith('"')):
-            return val_str[1:-1]
-        try:
-            if '.' in val_str:
-                return float(val_str)
-            return int(val_str)
-        except:
-            return val_str
-
-    def _parse_select(self, match) -> Dict[str, Any]:
-        columns_str = match.group(1).strip()
-        table_name = match.group(2)
-        rest = match.group(3).strip()
-        
-        columns = [c.strip() for c in columns_str.split(',')]
-        if columns == ['*']: 
+        with self._lock:
+            cmd = self._cache.get(sql)
+            if cmd is not None:
+                self._cache.move_to_end(sql)
+                self.cache_hits += 1
+                return cmd
+            self.cache_misses += 1
+        cmd = _Parser(sql).parse_statement()
+        if self.cache_size:
+            with self._lock:
+                self._cache[sql] = cmd
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return cmd
+
+
+class _Parser:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = tokenize(sql)
+        self.pos = 0
+        self.param_count = 0
+        # Aggregate calls of the SELECT being parsed; None outside a SELECT
+        self.aggregates: Optional[List[Dict[str, Any]]] = None
+        self.aggregates_allowed = True
+
+    # Token helpers
+
+    @property
+    def tok(self) -> Token:
+        return self.tokens[self.pos]
+
+    def error(self, expected: str):
+        tok = self.tok
+        found = "end of input" if tok.kind == EOF else repr(self.sql[tok.pos:tok.pos + 20])
+        raise ValueError(f"Expected {expected} at position {tok.pos}, found {found}")
+
+    def accept(self, kind: str, value: Any = None) -> Optional[Token]:
+        if self.tok.matches(kind, value):
+            tok = self.tok
+            self.pos += 1
+            return tok
+        return None
+
+    def expect(self, kind: str, value: Any = None) -> Token:
+        tok = self.accept(kind, value)
+        if tok is None:
+            self.error(value or kind.lower())
+        return tok
+
+    def keyword(self, *words: str) -> bool:
+        # Consumes the keyword sequence if it is next
+        ahead = self.tokens[self.pos:self.pos + len(words)]
+        if len(ahead) < len(words) or not all(t.matches(IDENT, w) for t, w in zip(ahead, words)):
+            return False
+        self.pos += len(words)
+        return True
+
+    def expect_keyword(self, *words: str):
+        if not self.keyword(*words):
+            self.error(" ".join(words))
+
+    def name(self) -> str:
+        return self.expect(IDENT).value
+
+    def column_ref(self) -> str:
+        # col or table.col
+        name = self.name()
+        if self.accept(PUNCT, "."):
+            name += "." + self.name()
+        return name
+
+    def literal(self) -> Any:
+        tok = self.tok
+        if tok.kind in (NUMBER, STRING):
+            self.pos += 1
+            return tok.value
+        if tok.kind == PARAM:
+            self.pos += 1
+            self.param_count += 1
+            return Param(self.param_count - 1)
+        if self.accept(PUNCT, "-"):
+            num = self.expect(NUMBER)
+            return -num.value
+        if self.keyword("NULL"):
+            return None
+        if self.keyword("TRUE"):
+            return True
+        if self.keyword("FALSE"):
+            return False
+        self.error("a value")
+
+    def comma_list(self, item):
+        items = [item()]
+        while self.accept(PUNCT, ","):
+            items.append(item())
+        return items
+
+    # Statements
+
+    def parse_statement(self) -> Dict[str, Any]:
+        cmd = self.statement()
+        self.accept(PUNCT, ";")
+        if self.tok.kind != EOF:
+            self.error("end of statement")
+        cmd["param_count"] = self.param_count
+        return cmd
+
+    def statement(self) -> Dict[str, Any]:
+        if self.keyword("EXPLAIN"):
+            # EXPLAIN ANALYZE runs the statement and reports what it did
+            analyze = self.keyword("ANALYZE")
+            return {"type": "EXPLAIN", "statement": self.statement(), "analyze": analyze}
+        if self.keyword("CREATE", "TABLE"):
+            return self.create_table()
+        if self.keyword("CREATE", "INDEX"):
+            return self.create_index()
+        if self.keyword("DROP", "INDEX"):
+            name = self.name()
+            table = self.name() if self.keyword("ON") else None
+            return {"type": "DROP_INDEX", "name": name, "table": table}
+        if self.keyword("VACUUM"):
+            table = self.name() if self.tok.kind == IDENT else None
+            return {"type": "VACUUM", "table": table}
+        if self.keyword("ANALYZE"):
+            table = self.name() if self.tok.kind == IDENT else None
+            return {"type": "ANALYZE", "table": table}
+        if self.keyword("BEGIN") or self.keyword("START", "TRANSACTION"):
+            self.keyword("TRANSACTION")
+            return {"type": "BEGIN", "table": None}
+        if self.keyword("COMMIT"):
+            return {"type": "COMMIT", "table": None}
+        if self.keyword("ROLLBACK"):
+            return {"type": "ROLLBACK", "table": None}
+        if self.keyword("INSERT", "INTO"):
+            return self.insert()
+        if self.keyword("SELECT"):
+            return self.select()
+        if self.keyword("UPDATE"):
+            return self.update()
+        if self.keyword("DELETE", "FROM"):
+            table = self.name()
+            return {"type": "DELETE", "table": table, "where": self.where()}
+        raise ValueError(f"Unsupported or invalid SQL: {self.sql}")
+
+    def create_table(self) -> Dict[str, Any]:
+        table_name = self.name()
+        self.expect(PUNCT, "(")
+        columns = self.comma_list(self.column_def)
+        self.expect(PUNCT, ")")
+        # USING ROW (the default) or USING COLUMNAR
+        layout = self.name().lower() if self.keyword("USING") else "row"
+        cmd = {"type": "CREATE", "table": table_name, "columns": columns, "layout": layout}
+        # PARTITION BY HASH(column) INTO n
+        if self.keyword("PARTITION", "BY"):
+            self.expect_keyword("HASH")
+            self.expect(PUNCT, "(")
+            column = self.name()
+            self.expect(PUNCT, ")")
+            self.expect_keyword("INTO")
+            count = self.expect(NUMBER).value
+            if not isinstance(count, int) or count < 1:
+                raise ValueError("PARTITION BY HASH expects a positive number of partitions")
+            cmd["partition"] = {"column": column, "count": count}
+        return cmd
+
+    def column_def(self) -> Dict[str, Any]:
+        col = {"name": self.name(), "type": self.name(), "pk": False, "unique": False, "nullable": True}
+        while True:
+            if self.keyword("PK") or self.keyword("PRIMARY", "KEY"):
+                col["pk"] = True
+            elif self.keyword("UNIQUE"):
+                col["unique"] = True
+            elif self.keyword("NOT", "NULL"):
+                col["nullable"] = False
+            else:
+                return col
+
+    def create_index(self) -> Dict[str, Any]:
+        name = self.name()
+        self.expect_keyword("ON")
+        table = self.name()
+        self.expect(PUNCT, "(")
+        column = self.name()
+        self.expect(PUNCT, ")")
+        kind = self.name().lower() if self.keyword("USING") else "hash"
+        return {"type": "CREATE_INDEX", "name": name, "table": table, "column": column, "kind": kind}
+
+    def insert(self) -> Dict[str, Any]:
+        table_name = self.name()
+        self.expect(PUNCT, "(")
+        columns = self.comma_list(self.name)
+        self.expect(PUNCT, ")")
+        self.expect_keyword("VALUES")
+        rows = self.comma_list(self.value_tuple)
+        for values in rows:
+            if len(columns) != len(values):
+                raise ValueError("Column count doesn't match value count")
+        return {"type": "INSERT", "table": table_name, "columns": columns, "rows": rows}
+
+    def value_tuple(self) -> List[Any]:
+        self.expect(PUNCT, "(")
+        values = self.comma_list(self.literal)
+        self.expect(PUNCT, ")")
+        return values
+
+    def select(self) -> Dict[str, Any]:
+        self.aggregates = []
+        if self.accept(PUNCT, "*"):
             columns = None
-            
-        join = None
-        where = None
-        
-        # Check for JOIN
-        join_match = re.search(r"JOIN\s+(\w+)\s+ON\s+(.+?)(?:\s+WHERE\s+(.+))?$", rest, re.IGNORECASE)
-        if join_match:
-            join = {
-                "table": join_match.group(1),
-                "on": join_match.group(2)
-            }
-            if join_match.group(3):
-                where = join_match.group(3)
         else:
-            # Check for WHERE without join
-            where_match = re.search(r"WHERE\s+(.+)", rest, re.IGNORECASE)
-            if where_match:
-                where = where_match.group(1)
-                
+            columns = self.comma_list(self.select_item)
+        self.expect_keyword("FROM")
+        table_name = self.name()
+
+        join = None
+        if self.keyword("JOIN") or self.keyword("INNER", "JOIN"):
+            join_table = self.name()
+            self.expect_keyword("ON")
+            start = self.tok.pos
+            left = self.column_ref()
+            if not self.accept(OP, "="):
+                raise ValueError(f"Only equi-joins are supported: {self.sql[start:]}")
+            right = self.column_ref()
+            join = {"table": join_table, "on": f"{left} = {right}", "left": left, "right": right}
+            if self.tok.matches(IDENT, "JOIN") or self.tok.matches(IDENT, "INNER"):
+                raise ValueError("Only one JOIN per query is supported")
+
+        self.aggregates_allowed = False
+        where = self.where()
+        self.aggregates_allowed = True
+
+        group_by = None
+        if self.keyword("GROUP", "BY"):
+            group_by = self.comma_list(self.column_ref)
+        having = self.or_expr() if self.keyword("HAVING") else None
+
+        if self.aggregates or group_by:
+            if columns is None:
+                raise ValueError("SELECT * cannot be combined with GROUP BY or aggregates")
+            for col in columns:
+                if col not in (group_by or []) and not any(a["name"] == col for a in self.aggregates):
+                    raise ValueError(f"Column {col} must appear in GROUP BY or an aggregate")
+        elif having:
+            raise ValueError("HAVING requires GROUP BY or an aggregate")
+
+        order_by = None
+        if self.keyword("ORDER", "BY"):
+            key = self.operand() if self.aggregates or group_by else self.column_ref()
+            order_by = {"column": key, "desc": False}
+            if self.keyword("DESC"):
+                order_by["desc"] = True
+            else:
+                self.keyword("ASC")
+
+        limit = self.count_clause("LIMIT")
+        offset = self.count_clause("OFFSET")
+
         return {
             "type": "SELECT",
             "table": table_name,
             "columns": columns,
             "join": join,
-            "where": where
+            "where": where,
+            "group_by": group_by,
+            "aggregates": self.aggregates,
+            "having": having,
+            "order_by": order_by,
+            "limit": limit,
+            "offset": offset
         }
 
-    def _parse_update(self, match) -> Dict[str, Any]:
-        table_name = match.group(1)
-        set_str = match.group(2)
-        where_str = match.group(3)
-        
+    def select_item(self) -> str:
+        # A column or an aggregate call; returns the output column name
+        if not self.at_aggregate():
+            return self.column_ref()
+        agg = self.aggregate()
+        if self.keyword("AS"):
+            agg["name"] = self.name()
+        return self.add_aggregate(agg)
+
+    def at_aggregate(self) -> bool:
+        return (self.tok.kind == IDENT and self.tok.value.upper() in AGGREGATE_FUNCS
+                and self.tokens[self.pos + 1].matches(PUNCT, "("))
+
+    def aggregate(self) -> Dict[str, Any]:
+        # COUNT(*) or FUNC(col)
+        func = self.name().upper()
+        self.expect(PUNCT, "(")
+        if func == "COUNT" and self.accept(PUNCT, "*"):
+            column = None
+        else:
+            column = self.column_ref()
+        self.expect(PUNCT, ")")
+        return {"func": func, "column": column, "name": f"{func}({column or '*'})"}
+
+    def add_aggregate(self, agg: Dict[str, Any]) -> str:
+        if not self.aggregates_allowed:
+            raise ValueError("Aggregates are not allowed in WHERE")
+        if agg not in self.aggregates:
+            self.aggregates.append(agg)
+        return agg["name"]
+
+    def operand(self) -> str:
+        # Left side of a predicate or an ORDER BY key: a column, or in HAVING
+        # and ORDER BY an aggregate (computed even if not selected)
+        if self.aggregates is not None and self.at_aggregate():
+            return self.add_aggregate(self.aggregate())
+        return self.column_ref()
+
+    def count_clause(self, word: str) -> Any:
+        # LIMIT n / OFFSET n: a non-negative integer or a ? parameter
+        if not self.keyword(word):
+            return None
+        value = self.literal()
+        if isinstance(value, Param):
+            return value
+        return check_count(word, value)
+
+    def update(self) -> Dict[str, Any]:
+        table_name = self.name()
+        self.expect_keyword("SET")
         updates = {}
-        for pair in set_str.split(','):
-            k, v = pair.split('=')
-            updates[k.strip()] = self._clean_val(v.strip())
-            
-        return {
-            "type": "UPDATE",
-            "table": table_name,
-            "updates": updates,
-            "where": where_str
-        }
+        for col, val in self.comma_list(self.assignment):
+            updates[col] = val
+        return {"type": "UPDATE", "table": table_name, "updates": updates, "where": self.where()}
 
-    def _parse_delete(self, match) -> Dict[str, Any]:
-        table_name = match.group(1)
-        where_str = match.group(2)
-        return {
-            "type": "DELETE",
-            "table": table_name,
-            "where": where_str
-        }
+    def assignment(self):
+        col = self.name()
+        self.expect(OP, "=")
+        return col, self.literal()
+
+    # WHERE expressions, lowest precedence first: OR, AND, NOT, predicate
+
+    def where(self) -> Optional[Dict[str, Any]]:
+        if self.keyword("WHERE"):
+            return self.or_expr()
+        return None
+
+    def or_expr(self) -> Dict[str, Any]:
+        args = [self.and_expr()]
+        while self.keyword("OR"):
+            args.append(self.and_expr())
+        return args[0] if len(args) == 1 else {"op": "OR", "args": args}
+
+    def and_expr(self) -> Dict[str, Any]:
+        args = [self.not_expr()]
+        while self.keyword("AND"):
+            args.append(self.not_expr())
+        if len(args) == 1:
+            return args[0]
+        # Flatten nested ANDs so the planner sees every conjunct
+        flat = []
+        for arg in args:
+            flat.extend(arg["args"] if arg["op"] == "AND" else [arg])
+        return {"op": "AND", "args": flat}
+
+    def not_expr(self) -> Dict[str, Any]:
+        if self.keyword("NOT"):
+            return {"op": "NOT", "arg": self.not_expr()}
+        return self.predicate()
+
+    def predicate(self) -> Dict[str, Any]:
+        if self.accept(PUNCT, "("):
+            cond = self.or_expr()
+            self.expect(PUNCT, ")")
+            return cond
+        column = self.operand()
+        op = self.accept(OP)
+        if op:
+            return {"op": op.value, "column": column, "value": self.literal()}
+        if self.keyword("IS", "NOT", "NULL"):
+            return {"op": "IS NOT NULL", "column": column}
+        if self.keyword("IS", "NULL"):
+            return {"op": "IS NULL", "column": column}
+        negate = self.keyword("NOT")
+        if self.keyword("BETWEEN"):
+            low = self.literal()
+            self.expect_keyword("AND")
+            cond = {"op": "BETWEEN", "column": column, "low": low, "high": self.literal()}
+        elif self.keyword("IN"):
+            self.expect(PUNCT, "(")
+            cond = {"op": "IN", "column": column, "values": self.comma_list(self.literal)}
+            self.expect(PUNCT, ")")
+        else:
+            self.error("a comparison")
+        return {"op": "NOT", "arg": cond} if negate else cond
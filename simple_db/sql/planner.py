@@ -0,0 +1,457 @@
+from typing import Any, Callable, Dict, List, Optional
+from core.database import Database
+from core.partition import PartitionedTable
+from core.statistics import DEFAULT_EQ, DEFAULT_RANGE, TableStats
+from core.table import Table
+from sql import vectorized
+
+
+def format_condition(cond: Optional[Dict[str, Any]]) -> str:
+    if cond is None:
+        return "TRUE"
+    op = cond["op"]
+    if op in ("AND", "OR"):
+        parts = [format_condition(c) for c in cond["args"]]
+        if op == "AND":
+            # Parenthesize nested ORs so the precedence survives
+            parts = [f"({p})" if c["op"] == "OR" else p for p, c in zip(parts, cond["args"])]
+        return f" {op} ".join(parts)
+    if op == "NOT":
+        return f"NOT ({format_condition(cond['arg'])})"
+    if op in ("IS NULL", "IS NOT NULL"):
+        return f"{cond['column']} {op}"
+    if op == "IN":
+        return f"{cond['column']} IN ({', '.join(repr(v) for v in cond['values'])})"
+    if op == "BETWEEN":
+        return f"{cond['column']} BETWEEN {cond['low']!r} AND {cond['high']!r}"
+    return f"{cond['column']} {cond['op']} {cond['value']!r}"
+
+
+def conjuncts(cond: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if cond is None:
+        return []
+    if cond["op"] == "AND":
+        return cond["args"]
+    return [cond]
+
+
+def condition_columns(cond: Dict[str, Any]) -> List[str]:
+    # Every column a condition tree refers to
+    if cond["op"] in ("AND", "OR"):
+        return [c for arg in cond["args"] for c in condition_columns(arg)]
+    if cond["op"] == "NOT":
+        return condition_columns(cond["arg"])
+    return [cond["column"]]
+
+
+def map_columns(cond: Dict[str, Any], func: Callable[[str], str]) -> Dict[str, Any]:
+    # Copy of a condition tree with every column name passed through func
+    if cond["op"] in ("AND", "OR"):
+        return dict(cond, args=[map_columns(arg, func) for arg in cond["args"]])
+    if cond["op"] == "NOT":
+        return dict(cond, arg=map_columns(cond["arg"], func))
+    return dict(cond, column=func(cond["column"]))
+
+
+def conjoin(preds: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not preds:
+        return None
+    if len(preds) == 1:
+        return preds[0]
+    return {"op": "AND", "args": preds}
+
+
+def selectivity(stats: Optional[TableStats], cond: Optional[Dict[str, Any]]) -> float:
+    # Estimated fraction of a table's rows that satisfy cond. Conjuncts and
+    # disjuncts are treated as independent.
+    if cond is None:
+        return 1.0
+    op = cond["op"]
+    if op == "AND":
+        frac = 1.0
+        for arg in cond["args"]:
+            frac *= selectivity(stats, arg)
+        return frac
+    if op == "OR":
+        miss = 1.0
+        for arg in cond["args"]:
+            miss *= 1.0 - selectivity(stats, arg)
+        return 1.0 - miss
+    if op == "NOT":
+        return 1.0 - selectivity(stats, cond["arg"])
+
+    column = stats.columns.get(cond["column"]) if stats else None
+    if column is None:
+        if op == "=" or op == "IS NULL":
+            return DEFAULT_EQ
+        if op == "IN":
+            return min(DEFAULT_EQ * len(cond["values"]), 1.0)
+        if op in ("!=", "IS NOT NULL"):
+            return 1.0 - DEFAULT_EQ
+        return DEFAULT_RANGE
+    if op == "=":
+        return column.eq_fraction(cond["value"])
+    if op == "!=":
+        return max(1.0 - column.null_frac - column.eq_fraction(cond["value"]), 0.0)
+    if op == "IN":
+        return min(sum(column.eq_fraction(v) for v in set(cond["values"])), 1.0)
+    if op in ("<", "<="):
+        return column.range_fraction(None, cond["value"], high_inclusive=op == "<=")
+    if op in (">", ">="):
+        return column.range_fraction(cond["value"], None, low_inclusive=op == ">=")
+    if op == "BETWEEN":
+        return column.range_fraction(cond["low"], cond["high"])
+    if op == "IS NULL":
+        return column.null_frac
+    return 1.0 - column.null_frac
+
+
+# Cost model, in units of one row read by a full scan. Measured on this
+# engine: fetching a row by the rid an index returned costs a little more
+# than scanning it, walking an ordered index about twice as much, and
+# testing a row with a columnar mask a fraction. Joins also pay for turning
+# every inner row they read into a dict.
+SCAN_ROW_COST = 1.0
+VECTOR_ROW_COST = 0.2
+INDEX_PROBE_COST = 3.0
+INDEX_ROW_COST = 1.2
+RANGE_ROW_COST = 2.0
+ROW_DICT_COST = 1.0
+HASH_BUILD_COST = 1.0
+HASH_PROBE_COST = 1.0
+
+# Below this many outer rows per inner row a merge join is not worth
+# walking the whole inner index; probe it per outer row instead
+MERGE_JOIN_MIN_RATIO = 0.125
+
+
+class QueryPlanner:
+    # Turns a parsed statement into a plan: how each table is accessed (index
+    # point lookup, ordered index range scan, full scan or, for columnar
+    # tables, vectorized scan), which filter is applied on top and whether
+    # ORDER BY still needs a sort. Access paths and join strategies are
+    # chosen by estimated cost, from the tables' statistics (core.statistics).
+    def __init__(self, db: Database):
+        self.db = db
+
+    def plan(self, cmd: Dict[str, Any], estimate: bool = False) -> Dict[str, Any]:
+        # estimate=True records the estimated row counts EXPLAIN shows even
+        # where no decision needed them (they may require gathering statistics)
+        plan: Dict[str, Any] = {"type": cmd["type"], "table": cmd["table"]}
+        if cmd["type"] not in ("SELECT", "UPDATE", "DELETE"):
+            return plan
+
+        table = self.db.get_table(cmd["table"])
+        join_name = cmd["join"]["table"] if cmd.get("join") else None
+        pre_join, post_join = self._place_filters(table.name, join_name, cmd.get("where"))
+        plan["filter"] = pre_join
+        plan.update(self._access_path(table, pre_join))
+        if isinstance(table, PartitionedTable):
+            # Partitions read by the access path: a lookup on the partition
+            # column needs one
+            pruned = plan["access"] == "index" and plan["column"] == table.partition_by
+            plan["partitions"] = [1 if pruned else table.partition_count, table.partition_count]
+        if estimate or join_name:
+            plan["rows"] = self.estimate_rows(table, plan)
+        if post_join:
+            plan["post_filter"] = post_join
+        aggregating = bool(cmd.get("aggregates") or cmd.get("group_by"))
+        if cmd.get("order_by") and not aggregating:
+            self._plan_order(table, plan, cmd["order_by"])
+        if join_name:
+            plan["join"] = self._plan_join(table, plan, cmd["join"])
+        if table.layout == "columnar" and plan["access"] == "scan":
+            self._plan_vector_scan(table, plan)
+        if aggregating:
+            plan["aggregate"] = self._plan_aggregate(table, plan, cmd)
+            # Aggregates over whole columns, when no row-at-a-time filter is left
+            aggregate = plan["aggregate"]
+            if (table.layout == "columnar" and not aggregate["fast"] and not join_name
+                    and plan["access"] in ("scan", "vector_scan") and not plan["filter"]
+                    and vectorized.can_aggregate(table, aggregate)):
+                aggregate["vectorized"] = True
+            # ORDER BY sorts the groups, never the scanned rows
+            if cmd.get("order_by"):
+                plan["order_by"] = cmd["order_by"]
+                plan["ordered"] = False
+        if cmd.get("limit") is not None:
+            plan["limit"] = cmd["limit"]
+        if cmd.get("offset"):
+            plan["offset"] = cmd["offset"]
+        return plan
+
+    def _plan_aggregate(self, table: Table, plan: Dict[str, Any], cmd: Dict[str, Any]) -> Dict[str, Any]:
+        aggregate = {"group_by": cmd.get("group_by") or [], "aggregates": cmd["aggregates"],
+                     "having": cmd.get("having"), "fast": None}
+        if cmd.get("where") or cmd.get("join") or aggregate["group_by"]:
+            return aggregate
+        specs = cmd["aggregates"]
+
+        # COUNT(*) over the whole table is the live row count
+        if all(a["func"] == "COUNT" and a["column"] is None for a in specs):
+            aggregate["fast"] = "count"
+            plan["access"] = "metadata"
+            return aggregate
+
+        # MIN/MAX of columns with an ordered index are its first/last key
+        if all(a["func"] in ("MIN", "MAX") for a in specs):
+            indexes = [table.sorted_index_on(self._strip_table(table.name, a["column"])) for a in specs]
+            if all(indexes):
+                aggregate["fast"] = "index"
+                aggregate["indexes"] = [index.name for index in indexes]
+                plan["access"] = "index_minmax"
+        return aggregate
+
+    def _plan_vector_scan(self, table: Table, plan: Dict[str, Any]):
+        # Columnar tables evaluate the predicates they can as masks over whole
+        # columns; the rest stays a filter on the matching records
+        vector, rest = [], []
+        for pred in conjuncts(plan["filter"]):
+            (vector if vectorized.can_filter(table, pred) else rest).append(pred)
+        if vector:
+            plan.update({"access": "vector_scan", "vector_filter": conjoin(vector), "filter": conjoin(rest)})
+
+    def _strip_table(self, table_name: str, column: str) -> str:
+        if column.startswith(table_name + "."):
+            return column.split(".", 1)[1]
+        return column
+
+    def _place_filters(self, table_name: str, join_name: Optional[str], cond: Optional[Dict[str, Any]]):
+        # Predicates on the main table (bare or "<table>.col") run before the join
+        # against its own rows; predicates touching "<joined table>.col" run on the joined rows.
+        # Either way "<table>.col" becomes "col": joined rows keep the main
+        # table's columns under their bare names (see joins.merge_rows).
+        def strip(column):
+            return self._strip_table(table_name, column)
+
+        pre_join, post_join = [], []
+        for pred in conjuncts(cond):
+            if join_name and any(c.startswith(join_name + ".") for c in condition_columns(pred)):
+                post_join.append(map_columns(pred, strip))
+            else:
+                pre_join.append(map_columns(pred, strip))
+        return conjoin(pre_join), conjoin(post_join)
+
+    def estimate_rows(self, table: Table, plan: Dict[str, Any]) -> float:
+        # Rows left once the access path and the filter have run
+        total = len(table)
+        if plan["access"] == "index" and table.indexes[plan["index"]].unique:
+            return min(total, 1)
+        if not total or not plan["filter"]:
+            return total
+        return max(total * selectivity(table.current_statistics(), plan["filter"]), 1.0)
+
+    def distinct(self, table: Table, column: str) -> float:
+        # Distinct non-NULL values of a column: exact from an index on it,
+        # estimated from the statistics otherwise
+        index = table.index_on(column)
+        if index is not None:
+            return max(len(index), 1)
+        stats = table.current_statistics().columns.get(column)
+        return max(stats.distinct if stats else 1.0, 1.0)
+
+    def _plan_join(self, table: Table, plan: Dict[str, Any], join: Dict[str, Any]) -> Dict[str, Any]:
+        inner = self.db.get_table(join["table"])
+        outer_col, inner_col = self._join_columns(table.name, inner.name, join)
+        result = {"table": inner.name, "on": join["on"], "outer_column": outer_col, "inner_column": inner_col}
+
+        outer_rows = plan["rows"]
+        inner_rows = len(inner)
+        inner_index = inner.index_on(inner_col)
+        inner_sorted = inner.sorted_index_on(inner_col)
+        outer_sorted = table.sorted_index_on(outer_col)
+        # Every outer row meets the inner rows sharing its key
+        inner_distinct = self.distinct(inner, inner_col)
+        result["rows"] = outer_rows * inner_rows / max(self.distinct(table, outer_col), inner_distinct)
+
+        # Merge join: both sides can be read in join key order, and the outer
+        # side is large enough that walking the whole inner index pays off
+        if inner_sorted and not plan.get("order_by") and outer_rows >= inner_rows * MERGE_JOIN_MIN_RATIO:
+            outer_ordered = plan["access"] in ("range", "index_order") and plan["column"] == outer_col
+            if not outer_ordered and plan["access"] == "scan" and outer_sorted:
+                plan.update({"access": "index_order", "index": outer_sorted.name, "column": outer_col})
+                outer_ordered = True
+            if outer_ordered:
+                result.update({"strategy": "merge", "index": inner_sorted.name})
+                return result
+
+        # Index nested loop: one index probe per outer row, no build step.
+        # Hash join: reads the whole inner table, builds on the smaller side
+        # and probes with the other.
+        probe_cost = outer_rows * (INDEX_PROBE_COST + inner_rows / inner_distinct * (INDEX_ROW_COST + ROW_DICT_COST))
+        hash_cost = inner_rows * (SCAN_ROW_COST + ROW_DICT_COST) + \
+            min(outer_rows, inner_rows) * HASH_BUILD_COST + max(outer_rows, inner_rows) * HASH_PROBE_COST
+        if inner_index and probe_cost <= hash_cost:
+            result.update({"strategy": "index_nested_loop", "index": inner_index.name})
+            return result
+
+        # Building on the outer side emits rows in inner order, so keep the
+        # inner build when the outer order has to survive for ORDER BY
+        build_outer = outer_rows < inner_rows and not plan.get("ordered")
+        result.update({"strategy": "hash", "build": "outer" if build_outer else "inner"})
+        return result
+
+    def _join_columns(self, outer_name: str, inner_name: str, join: Dict[str, Any]):
+        # ON sides may be written in either order; bare names refer to the outer table
+        outer_col = inner_col = None
+        for ref in (join["left"], join["right"]):
+            t, _, c = ref.rpartition(".")
+            if t == inner_name and inner_col is None:
+                inner_col = c
+            elif t in ("", outer_name) and outer_col is None:
+                outer_col = c
+            else:
+                raise ValueError(f"Cannot resolve join column {ref}")
+        if outer_col is None or inner_col is None:
+            raise ValueError(f"Join condition must compare {outer_name} with {inner_name}: {join['on']}")
+        return outer_col, inner_col
+
+    def _access_path(self, table: Table, cond: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        preds = conjuncts(cond)
+
+        # An equality predicate on an indexed column only needs to test the
+        # rows the index returns; PK/UNIQUE indexes return at most one, which
+        # nothing beats
+        lookups = []
+        for pred in preds:
+            if pred["op"] == "=":
+                index = table.index_on(pred["column"])
+                if index and index.unique:
+                    return {"access": "index", "index": index.name, "column": index.column, "key": pred["value"]}
+                if index:
+                    lookups.append((pred, index))
+
+        # Range predicates on a column with an ordered index can be a range scan
+        ranges = {}
+        for pred in preds:
+            if pred["op"] in ("<", "<=", ">", ">=", "BETWEEN") and pred["column"] not in ranges:
+                index = table.sorted_index_on(pred["column"])
+                if index:
+                    ranges[pred["column"]] = index
+        if not lookups and not ranges:
+            return {"access": "scan"}
+
+        # Otherwise the cheapest of the candidates and a full scan
+        total = len(table)
+        stats = table.current_statistics()
+        vector = table.layout == "columnar" and any(vectorized.can_filter(table, p) for p in preds)
+        best, best_cost = {"access": "scan"}, total * (VECTOR_ROW_COST if vector else SCAN_ROW_COST)
+        for pred, index in lookups:
+            cost = INDEX_PROBE_COST + total * selectivity(stats, pred) * INDEX_ROW_COST
+            if cost < best_cost:
+                best = {"access": "index", "index": index.name, "column": index.column, "key": pred["value"]}
+                best_cost = cost
+        for column, index in ranges.items():
+            access = {"access": "range", "index": index.name, "column": column,
+                      "low": None, "high": None, "low_inclusive": True, "high_inclusive": True}
+            bounds = [p for p in preds if p.get("column") == column]
+            for p in bounds:
+                self._narrow(access, p)
+            cost = INDEX_PROBE_COST + total * selectivity(stats, conjoin(bounds)) * RANGE_ROW_COST
+            if cost < best_cost:
+                best, best_cost = access, cost
+        return best
+
+    def _narrow(self, access: Dict[str, Any], pred: Dict[str, Any]):
+        # Fold one predicate into the range bounds; the filter still re-checks every row
+        op = pred["op"]
+        if op == "BETWEEN":
+            self._narrow(access, {"op": ">=", "value": pred["low"]})
+            self._narrow(access, {"op": "<=", "value": pred["high"]})
+        elif op in (">", ">="):
+            if access["low"] is None or pred["value"] > access["low"] or \
+                    (pred["value"] == access["low"] and op == ">"):
+                access["low"] = pred["value"]
+                access["low_inclusive"] = op == ">="
+        elif op in ("<", "<="):
+            if access["high"] is None or pred["value"] < access["high"] or \
+                    (pred["value"] == access["high"] and op == "<"):
+                access["high"] = pred["value"]
+                access["high_inclusive"] = op == "<="
+
+    def _plan_order(self, table: Table, plan: Dict[str, Any], order_by: Dict[str, Any]):
+        plan["order_by"] = order_by
+        column = order_by["column"]
+        if "." in column and column.split(".", 1)[0] == table.name:
+            column = column.split(".", 1)[1]
+        # A range scan already produces rows in index order; reverse it for DESC
+        if plan["access"] == "range" and plan["column"] == column:
+            plan["ordered"] = True
+            return
+        # Without a better access path, walk an ordered index instead of sorting
+        index = table.sorted_index_on(column)
+        if plan["access"] == "scan" and index:
+            plan.update({"access": "index_order", "index": index.name, "column": index.column})
+            plan["ordered"] = True
+            return
+        plan["ordered"] = False
+
+    def explain(self, plan: Dict[str, Any]) -> str:
+        verbs = {"SELECT": "SELECT FROM", "UPDATE": "UPDATE", "DELETE": "DELETE FROM",
+                 "INSERT": "INSERT INTO", "CREATE": "CREATE TABLE",
+                 "CREATE_INDEX": "CREATE INDEX ON", "DROP_INDEX": "DROP INDEX ON"}
+        lines = [f"{verbs.get(plan['type'], plan['type'])} {plan['table']}"]
+        access = plan.get("access")
+        rows = f" (~{plan['rows']:.0f} rows)" if "rows" in plan else ""
+        if access == "index":
+            lines.append(f"  INDEX LOOKUP {plan['table']} USING {plan['index']} ({plan['column']} = {plan['key']!r})")
+        elif access == "range":
+            low = "-inf" if plan["low"] is None else repr(plan["low"])
+            high = "+inf" if plan["high"] is None else repr(plan["high"])
+            lines.append(f"  INDEX RANGE SCAN {plan['table']} USING {plan['index']} "
+                         f"({low} {'<=' if plan['low_inclusive'] else '<'} {plan['column']} "
+                         f"{'<=' if plan['high_inclusive'] else '<'} {high})")
+        elif access == "index_order":
+            lines.append(f"  INDEX ORDER SCAN {plan['table']} USING {plan['index']}")
+        elif access == "scan":
+            lines.append(f"  FULL SCAN {plan['table']}")
+        elif access == "vector_scan":
+            lines.append(f"  VECTORIZED SCAN {plan['table']} WHERE {format_condition(plan['vector_filter'])}")
+        elif access == "metadata":
+            lines.append(f"  ROW COUNT FROM METADATA {plan['table']}")
+        elif access == "index_minmax":
+            names = ", ".join(dict.fromkeys(plan["aggregate"]["indexes"]))
+            lines.append(f"  MIN/MAX FROM INDEX {plan['table']} USING {names}")
+        if "partitions" in plan:
+            lines[-1] += " [{} of {} partitions]".format(*plan["partitions"])
+        if plan.get("filter"):
+            lines.append(f"  FILTER {format_condition(plan['filter'])}{rows}")
+        elif access in ("index", "range", "index_order", "scan", "vector_scan"):
+            lines[-1] += rows
+        if plan.get("join"):
+            join = plan["join"]
+            line = f"  {join['strategy'].upper().replace('_', ' ')} JOIN {join['table']} ON {join['on']}"
+            if join["strategy"] == "hash":
+                line += f" (build {join['build']})"
+            elif "index" in join:
+                line += f" USING {join['index']}"
+            lines.append(f"{line} (~{join['rows']:.0f} rows)")
+        if plan.get("post_filter"):
+            lines.append(f"  FILTER {format_condition(plan['post_filter'])}")
+        aggregate = plan.get("aggregate")
+        if aggregate and not aggregate["fast"]:
+            parts = ["HASH AGGREGATE" if aggregate["group_by"] else "AGGREGATE"]
+            if aggregate.get("vectorized"):
+                parts.insert(0, "VECTORIZED")
+            if aggregate["aggregates"]:
+                parts.append(", ".join(a["name"] for a in aggregate["aggregates"]))
+            if aggregate["group_by"]:
+                parts.append(f"GROUP BY {', '.join(aggregate['group_by'])}")
+            lines.append("  " + " ".join(parts))
+        if aggregate and aggregate["having"]:
+            lines.append(f"  HAVING {format_condition(aggregate['having'])}")
+        if plan.get("order_by"):
+            order = plan["order_by"]
+            direction = "DESC" if order["desc"] else "ASC"
+            if plan["ordered"]:
+                lines.append(f"  ORDER BY {order['column']} {direction} (from index)")
+            else:
+                lines.append(f"  SORT BY {order['column']} {direction}")
+        if plan.get("limit") is not None or plan.get("offset"):
+            parts = []
+            if plan.get("limit") is not None:
+                parts.append(f"LIMIT {plan['limit']}")
+            if plan.get("offset"):
+                parts.append(f"OFFSET {plan['offset']}")
+            lines.append("  " + " ".join(parts))
+        return "\n".join(lines)
@@ -0,0 +1,112 @@
+import operator
+from typing import Any, Callable, Dict, Optional
+
+# Compiles a WHERE condition tree (see SQLParser) into a plain Python closure
+# once per query, so the per-row cost is a few column reads and comparisons
+# instead of walking the tree. Comparisons with NULL are never true, and
+# NOT is pushed down to the comparisons so that NOT (col = 1) is not true
+# for a NULL col either.
+#
+# Rows are dicts, or table records (tuples in column order) when the
+# table's column positions are given; either way a column is read through
+# a C-level getter (dict.get or itemgetter), and unknown columns read as NULL.
+
+Predicate = Callable[[Any], bool]
+
+COMPARATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+NEGATED = {"=": "!=", "!=": "=", "<": ">=", "<=": ">", ">": "<=", ">=": "<",
+           "IS NULL": "IS NOT NULL", "IS NOT NULL": "IS NULL"}
+
+
+def always_true(row: Any) -> bool:
+    return True
+
+
+def always_false(row: Any) -> bool:
+    return False
+
+
+def _null(row: Any) -> Any:
+    return None
+
+
+def column_getter(column: str, positions: Optional[Dict[str, int]] = None) -> Callable[[Any], Any]:
+    if positions is None:
+        return operator.methodcaller("get", column)
+    pos = positions.get(column)
+    return _null if pos is None else operator.itemgetter(pos)
+
+
+def compile_condition(cond: Optional[Dict[str, Any]], positions: Optional[Dict[str, int]] = None) -> Predicate:
+    if cond is None:
+        return always_true
+    return _compile(cond, False, positions)
+
+
+def _compile(cond: Dict[str, Any], negate: bool, positions: Optional[Dict[str, int]]) -> Predicate:
+    op = cond["op"]
+    if op == "NOT":
+        return _compile(cond["arg"], not negate, positions)
+    if op in ("AND", "OR"):
+        # De Morgan: NOT (a AND b) == NOT a OR NOT b
+        conjunction = (op == "AND") != negate
+        preds = [_compile(arg, negate, positions) for arg in cond["args"]]
+        return _all(preds) if conjunction else _any(preds)
+    if negate and op in NEGATED:
+        return _compile(dict(cond, op=NEGATED[op]), False, positions)
+
+    get = column_getter(cond["column"], positions)
+    if op == "IS NULL":
+        return lambda row: get(row) is None
+    if op == "IS NOT NULL":
+        return lambda row: get(row) is not None
+    if op == "BETWEEN":
+        low, high = cond["low"], cond["high"]
+        if low is None or high is None:
+            return always_false
+        if negate:
+            return lambda row: (v := get(row)) is not None and not (low <= v <= high)
+        return lambda row: (v := get(row)) is not None and low <= v <= high
+    if op == "IN":
+        values = frozenset(v for v in cond["values"] if v is not None)
+        if negate:
+            # NOT IN with a NULL in the list is never true
+            if None in cond["values"]:
+                return always_false
+            return lambda row: (v := get(row)) is not None and v not in values
+        return lambda row: get(row) in values
+
+    value = cond["value"]
+    if value is None:
+        return always_false
+    if op == "=":
+        return lambda row: get(row) == value
+    if op == "!=":
+        return lambda row: (v := get(row)) is not None and v != value
+    compare = COMPARATORS[op]
+    return lambda row: (v := get(row)) is not None and compare(v, value)
+
+
+def _all(preds) -> Predicate:
+    # Nest pairs of closures; short-circuits like a hand-written `and`
+    first = preds[0]
+    if len(preds) == 1:
+        return first
+    rest = _all(preds[1:])
+    return lambda row: first(row) and rest(row)
+
+
+def _any(preds) -> Predicate:
+    first = preds[0]
+    if len(preds) == 1:
+        return first
+    rest = _any(preds[1:])
+    return lambda row: first(row) or rest(row)
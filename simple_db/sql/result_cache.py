@@ -0,0 +1,96 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.table import Table
+
+
+def statement_key(cmd: Dict[str, Any]) -> str:
+    # A bound statement as text. The parser has already normalized spacing,
+    # keyword case and literal syntax, and binding has put the parameter
+    # values in place, so equal keys mean the same query with the same
+    # parameters.
+    return repr(cmd)
+
+
+def result_size(key: str, rows: Sequence[Dict[str, Any]]) -> int:
+    # Approximate bytes held by a cached result: the containers plus every
+    # value (the column-name keys are shared with the table rows)
+    size = sys.getsizeof(key) + sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for val in row.values():
+            size += sys.getsizeof(val)
+    return size
+
+
+class ResultCache:
+    # Results of SELECT statements, kept in LRU order up to max_bytes.
+    # Each entry remembers the version of every table it read
+    # (Table.version); a lookup only hits while all of them are unchanged,
+    # so a write to a table invalidates exactly the results that read it.
+    # Cached rows are shared between callers and must be treated as read-only.
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # Results bigger than this are not cached at all
+        self.max_entry_bytes = max_bytes // 4
+        self._entries: "OrderedDict[str, Tuple[tuple, List[Dict[str, Any]], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: str, tables: Sequence[Table]) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == tuple(t.version for t in tables):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._discard(key)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, versions: tuple, rows: List[Dict[str, Any]]):
+        size = result_size(key, rows)
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (versions, rows, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
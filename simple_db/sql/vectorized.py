@@ -0,0 +1,398 @@
+import operator
+from functools import partial, reduce
+from itertools import compress
+from typing import Any, Dict, List, Optional
+
+from core.columnar import ColumnStore, DictionaryVector, NumericVector
+from core.table import Table
+from sql.predicates import COMPARATORS, NEGATED
+
+try:
+    import numpy as np
+except ImportError:  # optional: fall back to the array module
+    np = None
+
+# WHERE filters and aggregates over whole columns of a columnar table (see
+# core.columnar). A condition becomes a mask with one entry per slot,
+# combined with AND/OR/NOT as whole-mask operations, with the same NULL
+# rules as sql.predicates. With NumPy the masks are boolean arrays over
+# zero-copy views of the column arrays; without it they are Python ints
+# holding one byte per row (bitwise &, |, ^ run in C) and comparisons run
+# through map() over the arrays, so no Python code runs per row either way.
+#
+# Only conditions on typed or dictionary-encoded columns compared with
+# values of a matching type are vectorized; the planner leaves everything
+# else to the row-at-a-time predicates.
+
+NUMPY_TYPES = {"q": "int64", "d": "float64", "b": "int8"}
+# v < x is x > v: the operand order for partial(op, x)
+FLIPPED = {"=": operator.eq, "!=": operator.ne, "<": operator.gt, "<=": operator.ge,
+           ">": operator.lt, ">=": operator.le}
+INT64 = (-2**63, 2**63)
+# Combined group keys must stay within int64
+MAX_GROUP_KEYS = 2**62
+_not_null = partial(operator.is_not, None)
+
+
+def _vector(table: Table, column: str):
+    slots = table.slots
+    if table.layout != "columnar" or not isinstance(slots, ColumnStore) or column not in table.positions:
+        return None
+    vector = slots.vectors[table.positions[column]]
+    return vector if isinstance(vector, (NumericVector, DictionaryVector)) else None
+
+
+def _fits(vector, value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(vector, DictionaryVector):
+        return isinstance(value, str)
+    if isinstance(value, int):
+        return INT64[0] <= value < INT64[1]
+    return isinstance(value, float)
+
+
+def can_filter(table: Table, cond: Dict[str, Any]) -> bool:
+    op = cond["op"]
+    if op == "NOT":
+        return can_filter(table, cond["arg"])
+    if op in ("AND", "OR"):
+        return all(can_filter(table, arg) for arg in cond["args"])
+    vector = _vector(table, cond["column"])
+    if vector is None:
+        return False
+    if op == "BETWEEN":
+        return _fits(vector, cond["low"]) and _fits(vector, cond["high"])
+    if op == "IN":
+        return all(_fits(vector, v) for v in cond["values"])
+    return _fits(vector, cond.get("value"))
+
+
+def can_aggregate(table: Table, aggregate: Dict[str, Any]) -> bool:
+    for col in aggregate["group_by"]:
+        if _vector(table, col) is None:
+            return False
+    for a in aggregate["aggregates"]:
+        if a["column"] is None:
+            continue
+        vector = _vector(table, a["column"])
+        if vector is None or (a["func"] in ("SUM", "AVG") and not isinstance(vector, NumericVector)):
+            return False
+    return True
+
+
+class _BytesMasks:
+    # Masks as Python ints with one byte (0 or 1) per slot
+    def __init__(self, store: ColumnStore):
+        self.n = len(store)
+        self.ones = int.from_bytes(b"\x01" * self.n, "little")
+        self.live = int.from_bytes(store.live, "little")
+
+    def of(self, flags) -> int:
+        return int.from_bytes(bytes(flags), "little")
+
+    def none(self) -> int:
+        return 0
+
+    def invert(self, mask: int) -> int:
+        return mask ^ self.ones
+
+    def to_bytes(self, mask: int) -> bytes:
+        return mask.to_bytes(self.n, "little")
+
+    def nulls(self, vector) -> int:
+        if isinstance(vector, DictionaryVector):
+            return self.of(map((-1).__eq__, vector.codes))
+        return int.from_bytes(vector.nulls, "little") if vector.null_count else 0
+
+    def test(self, vector, pred) -> int:
+        # pred(value) for every non-NULL value
+        if isinstance(vector, DictionaryVector):
+            lut = bytes([bool(pred(s)) for s in vector.dictionary]) + b"\x00"
+            return self.of(map(lut.__getitem__, vector.codes))
+        values = vector.values
+        if vector.col_type == "bool":
+            values = map(bool, values)
+        return self.of(map(pred, values)) & self.invert(self.nulls(vector))
+
+    def compare(self, vector, op: str, value: Any) -> int:
+        return self.test(vector, partial(FLIPPED[op], value))
+
+    def isin(self, vector, values: frozenset) -> int:
+        return self.test(vector, values.__contains__)
+
+    def rids(self, mask: int) -> List[int]:
+        return list(compress(range(self.n), self.to_bytes(mask)))
+
+
+class _NumpyMasks:
+    # Masks as NumPy boolean arrays
+    def __init__(self, store: ColumnStore):
+        self.n = len(store)
+        self.live = np.frombuffer(store.live, dtype=np.uint8).astype(bool)
+
+    def none(self):
+        return np.zeros(self.n, dtype=bool)
+
+    def invert(self, mask):
+        return ~mask
+
+    def nulls(self, vector):
+        if isinstance(vector, DictionaryVector):
+            return np.frombuffer(vector.codes, dtype=np.int64) == -1
+        return np.frombuffer(vector.nulls, dtype=np.uint8).astype(bool)
+
+    def values(self, vector):
+        return np.frombuffer(vector.values, dtype=NUMPY_TYPES[vector.values.typecode])
+
+    def lut(self, vector, pred):
+        lut = np.array([bool(pred(s)) for s in vector.dictionary] + [False], dtype=bool)
+        return lut[np.frombuffer(vector.codes, dtype=np.int64)]
+
+    def compare(self, vector, op: str, value: Any):
+        if isinstance(vector, DictionaryVector):
+            return self.lut(vector, partial(FLIPPED[op], value))
+        return COMPARATORS[op](self.values(vector), value) & ~self.nulls(vector)
+
+    def isin(self, vector, values: frozenset):
+        if isinstance(vector, DictionaryVector):
+            return self.lut(vector, values.__contains__)
+        return np.isin(self.values(vector), list(values)) & ~self.nulls(vector)
+
+    def rids(self, mask) -> List[int]:
+        return np.flatnonzero(mask).tolist()
+
+
+def _masks(store: ColumnStore):
+    return _NumpyMasks(store) if np is not None else _BytesMasks(store)
+
+
+def _mask(table: Table, masks, cond: Dict[str, Any], negate: bool = False):
+    # Mirrors sql.predicates._compile: NOT is pushed down to the leaves
+    op = cond["op"]
+    if op == "NOT":
+        return _mask(table, masks, cond["arg"], not negate)
+    if op in ("AND", "OR"):
+        parts = [_mask(table, masks, arg, negate) for arg in cond["args"]]
+        result = parts[0]
+        for part in parts[1:]:
+            result = result & part if (op == "AND") != negate else result | part
+        return result
+    if negate and op in NEGATED:
+        return _mask(table, masks, dict(cond, op=NEGATED[op]))
+
+    vector = _vector(table, cond["column"])
+    if op == "IS NULL":
+        return masks.nulls(vector)
+    if op == "IS NOT NULL":
+        return masks.invert(masks.nulls(vector))
+    if op == "BETWEEN":
+        low, high = cond["low"], cond["high"]
+        if low is None or high is None:
+            return masks.none()
+        between = masks.compare(vector, ">=", low) & masks.compare(vector, "<=", high)
+        if negate:
+            return masks.invert(between) & masks.invert(masks.nulls(vector))
+        return between
+    if op == "IN":
+        values = frozenset(v for v in cond["values"] if v is not None)
+        found = masks.isin(vector, values)
+        if negate:
+            if None in cond["values"]:
+                return masks.none()
+            return masks.invert(found) & masks.invert(masks.nulls(vector))
+        return found
+    if cond["value"] is None:
+        return masks.none()
+    return masks.compare(vector, op, cond["value"])
+
+
+def _selection(table: Table, cond: Optional[Dict[str, Any]]):
+    masks = _masks(table.slots)
+    selected = masks.live
+    if cond is not None:
+        selected = selected & _mask(table, masks, cond)
+    return masks, selected
+
+
+def filter_rids(table: Table, cond: Optional[Dict[str, Any]]) -> List[int]:
+    # Live row ids matching cond, in rid order
+    masks, selected = _selection(table, cond)
+    return masks.rids(selected)
+
+
+def aggregate(table: Table, aggregate: Dict[str, Any], cond: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # The output rows of an aggregate over the rows matching cond, like the
+    # executor's hash aggregation (groups in order of first appearance)
+    masks, selected = _selection(table, cond)
+    if np is not None:
+        return _numpy_aggregate(table, aggregate, masks, selected)
+    return _array_aggregate(table, aggregate, masks, selected)
+
+
+def _values(vector, selected: bytes) -> List[Any]:
+    return list(compress(vector.to_list(), selected))
+
+
+def _fold(func: str, values: List[Any], count: int) -> Any:
+    # An aggregate over the non-NULL values of a group, with the results the
+    # accumulators in sql.aggregates give (SUM adds onto the first value)
+    if func == "COUNT":
+        return count
+    if not count:
+        return None
+    if func == "MIN":
+        return min(values)
+    if func == "MAX":
+        return max(values)
+    if func == "SUM":
+        return reduce(operator.add, values)
+    return sum(values) / count
+
+
+def _array_aggregate(table, aggregate, masks, selected) -> List[Dict[str, Any]]:
+    selected_bytes = masks.to_bytes(selected)
+    specs = aggregate["aggregates"]
+    group_by = aggregate["group_by"]
+    if group_by:
+        # Columns are decoded for the selected rows only; the one loop per row
+        # collects each group's positions, then every aggregate gathers and
+        # folds a group's values with builtins
+        keys = zip(*[_values(_vector(table, col), selected_bytes) for col in group_by])
+        members: Dict[tuple, List[int]] = {}
+        for i, key in enumerate(keys):
+            positions = members.get(key)
+            if positions is None:
+                members[key] = [i]
+            else:
+                positions.append(i)
+        rows = [dict(zip(group_by, key)) for key in members]
+        for a in specs:
+            if a["column"] is None:
+                for row, positions in zip(rows, members.values()):
+                    row[a["name"]] = len(positions)
+                continue
+            column = _values(_vector(table, a["column"]), selected_bytes)
+            for row, positions in zip(rows, members.values()):
+                values = list(filter(_not_null, map(column.__getitem__, positions)))
+                row[a["name"]] = _fold(a["func"], values, len(values))
+        return rows
+
+    row = {}
+    count = selected_bytes.count(1)
+    for a in specs:
+        if a["column"] is None:
+            row[a["name"]] = count
+            continue
+        vector = _vector(table, a["column"])
+        valid = masks.to_bytes(selected & masks.invert(masks.nulls(vector)))
+        if isinstance(vector, DictionaryVector):
+            # MIN/MAX only need the distinct strings present
+            values = [vector.dictionary[c] for c in set(compress(vector.codes, valid))]
+        else:
+            values = compress(map(bool, vector.values) if vector.col_type == "bool" else vector.values, valid)
+        row[a["name"]] = _fold(a["func"], values, valid.count(1))
+    return [row]
+
+
+def _scalar(vector, value) -> Any:
+    value = value.item()
+    return bool(value) if vector.col_type == "bool" else value
+
+
+def _numpy_aggregate(table, aggregate, masks, selected) -> List[Dict[str, Any]]:
+    specs = aggregate["aggregates"]
+    group_by = aggregate["group_by"]
+    rids = np.flatnonzero(selected)
+    if group_by and not len(rids):
+        return []
+
+    # Group number of every selected row, groups numbered by first appearance
+    if group_by:
+        # Each key column as small ints (0 for NULL), combined into one int64
+        # key per row unless the combinations could overflow it
+        parts, cardinality = [], 1
+        for col in group_by:
+            vector = _vector(table, col)
+            if isinstance(vector, DictionaryVector):
+                part = np.frombuffer(vector.codes, dtype=np.int64)[rids] + 1
+                cardinality *= len(vector.dictionary) + 1
+            else:
+                distinct, inverse = np.unique(masks.values(vector)[rids], return_inverse=True)
+                part = np.where(masks.nulls(vector)[rids], 0, inverse.reshape(-1) + 1)
+                cardinality *= len(distinct) + 1
+            parts.append(part)
+        if cardinality < MAX_GROUP_KEYS:
+            keys = parts[0]
+            for part in parts[1:]:
+                keys = keys * (int(part.max()) + 1) + part
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        else:
+            _, first, inverse = np.unique(np.stack(parts, axis=1), axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        group_of = rank[inverse]
+        starts = first[order]
+    else:
+        group_of = np.zeros(len(rids), dtype=np.int64)
+        starts = np.zeros(1, dtype=np.int64)
+    n_groups = len(starts)
+
+    rows = []
+    for g in range(n_groups):
+        rep = int(rids[starts[g]]) if len(rids) else None
+        rows.append({col: (None if rep is None else _vector(table, col).get(rep)) for col in group_by})
+
+    for a in specs:
+        if a["column"] is None:
+            counts = np.bincount(group_of, minlength=n_groups)
+            for row, c in zip(rows, counts.tolist()):
+                row[a["name"]] = c
+            continue
+        vector = _vector(table, a["column"])
+        valid = ~masks.nulls(vector)[rids]
+        groups = group_of[valid]
+        counts = np.bincount(groups, minlength=n_groups).tolist()
+        if a["func"] == "COUNT":
+            results = counts
+        elif isinstance(vector, DictionaryVector):
+            # Compare strings by their rank in the sorted dictionary
+            ordered = sorted(range(len(vector.dictionary)), key=vector.dictionary.__getitem__)
+            ranks = np.empty(len(ordered) + 1, dtype=np.int64)
+            ranks[ordered] = np.arange(len(ordered))
+            row_ranks = ranks[np.frombuffer(vector.codes, dtype=np.int64)[rids][valid]]
+            out = np.full(n_groups, len(ordered) if a["func"] == "MIN" else -1, dtype=np.int64)
+            (np.minimum if a["func"] == "MIN" else np.maximum).at(out, groups, row_ranks)
+            results = [vector.dictionary[ordered[r]] if c else None for r, c in zip(out.tolist(), counts)]
+        else:
+            values = masks.values(vector)[rids][valid]
+            if a["func"] in ("MIN", "MAX"):
+                ufunc = np.minimum if a["func"] == "MIN" else np.maximum
+                out = np.zeros(n_groups, dtype=values.dtype)
+                if len(values):
+                    # Start each group from one of its own values
+                    out[groups] = values
+                    ufunc.at(out, groups, values)
+                results = [_scalar(vector, v) if c else None for v, c in zip(out, counts)]
+            else:
+                dtype = np.float64 if vector.col_type == "float" else np.int64
+                if dtype is np.int64 and len(values):
+                    # int64 sums wrap silently: add as Python ints, like the
+                    # row engine, when the largest possible sum would not fit
+                    bound = max(-int(values.min()), int(values.max())) * len(values)
+                    if bound >= INT64[1]:
+                        dtype = object
+                out = np.zeros(n_groups, dtype=dtype)
+                np.add.at(out, groups, values.astype(dtype))
+                sums = out.tolist()
+                if a["func"] == "SUM":
+                    # A lone bool sums to itself, as in sql.aggregates.Sum
+                    lone = bool if vector.col_type == "bool" else None
+                    results = [None if not c else lone(s) if lone and c == 1 else s for s, c in zip(sums, counts)]
+                else:
+                    results = [s / c if c else None for s, c in zip(sums, counts)]
+        for row, value in zip(rows, results):
+            row[a["name"]] = value
+    return rows
@@ -1,4 +1,5 @@
 import os
+import json
 import shutil
 from core.database import Database
 from core.table import Column
@@ -60,5 +61,366 @@ def test_core():
 
     print("All core tests passed!")
 
+def test_wal_replay():
+    if os.path.exists("test_db_wal"):
+        shutil.rmtree("test_db_wal")
+
+    db = Database("test_db_wal", checkpoint_interval=1000)
+    db.create_table("users", [Column("id", "int", is_primary_key=True), Column("name", "str")])
+    table = db.get_table("users")
+    for i in range(10):
+        table.insert({"id": i, "name": f"user{i}"})
+    table.update({"name": "renamed"}, lambda r: r["id"] == 3)
+    table.delete(lambda r: r["id"] % 2 == 0)
+    db.save_table("users")
+
+    print("Verifying writes go to the log, not the table image...")
+    with open(os.path.join("test_db_wal", "users.json")) as f:
+        assert json.load(f)["rows"] == []
+
+    print("Verifying log replay...")
+    db2 = Database("test_db_wal")
+    rows = db2.get_table("users").rows
+    assert [r["id"] for r in rows] == [1, 3, 5, 7, 9]
+    assert rows[1]["name"] == "renamed"
+
+    print("Verifying checkpoint...")
+    db2.get_table("users").insert({"id": 11, "name": "late"})
+    db2.save_all()
+    with open(os.path.join("test_db_wal", "users.json")) as f:
+        assert len(json.load(f)["rows"]) == 6
+    db3 = Database("test_db_wal")
+    assert len(db3.get_table("users").rows) == 6
+
+    print("Verifying commits after a torn log tail survive the next crash...")
+    db3.get_table("users").insert({"id": 20, "name": "before"})
+    db3.save_table("users")
+    with open(os.path.join("test_db_wal", "wal.log"), "a") as f:
+        f.write('{"table":"users","op":"insert","rec')
+    db4 = Database("test_db_wal")
+    db4.get_table("users").insert({"id": 21, "name": "after"})
+    db4.save_table("users")
+    # Crash again without a checkpoint
+    db5 = Database("test_db_wal")
+    assert [r["id"] for r in db5.get_table("users").rows][-2:] == [20, 21]
+    print("WAL tests passed!")
+
+def test_paged_storage():
+    if os.path.exists("test_db_paged"):
+        shutil.rmtree("test_db_paged")
+
+    db = Database("test_db_paged", engine="paged")
+    db.create_table("events", [
+        Column("id", "int", is_primary_key=True),
+        Column("kind", "str"),
+        Column("score", "float"),
+        Column("done", "bool"),
+    ])
+    table = db.get_table("events")
+    for i in range(2000):
+        table.insert({"id": i, "kind": f"kind-{i % 7}" * (i % 5), "score": i / 4, "done": i % 2 == 0})
+    table.insert({"id": 2000, "kind": None, "score": None, "done": None})
+    db.save_all()
+    assert os.path.exists(os.path.join("test_db_paged", "events.sdb"))
+    assert not os.path.exists(os.path.join("test_db_paged", "events.json"))
+
+    print("Verifying lazy paged reads...")
+    db2 = Database("test_db_paged", engine="paged")
+    table2 = db2.get_table("events")
+    assert not isinstance(table2.rows, list)
+    assert len(table2.rows) == 2001
+    assert table2.rows[1234] == {"id": 1234, "kind": "kind-2" * 4, "score": 308.5, "done": True}
+    assert table2.rows[-1] == {"id": 2000, "kind": None, "score": None, "done": None}
+    assert table2.lookup("id", 1999) == [1999]
+    assert sum(1 for r in table2.rows if r["done"]) == 1000
+
+    print("Verifying writes after a lazy load...")
+    table2.update({"kind": "changed"}, lambda r: r["id"] == 5)
+    db2.save_all()
+    db3 = Database("test_db_paged")
+    assert db3.get_table("events").rows[5]["kind"] == "changed"
+
+    print("Verifying JSON export...")
+    export_path = os.path.join("test_db_paged", "events.export")
+    db3.export_table("events", export_path)
+    with open(export_path) as f:
+        assert len(json.load(f)["rows"]) == 2001
+    print("Paged storage tests passed!")
+
+def test_lazy_loading():
+    if os.path.exists("test_db_lazy"):
+        shutil.rmtree("test_db_lazy")
+
+    db = Database("test_db_lazy")
+    for name in ("a", "b"):
+        db.create_table(name, [Column("id", "int", is_primary_key=True)])
+        db.get_table(name).insert({"id": 1})
+    db.save_table("a")
+
+    print("Verifying tables are discovered but not loaded...")
+    db2 = Database("test_db_lazy")
+    assert db2.table_names() == ["a", "b"]
+    assert db2.tables == {}
+    assert "load" not in db2.load_report["a"]
+
+    print("Verifying first access loads and replays the log...")
+    table_a = db2.get_table("a")
+    assert len(table_a.rows) == 1
+    assert db2.load_report["a"]["replayed"] == 1
+    assert "b" not in db2.tables
+    assert "a: discover" in db2.format_load_report()
+
+    print("Verifying checkpoint keeps log records of unloaded tables...")
+    db2.save_all()
+    db3 = Database("test_db_lazy")
+    assert len(db3.get_table("b").rows) == 1
+    print("Lazy loading tests passed!")
+
+def test_row_ids_and_vacuum():
+    if os.path.exists("test_db_vacuum"):
+        shutil.rmtree("test_db_vacuum")
+
+    db = Database("test_db_vacuum")
+    db.create_table("items", [Column("id", "int", is_primary_key=True), Column("tag", "str")])
+    table = db.get_table("items")
+    for i in range(10):
+        table.insert({"id": i, "tag": f"t{i % 2}"})
+    table.create_index("idx_tag", "tag")
+
+    print("Verifying deletes leave tombstones and keep row ids stable...")
+    assert table.delete(lambda r: r["id"] in (2, 3)) == 2
+    assert table.tombstones == 2 and len(table) == 8
+    assert table.get(table.lookup("id", 7)[0])["id"] == 7
+    assert 2 not in table.indexes["id"]
+    assert len(table.lookup("idx_tag", "t0")) == 4
+
+    print("Verifying updates only move the affected index entries...")
+    table.update({"tag": "t1"}, lambda r: True, table.lookup("id", 4))
+    assert len(table.lookup("idx_tag", "t0")) == 3
+    try:
+        table.update({"id": 100}, lambda r: r["id"] > 5)
+        print("FAIL: PK constraint ignored")
+    except ValueError as e:
+        print(f"SUCCESS: PK constraint caught ({e})")
+
+    print("Verifying replay after tombstones and a vacuum...")
+    db.save_table("items")
+    db2 = Database("test_db_vacuum")
+    assert [r["id"] for r in db2.get_table("items").rows] == [0, 1, 4, 5, 6, 7, 8, 9]
+    assert table.vacuum() == 2
+    assert table.tombstones == 0 and table.get(table.lookup("id", 7)[0])["id"] == 7
+    table.delete(lambda r: r["id"] == 9)
+    db.save_table("items")
+    db3 = Database("test_db_vacuum")
+    items3 = db3.get_table("items")
+    assert [r["id"] for r in items3.rows] == [0, 1, 4, 5, 6, 7, 8]
+    assert items3.lookup("idx_tag", "t1") == [1, 2, 3, 5]
+
+    print("Verifying Database.vacuum compacts and checkpoints...")
+    assert db3.vacuum("items") == 1
+    assert len(items3) == 7
+    print("Row id tests passed!")
+
+def test_group_commit():
+    import threading
+    import time
+    from core.wal import WriteAheadLog
+
+    if os.path.exists("test_db_group"):
+        shutil.rmtree("test_db_group")
+    os.makedirs("test_db_group")
+
+    print("Testing group commit...")
+    wal = WriteAheadLog(os.path.join("test_db_group", "wal.log"))
+    wal.open()
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        # Give the other committers time to queue up behind the leader
+        time.sleep(0.05)
+        real_fsync(fd)
+
+    os.fsync = slow_fsync
+    try:
+        def committer(i):
+            wal.append({"table": "t", "op": "insert", "row": {"id": i}})
+            wal.commit("full")
+        threads = [threading.Thread(target=committer, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        os.fsync = real_fsync
+    assert wal.syncs < 8, wal.syncs
+    wal.close()
+    assert len(WriteAheadLog(wal.path).open()) == 8
+
+    print("Testing that uncommitted transaction records are ignored...")
+    with open(wal.path, "a") as f:
+        f.write(json.dumps({"table": "t", "op": "insert", "row": {"id": 99}, "txn": 20, "lsn": 20}) + "\n")
+        f.write(json.dumps({"table": "t", "op": "insert", "row": {"id": 100}, "txn": 21, "lsn": 21}) + "\n")
+        f.write(json.dumps({"op": "commit", "txn": 21, "lsn": 22}) + "\n")
+    records = WriteAheadLog(wal.path).open()
+    assert [r["row"]["id"] for r in records][-1] == 100 and len(records) == 9
+    print("Group commit tests passed!")
+
+def test_transactions():
+    if os.path.exists("test_db_txn"):
+        shutil.rmtree("test_db_txn")
+
+    db = Database("test_db_txn", sync="full")
+    db.create_table("accounts", [Column("id", "int", is_primary_key=True), Column("balance", "int")])
+    accounts = db.get_table("accounts")
+    accounts.insert({"id": 1, "balance": 100})
+    accounts.insert({"id": 2, "balance": 50})
+    db.save_table("accounts")
+
+    print("Testing rollback...")
+    txn = db.begin()
+    txn.touch(accounts)
+    accounts.insert({"id": 3, "balance": 10})
+    accounts.update({"balance": 0}, lambda r: r["id"] == 1)
+    accounts.delete(lambda r: r["id"] == 2)
+    accounts.insert({"id": 2, "balance": 75})
+    assert sorted((r["id"], r["balance"]) for r in accounts.rows) == [(1, 0), (2, 75), (3, 10)]
+    db.rollback(txn)
+    assert sorted((r["id"], r["balance"]) for r in accounts.rows) == [(1, 100), (2, 50)]
+    assert accounts.lookup("id", 3) == [] and accounts.get(accounts.lookup("id", 2)[0])["balance"] == 50
+    try:
+        accounts.insert({"id": 2, "balance": 1})
+        assert False, "PK index not restored"
+    except ValueError:
+        pass
+
+    print("Testing commit costs one log write and fsync...")
+    writes, syncs = db.wal.writes, db.wal.syncs
+    txn = db.begin()
+    txn.touch(accounts)
+    for i in range(10, 110):
+        accounts.insert({"id": i, "balance": i})
+    accounts.update({"balance": 500}, lambda r: r["id"] == 1)
+    db.commit(txn)
+    assert (db.wal.writes, db.wal.syncs) == (writes + 1, syncs + 1)
+
+    print("Testing that an uncommitted transaction is lost on restart...")
+    txn = db.begin()
+    txn.touch(accounts)
+    accounts.insert({"id": 999, "balance": 1})
+    db.wal.flush()  # its records never reach the log before commit
+    db2 = Database("test_db_txn")
+    accounts2 = db2.get_table("accounts")
+    assert len(accounts2) == 102
+    assert accounts2.get(accounts2.lookup("id", 1)[0])["balance"] == 500
+    assert accounts2.lookup("id", 999) == []
+    db.rollback(txn)
+    print("Transaction tests passed!")
+
+def test_compact_rows():
+    if os.path.exists("test_db_records"):
+        shutil.rmtree("test_db_records")
+
+    db = Database("test_db_records")
+    db.create_table("items", [Column("id", "int", is_primary_key=True), Column("name", "str"), Column("qty", "int")])
+    table = db.get_table("items")
+    table.insert_many([{"id": i, "name": f"item{i}", "qty": i * 10} for i in range(5)])
+    table.insert({"qty": "7", "id": 5})
+
+    print("Verifying rows are stored as records in column order...")
+    assert table.names == ("id", "name", "qty")
+    assert table.slots[5] == (5, None, 7)
+    assert table.get(5) == {"id": 5, "name": None, "qty": 7}
+    assert table.rows[1] == {"id": 1, "name": "item1", "qty": 10}
+    assert table.getter("qty")(table.slots[2]) == 20 and table.getter("missing")(table.slots[2]) is None
+    assert [r["id"] for r in table.scan(record_filter=lambda rec: rec[2] >= 30)] == [3, 4]
+
+    print("Verifying updates replace records and keep indexes in step...")
+    table.update({"id": 50, "qty": 1}, lambda r: r["id"] == 5)
+    assert table.slots[5] == (50, None, 1)
+    assert table.lookup("id", 50) == [5] and 5 not in table.indexes["id"]
+    txn = db.begin()
+    txn.touch(table)
+    table.update({"id": 60}, lambda r: r["id"] == 50)
+    table.delete(lambda r: r["qty"] < 20)
+    db.rollback(txn)
+    assert table.slots[5] == (50, None, 1) and table.lookup("id", 50) == [5]
+    assert 60 not in table.indexes["id"] and len(table) == 6
+    db.save_table("items")
+
+    print("Verifying replay of records and of dict rows from older logs...")
+    with open(os.path.join("test_db_records", "wal.log"), "a") as f:
+        f.write(json.dumps({"table": "items", "op": "insert", "row": {"id": 70, "name": "old"}, "lsn": 1000}) + "\n")
+        f.write(json.dumps({"table": "items", "op": "insert_many", "values": [{"id": 71}, {"id": 72, "qty": 3}], "lsn": 1001}) + "\n")
+    db2 = Database("test_db_records")
+    items = db2.get_table("items")
+    assert items.get(items.lookup("id", 50)[0]) == {"id": 50, "name": None, "qty": 1}
+    assert items.get(items.lookup("id", 70)[0]) == {"id": 70, "name": "old", "qty": None}
+    assert items.slots[items.lookup("id", 72)[0]] == (72, None, 3)
+    assert len(items) == 9
+    print("Compact row tests passed!")
+
+def test_checkpoints():
+    if os.path.exists("test_db_checkpoint"):
+        shutil.rmtree("test_db_checkpoint")
+    path = lambda f: os.path.join("test_db_checkpoint", f)
+
+    db = Database("test_db_checkpoint")
+    db.create_table("orders", [Column("id", "int", is_primary_key=True), Column("status", "str")])
+    orders = db.get_table("orders")
+    orders.insert_many([{"id": i, "status": "new"} for i in range(200)])
+    db.save_all()
+    with open(path("MANIFEST")) as f:
+        manifest = json.load(f)
+    assert manifest["tables"]["orders"] == {"file": "orders.json", "delta": None, "delta_bytes": 0, "delta_rows": 0}
+    assert not [f for f in os.listdir("test_db_checkpoint") if f.endswith(".tmp")]
+
+    print("Verifying small changes go to a delta, not a new image...")
+    orders.update({"status": "paid"}, lambda r: r["id"] == 3)
+    orders.delete(lambda r: r["id"] == 4)
+    orders.insert({"id": 500, "status": "new"})
+    db.save_all()
+    with open(path("orders.json")) as f:
+        assert len(json.load(f)["rows"]) == 200
+    with open(path("MANIFEST")) as f:
+        entry = json.load(f)["tables"]["orders"]
+    assert entry["delta"] == "orders.delta" and entry["delta_rows"] == 3
+    orders.insert({"id": 501, "status": "new"})
+    db.save_table("orders")
+
+    print("Verifying recovery ignores an unfinished checkpoint...")
+    with open(path("orders.delta"), "a") as f:
+        f.write('{"table":"orders","op":"delete","rows":[0,1')
+    with open(path("orders.json.tmp"), "w") as f:
+        f.write('{"name": "orders", "col')
+    db2 = Database("test_db_checkpoint")
+    orders2 = db2.get_table("orders")
+    assert len(orders2) == 201 and orders2.get(orders2.lookup("id", 3)[0])["status"] == "paid"
+    assert orders2.lookup("id", 4) == [] and orders2.lookup("id", 501) != []
+    # The delta and the log tail, not the whole table
+    assert db2.load_report["orders"]["replayed"] == 4
+
+    print("Verifying large changes rewrite the image and drop the delta...")
+    orders2.update({"status": "shipped"}, lambda r: r["id"] < 100)
+    db2.save_all()
+    assert not os.path.exists(path("orders.delta"))
+    with open(path("orders.json")) as f:
+        assert sum(r["status"] == "shipped" for r in json.load(f)["rows"]) == 99
+    db3 = Database("test_db_checkpoint")
+    assert len(db3.get_table("orders")) == 201 and db3.load_report["orders"]["replayed"] == 0
+
+    print("Verifying directories without a manifest are still read...")
+    os.remove(path("MANIFEST"))
+    db4 = Database("test_db_checkpoint")
+    assert db4.table_names() == ["orders"] and len(db4.get_table("orders")) == 201
+    print("Checkpoint tests passed!")
+
 if __name__ == "__main__":
     test_core()
+    test_wal_replay()
+    test_paged_storage()
+    test_lazy_loading()
+    test_row_ids_and_vacuum()
+    test_group_commit()
+    test_transactions()
+    test_compact_rows()
+    test_checkpoints()
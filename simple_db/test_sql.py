@@ -1,6 +1,9 @@
+import json
 import os
 import shutil
 from core.database import Database
+from core.parallel import Parallelism
+from core.statistics import analyze
 from sql.executor import SQLExecutor
 
 def test_sql():
@@ -61,5 +64,1024 @@ def test_sql():
 
     print("SQL Tests Passed!")
 
+def test_explain():
+    if os.path.exists("test_db_plan"):
+        shutil.rmtree("test_db_plan")
+
+    db = Database("test_db_plan")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE users (id int PK, name str, email str UNIQUE)")
+    for i in range(50):
+        executor.execute(f"INSERT INTO users (id, name, email) VALUES ({i}, 'user{i}', 'u{i}@example.com')")
+
+    print("Testing EXPLAIN picks the PK index...")
+    res = executor.execute("EXPLAIN SELECT name FROM users WHERE id = 5")
+    print(res)
+    assert "INDEX LOOKUP users USING id" in res
+
+    res = executor.execute("EXPLAIN DELETE FROM users WHERE email = 'u7@example.com'")
+    assert "INDEX LOOKUP users USING email" in res
+
+    res = executor.execute("EXPLAIN SELECT name FROM users WHERE name = 'user5'")
+    assert "FULL SCAN users" in res
+
+    print("Testing index lookups return the same rows as a scan...")
+    assert "user5" in executor.execute("SELECT name FROM users WHERE id = 5")
+    assert executor.execute("SELECT name FROM users WHERE id = 500") == "Empty set"
+    assert "1 rows updated" in executor.execute("UPDATE users SET name='five' WHERE id=5")
+    assert "five" in executor.execute("SELECT name FROM users WHERE name = 'five'")
+    assert "1 rows deleted" in executor.execute("DELETE FROM users WHERE email = 'u7@example.com'")
+    assert executor.execute("SELECT name FROM users WHERE id = 7") == "Empty set"
+    assert executor.execute("VACUUM users") == "1 rows reclaimed."
+    assert "user8" in executor.execute("SELECT name FROM users WHERE id = 8")
+    print("EXPLAIN tests passed!")
+
+def test_secondary_index():
+    if os.path.exists("test_db_index"):
+        shutil.rmtree("test_db_index")
+
+    db = Database("test_db_index")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE posts (id int PK, user_id int, title str)")
+    for i in range(30):
+        executor.execute(f"INSERT INTO posts (id, user_id, title) VALUES ({i}, {i % 3}, 'post{i}')")
+
+    print("Testing CREATE INDEX...")
+    res = executor.execute("CREATE INDEX idx_posts_user ON posts (user_id)")
+    print(res)
+    assert "created" in res
+    assert "Error" in executor.execute("CREATE INDEX idx_posts_user ON posts (title)")
+    assert "USING idx_posts_user" in executor.execute("EXPLAIN SELECT title FROM posts WHERE user_id = 1")
+    assert executor.execute("SELECT id FROM posts WHERE user_id = 1").count("\n") == 10
+
+    print("Testing index maintenance...")
+    executor.execute("INSERT INTO posts (id, user_id, title) VALUES (100, 1, 'new')")
+    executor.execute("UPDATE posts SET user_id=2 WHERE id=1")
+    executor.execute("DELETE FROM posts WHERE id=4")
+    res = executor.execute("SELECT id FROM posts WHERE user_id = 1")
+    assert res.count("\n") == 9
+    assert "100" in res
+    posts = db.get_table("posts")
+    assert sorted(posts.get(rid)["id"] for rid in posts.lookup("idx_posts_user", 2)) == \
+        sorted(row["id"] for row in posts.rows if row["user_id"] == 2)
+
+    print("Testing index persistence...")
+    db2 = Database("test_db_index")
+    assert "USING idx_posts_user" in SQLExecutor(db2).execute("EXPLAIN SELECT id FROM posts WHERE user_id = 1")
+    db2.save_all()
+    db3 = Database("test_db_index")
+    executor3 = SQLExecutor(db3)
+    assert executor3.execute("SELECT id FROM posts WHERE user_id = 1").count("\n") == 9
+
+    print("Testing DROP INDEX...")
+    assert "dropped" in executor3.execute("DROP INDEX idx_posts_user")
+    assert "FULL SCAN" in executor3.execute("EXPLAIN SELECT id FROM posts WHERE user_id = 1")
+    assert "Error" in executor3.execute("DROP INDEX idx_posts_user ON posts")
+    print("Secondary index tests passed!")
+
+def test_ordered_index():
+    if os.path.exists("test_db_ordered"):
+        shutil.rmtree("test_db_ordered")
+
+    db = Database("test_db_ordered")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE events (id int PK, ts int, kind str)")
+    for i in range(100):
+        executor.execute(f"INSERT INTO events (id, ts, kind) VALUES ({i}, {(i * 37) % 100}, 'k{i % 4}')")
+
+    print("Testing range predicates without an ordered index...")
+    res = executor.execute("SELECT id FROM events WHERE ts >= 10 AND ts < 20")
+    assert res.count("\n") == 10
+    assert "FULL SCAN" in executor.execute("EXPLAIN SELECT id FROM events WHERE ts >= 10 AND ts < 20")
+    assert executor.execute("SELECT ts FROM events ORDER BY ts DESC LIMIT 2").split("\n")[1:] == ["99", "98"]
+
+    print("Testing CREATE INDEX ... USING SORTED...")
+    assert "created" in executor.execute("CREATE INDEX idx_events_ts ON events (ts) USING SORTED")
+    plan = executor.execute("EXPLAIN SELECT id FROM events WHERE ts >= 10 AND ts < 20")
+    print(plan)
+    assert "INDEX RANGE SCAN events USING idx_events_ts (10 <= ts < 20)" in plan
+    res = executor.execute("SELECT ts FROM events WHERE ts BETWEEN 10 AND 19")
+    assert res.split("\n")[1:] == [str(v) for v in range(10, 20)]
+    res = executor.execute("SELECT ts FROM events WHERE ts > 95 ORDER BY ts DESC")
+    assert res.split("\n")[1:] == ["99", "98", "97", "96"]
+    # Keys that cannot be ordered with the others leave the index unchanged
+    index = db.get_table("events").indexes["idx_events_ts"]
+    for bad in (lambda: index.add("x", 500), lambda: index.build([(500, 1), (501, "x")])):
+        try:
+            bad()
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    assert len(index.keys) == 100 and 500 not in index.lookup(1) and "x" not in index
+
+    print("Testing ORDER BY ... LIMIT from the index...")
+    plan = executor.execute("EXPLAIN SELECT id FROM events ORDER BY ts LIMIT 3")
+    assert "INDEX ORDER SCAN" in plan and "SORT" not in plan
+    assert executor.execute("SELECT ts FROM events ORDER BY ts LIMIT 3").split("\n")[1:] == ["0", "1", "2"]
+    assert "SORT BY kind" in executor.execute("EXPLAIN SELECT id FROM events ORDER BY kind")
+
+    print("Testing ordered index maintenance...")
+    executor.execute("UPDATE events SET ts=500 WHERE id=0")
+    executor.execute("DELETE FROM events WHERE ts = 99")
+    executor.execute("INSERT INTO events (id, ts, kind) VALUES (200, -5, 'k0')")
+    table = db.get_table("events")
+    index = table.indexes["idx_events_ts"]
+    assert index.min() == -5 and index.max() == 500
+    assert executor.execute("SELECT ts FROM events ORDER BY ts DESC LIMIT 2").split("\n")[1:] == ["500", "98"]
+    # SET values are coerced and checked like inserted ones
+    assert "Column ts expects int" in executor.execute("UPDATE events SET ts='zz' WHERE id=1")
+    assert "cannot be null" in executor.execute("UPDATE events SET id=NULL WHERE id=1")
+    executor.execute("UPDATE events SET ts='7' WHERE id=1")
+    assert table.get(table.lookup("id", 1)[0])["ts"] == 7 and 1 in index.lookup(7)
+    # A value an index refuses leaves the rows and indexes as they were
+    rids = table.lookup("id", 2) + table.lookup("id", 3)
+    try:
+        table._update_rids(rids, {"ts": "zz"})
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert [table.get(rid)["ts"] for rid in rids] == [74, 11] and "zz" not in index
+    assert executor.execute("SELECT id FROM events WHERE ts = 74").split("\n")[1:] == ["2"]
+    print("Ordered index tests passed!")
+
+def test_join_strategies():
+    if os.path.exists("test_db_join"):
+        shutil.rmtree("test_db_join")
+
+    db = Database("test_db_join")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE users (id int PK, name str)")
+    executor.execute("CREATE TABLE posts (id int PK, user_id int, title str)")
+    for i in range(20):
+        executor.execute(f"INSERT INTO users (id, name) VALUES ({i}, 'user{i}')")
+    for i in range(60):
+        executor.execute(f"INSERT INTO posts (id, user_id, title) VALUES ({i}, {i % 25}, 'post{i}')")
+    query = "SELECT users.name, posts.title FROM users JOIN posts ON users.id = posts.user_id"
+
+    def result_set(res):
+        return sorted(res.split("\n")[1:])
+
+    print("Testing hash join...")
+    plan = executor.execute("EXPLAIN " + query)
+    print(plan)
+    assert "HASH JOIN posts" in plan
+    expected = result_set(executor.execute(query))
+    assert len(expected) == 50
+    assert "user3\tpost53" in expected
+
+    print("Testing join with the ON sides swapped...")
+    assert result_set(executor.execute(query.replace("users.id = posts.user_id", "posts.user_id = users.id"))) == expected
+
+    print("Testing index nested loop join...")
+    executor.execute("CREATE INDEX idx_posts_user ON posts (user_id)")
+    assert "INDEX NESTED LOOP JOIN posts" in executor.execute("EXPLAIN " + query)
+    assert result_set(executor.execute(query)) == expected
+    executor.execute("DROP INDEX idx_posts_user")
+
+    print("Testing merge join...")
+    executor.execute("CREATE INDEX idx_posts_user ON posts (user_id) USING SORTED")
+    executor.execute("CREATE INDEX idx_users_id ON users (id) USING SORTED")
+    assert "MERGE JOIN posts" in executor.execute("EXPLAIN " + query)
+    assert result_set(executor.execute(query)) == expected
+
+    print("Testing WHERE on both sides of a join...")
+    res = executor.execute(query + " WHERE users.id = 3 AND posts.title = 'post28'")
+    assert res.split("\n")[1:] == ["user3\tpost28"]
+    res = executor.execute(query + " WHERE users.name = 'user3' OR posts.title = 'post10'")
+    assert result_set(res) == ["user10\tpost10", "user3\tpost28", "user3\tpost3", "user3\tpost53"]
+    assert "FILTER name = 'x' OR posts.id = 1" in executor.execute("EXPLAIN " + query + " WHERE users.name = 'x' OR posts.id = 1")
+    print("Join strategy tests passed!")
+
+def test_parser_and_prepared():
+    if os.path.exists("test_db_prepared"):
+        shutil.rmtree("test_db_prepared")
+
+    db = Database("test_db_prepared")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE notes (id int PK, body str, score int)")
+
+    print("Testing literals containing commas, equals signs and quotes...")
+    assert "inserted" in executor.execute("INSERT INTO notes (id, body, score) VALUES (1, 'a, b = c', 5)")
+    assert "inserted" in executor.execute("INSERT INTO notes (id, body, score) VALUES (2, 'it''s', -3)")
+    assert executor.execute("SELECT body FROM notes WHERE body = 'a, b = c'").split("\n")[1:] == ["a, b = c"]
+    executor.execute("UPDATE notes SET body = 'x=1, y=2' WHERE id = 1")
+    assert executor.execute("SELECT body FROM notes WHERE id = 1").split("\n")[1:] == ["x=1, y=2"]
+    assert executor.execute("SELECT score FROM notes WHERE body = 'it''s'").split("\n")[1:] == ["-3"]
+
+    print("Testing OR, NOT, IN and IS NULL...")
+    executor.execute("INSERT INTO notes (id, body) VALUES (3, 'empty')")
+    res = executor.execute("SELECT id FROM notes WHERE (id = 1 OR score < 0) AND NOT id IN (3, 4)")
+    assert sorted(res.split("\n")[1:]) == ["1", "2"]
+    assert executor.execute("SELECT id FROM notes WHERE score IS NULL").split("\n")[1:] == ["3"]
+    assert executor.execute("SELECT id FROM notes WHERE id NOT BETWEEN 1 AND 2").split("\n")[1:] == ["3"]
+    assert executor.execute("SELECT id FROM notes WHERE").startswith("Syntax Error")
+
+    print("Testing prepared statements...")
+    insert = executor.prepare("INSERT INTO notes (id, body, score) VALUES (?, ?, ?)")
+    assert insert.param_count == 3
+    for i in range(10, 15):
+        assert insert.execute((i, f"it's note {i}, ok", i * 2)) == "1 row inserted."
+    select = executor.prepare("SELECT body FROM notes WHERE id = ?")
+    assert select.execute((12,)).split("\n")[1:] == ["it's note 12, ok"]
+    assert executor.execute("SELECT id FROM notes WHERE score > ? LIMIT ?", (20, 1)).split("\n")[1:] == ["11"]
+    assert "INDEX LOOKUP" in executor.execute("EXPLAIN SELECT * FROM notes WHERE id = ?", (12,))
+    # Bound LIMIT/OFFSET values are checked like written ones
+    limited = executor.prepare("SELECT id FROM notes LIMIT ? OFFSET ?")
+    assert limited.execute((-1, 0)) == "Error: LIMIT expects a non-negative integer"
+    assert limited.execute((1, "x")) == "Error: OFFSET expects a non-negative integer"
+    assert limited.execute((1, 1)).split("\n")[1:] == ["2"]
+    assert select.execute(()).startswith("Error: Expected 1 parameters")
+
+    print("Testing the parse cache...")
+    hits = executor.parser.cache_hits
+    for i in range(3):
+        executor.execute("SELECT id FROM notes WHERE id = 1")
+    assert executor.parser.cache_hits == hits + 2
+    print("Parser tests passed!")
+
+def test_compiled_predicates():
+    from sql.parser import SQLParser
+    from sql.predicates import compile_condition
+
+    parser = SQLParser()
+    rows = [{"id": 1, "v": 5}, {"id": 2, "v": None}, {"id": 3, "v": 9}, {"id": 4}]
+
+    def ids(where):
+        pred = compile_condition(parser.parse("SELECT * FROM t WHERE " + where)["where"])
+        return [r["id"] for r in rows if pred(r)]
+
+    print("Testing compiled predicates...")
+    assert ids("v = 5 OR v > 8") == [1, 3]
+    assert ids("NOT v = 5") == [3]  # NULL stays unknown under NOT
+    assert ids("NOT (v < 6 OR id = 3)") == []
+    assert ids("v IN (9, NULL)") == [3]
+    assert ids("v NOT IN (5, NULL)") == []
+    assert ids("v IS NULL") == [2, 4]
+    assert ids("NOT v IS NULL AND v BETWEEN 1 AND 6") == [1]
+    assert ids("v = NULL") == []
+    print("Compiled predicate tests passed!")
+
+def test_bulk_insert():
+    if os.path.exists("test_db_bulk"):
+        shutil.rmtree("test_db_bulk")
+
+    db = Database("test_db_bulk")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE items (id int PK, name str, qty int)")
+    executor.execute("CREATE INDEX idx_items_qty ON items (qty) USING SORTED")
+
+    print("Testing multi-row VALUES...")
+    res = executor.execute("INSERT INTO items (id, name, qty) VALUES (1, 'a', 5), (2, 'b, c', 3), (3, 'd', 9)")
+    assert res == "3 rows inserted."
+
+    print("Testing that a failing batch inserts nothing...")
+    res = executor.execute("INSERT INTO items (id, name, qty) VALUES (4, 'e', 1), (4, 'f', 2)")
+    assert res.startswith("Error: Duplicate value '4'")
+    res = executor.execute("INSERT INTO items (id, name, qty) VALUES (5, 'g', 1), (2, 'h', 2)")
+    assert res.startswith("Error: Duplicate value '2'")
+    assert len(db.get_table("items")) == 3
+
+    print("Testing executemany...")
+    res = executor.executemany("INSERT INTO items (id, name, qty) VALUES (?, ?, ?)",
+                               [(i, f"item{i}", i % 7) for i in range(10, 1010)])
+    assert res == "1000 rows inserted."
+    assert executor.execute("SELECT id FROM items WHERE qty = 9").split("\n")[1:] == ["3"]
+    assert executor.execute("SELECT id FROM items WHERE qty >= 6 ORDER BY id LIMIT 2").split("\n")[1:] == ["3", "13"]
+    assert executor.executemany("INSERT INTO items (id, name, qty) VALUES (?, ?, ?)", [(1, "x")]).startswith("Error")
+
+    print("Testing replay of a batch from the log...")
+    db2 = Database("test_db_bulk")
+    assert len(db2.get_table("items")) == 1003
+    assert SQLExecutor(db2).execute("SELECT name FROM items WHERE id = 2").split("\n")[1:] == ["b, c"]
+    print("Bulk insert tests passed!")
+
+def test_cursor():
+    if os.path.exists("test_db_cursor"):
+        shutil.rmtree("test_db_cursor")
+
+    db = Database("test_db_cursor")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE big (id int PK, v int)")
+    executor.executemany("INSERT INTO big (id, v) VALUES (?, ?)", [(i, i % 10) for i in range(1000)])
+
+    class CountingSlots(list):
+        reads = 0
+
+        def __iter__(self):
+            for row in list.__iter__(self):
+                CountingSlots.reads += 1
+                yield row
+
+    table = db.get_table("big")
+    table.slots = CountingSlots(table.slots)
+
+    print("Testing that LIMIT stops the scan early...")
+    cur = executor.cursor().execute("SELECT * FROM big LIMIT 10")
+    assert cur.columns == ["id", "v"]
+    assert cur.fetchall() == [(i, i % 10) for i in range(10)]
+    assert CountingSlots.reads == 10
+
+    print("Testing fetchone, fetchmany and iteration...")
+    CountingSlots.reads = 0
+    cur = executor.cursor().execute("SELECT id FROM big WHERE v = ?", (3,))
+    assert cur.fetchone() == (3,)
+    assert cur.fetchmany(2) == [(13,), (23,)]
+    assert CountingSlots.reads == 24
+    assert [r[0] for r in cur][:2] == [33, 43]
+    assert cur.fetchone() is None and cur.rownumber == 100
+
+    print("Testing OFFSET...")
+    cur = executor.cursor().execute("SELECT id FROM big WHERE v = 0 ORDER BY id DESC LIMIT 3 OFFSET 2")
+    assert cur.fetchall() == [(970,), (960,), (950,)]
+    assert executor.execute("SELECT id FROM big LIMIT 2 OFFSET 998").split("\n")[1:] == ["998", "999"]
+    assert executor.execute("SELECT id FROM big OFFSET 999").split("\n")[1:] == ["999"]
+    assert "LIMIT 3 OFFSET 2" in executor.execute("EXPLAIN SELECT id FROM big LIMIT 3 OFFSET 2")
+
+    print("Testing non-SELECT statements and errors through a cursor...")
+    cur = executor.cursor().execute("DELETE FROM big WHERE v = 9")
+    assert cur.message == "100 rows deleted." and cur.fetchone() is None
+    try:
+        executor.cursor().execute("SELECT * FROM missing")
+        assert False, "expected an error"
+    except ValueError:
+        pass
+
+    print("Testing an automatic checkpoint while this thread has a cursor open...")
+    import threading
+    executor.execute("CREATE TABLE tail (id int PK)")
+    executor.executemany("INSERT INTO tail (id) VALUES (?)", [(1,), (2,)])
+    cur = executor.cursor().execute("SELECT id FROM tail")
+    assert cur.fetchone() == (1,)
+    db.checkpoint_interval = 1
+    # The checkpoint cannot lock tail, so it waits; the insert has committed
+    assert executor.execute("INSERT INTO big (id, v) VALUES (5000, 1)") == "1 row inserted."
+    cur.close()
+    # No lock taken by the deferred checkpoint was left behind
+    timed_out = []
+    def write_big():
+        try:
+            with db.get_table("big").lock.writing(timeout=1):
+                pass
+        except ValueError:
+            timed_out.append(True)
+    writer = threading.Thread(target=write_big)
+    writer.start()
+    writer.join()
+    assert not timed_out
+    assert executor.execute("INSERT INTO big (id, v) VALUES (5001, 1)") == "1 row inserted."
+    assert db.wal.records_since_checkpoint == 0
+    print("Cursor tests passed!")
+
+def test_aggregates():
+    if os.path.exists("test_db_agg"):
+        shutil.rmtree("test_db_agg")
+
+    db = Database("test_db_agg")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE emp (id int PK, dept str, salary int, age int)")
+    executor.executemany("INSERT INTO emp (id, dept, salary, age) VALUES (?, ?, ?, ?)", [
+        (1, "eng", 100, 30), (2, "eng", 120, 40), (3, "ops", 80, 25),
+        (4, "ops", None, 50), (5, "sales", 90, 35), (6, "eng", 110, 28)])
+
+    def rows(sql):
+        return executor.cursor().execute(sql).fetchall()
+
+    print("Testing aggregates without GROUP BY...")
+    assert rows("SELECT COUNT(*), COUNT(salary), SUM(salary), MIN(age), MAX(age) FROM emp") == [(6, 5, 500, 25, 50)]
+    assert rows("SELECT AVG(salary) FROM emp WHERE dept = 'eng'") == [(110.0,)]
+    assert rows("SELECT COUNT(*), SUM(salary) FROM emp WHERE id > 100") == [(0, None)]
+
+    print("Testing GROUP BY and HAVING...")
+    assert rows("SELECT dept, COUNT(*) FROM emp GROUP BY dept ORDER BY dept") == [("eng", 3), ("ops", 2), ("sales", 1)]
+    assert rows("SELECT dept, SUM(salary) AS total FROM emp GROUP BY dept HAVING COUNT(*) > 1 ORDER BY total DESC") == \
+        [("eng", 330), ("ops", 80)]
+    assert rows("SELECT dept FROM emp WHERE age < 45 GROUP BY dept HAVING MAX(salary) >= 90 ORDER BY dept") == \
+        [("eng",), ("sales",)]
+    assert rows("SELECT dept, COUNT(*) FROM emp GROUP BY dept ORDER BY COUNT(*) DESC LIMIT 1") == [("eng", 3)]
+    res = executor.execute("SELECT dept, COUNT(*) FROM emp GROUP BY dept ORDER BY dept")
+    assert res.split("\n")[0] == "dept\tCOUNT(*)"
+    assert executor.execute("SELECT id, COUNT(*) FROM emp").startswith("Syntax Error")
+
+    print("Testing aggregate fast paths...")
+    assert "ROW COUNT FROM METADATA emp" in executor.execute("EXPLAIN SELECT COUNT(*) FROM emp")
+    plan = executor.execute("EXPLAIN SELECT dept, COUNT(*) FROM emp GROUP BY dept HAVING COUNT(*) > 1")
+    assert "HASH AGGREGATE COUNT(*) GROUP BY dept" in plan and "HAVING COUNT(*) > 1" in plan
+    executor.execute("CREATE INDEX idx_emp_age ON emp (age) USING SORTED")
+    assert "MIN/MAX FROM INDEX emp USING idx_emp_age" in executor.execute("EXPLAIN SELECT MIN(age), MAX(age) FROM emp")
+    assert rows("SELECT MIN(age), MAX(age) FROM emp") == [(25, 50)]
+    executor.execute("DELETE FROM emp WHERE age = 50")
+    assert rows("SELECT COUNT(*), MAX(age) FROM emp") == [(5, 40)]
+    assert rows("SELECT MAX(age) FROM emp") == [(40,)]
+
+    print("Testing aggregates over a join...")
+    executor.execute("CREATE TABLE depts (name str PK, floor int)")
+    executor.execute("INSERT INTO depts (name, floor) VALUES ('eng', 3), ('ops', 1), ('sales', 1)")
+    assert rows("SELECT depts.floor, COUNT(*) FROM emp JOIN depts ON emp.dept = depts.name "
+                "GROUP BY depts.floor ORDER BY depts.floor") == [(1, 2), (3, 3)]
+    print("Aggregate tests passed!")
+
+def test_transactions():
+    if os.path.exists("test_db_sqltxn"):
+        shutil.rmtree("test_db_sqltxn")
+
+    db = Database("test_db_sqltxn")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE kv (k str PK, v int)")
+    executor.execute("INSERT INTO kv (k, v) VALUES ('a', 1), ('b', 2)")
+
+    print("Testing BEGIN ... ROLLBACK...")
+    assert executor.execute("BEGIN") == "Transaction started."
+    executor.execute("INSERT INTO kv (k, v) VALUES ('c', 3)")
+    executor.execute("UPDATE kv SET v = 10 WHERE k = 'a'")
+    executor.execute("DELETE FROM kv WHERE k = 'b'")
+    assert executor.execute("SELECT k, v FROM kv ORDER BY k").split("\n")[1:] == ["a\t10", "c\t3"]
+    assert executor.execute("CREATE INDEX idx_v ON kv (v)").startswith("Error: CREATE INDEX cannot run inside a transaction")
+    assert executor.execute("ROLLBACK") == "Transaction rolled back."
+    assert executor.execute("SELECT k, v FROM kv ORDER BY k").split("\n")[1:] == ["a\t1", "b\t2"]
+
+    print("Testing BEGIN ... COMMIT...")
+    executor.execute("BEGIN TRANSACTION")
+    executor.executemany("INSERT INTO kv (k, v) VALUES (?, ?)", [(f"k{i}", i) for i in range(50)])
+    executor.execute("UPDATE kv SET v = 20 WHERE k = 'b'")
+    assert executor.execute("COMMIT") == "Transaction committed."
+    assert executor.execute("COMMIT").startswith("Error: No transaction")
+
+    db2 = Database("test_db_sqltxn")
+    executor2 = SQLExecutor(db2)
+    assert executor2.execute("SELECT COUNT(*) FROM kv").split("\n")[1:] == ["52"]
+    assert executor2.execute("SELECT v FROM kv WHERE k = 'b'").split("\n")[1:] == ["20"]
+    print("SQL transaction tests passed!")
+
+def test_concurrency():
+    import threading
+
+    if os.path.exists("test_db_threads"):
+        shutil.rmtree("test_db_threads")
+
+    db = Database("test_db_threads", checkpoint_interval=50)
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE events (id int PK, worker int, n int)")
+    executor.execute("CREATE INDEX idx_events_worker ON events (worker) USING SORTED")
+    errors = []
+
+    def writer(w):
+        insert = executor.prepare("INSERT INTO events (id, worker, n) VALUES (?, ?, ?)")
+        for i in range(100):
+            res = insert.execute((w * 1000 + i, w, i))
+            if res != "1 row inserted.":
+                errors.append(res)
+        res = executor.execute("DELETE FROM events WHERE worker = ? AND n >= 90", (w,))
+        if res != "10 rows deleted.":
+            errors.append(res)
+        # Each thread has its own transaction on the shared executor
+        executor.execute("BEGIN")
+        executor.execute("UPDATE events SET n = -1 WHERE worker = ? AND n < 5", (w,))
+        executor.execute("ROLLBACK" if w % 2 else "COMMIT")
+
+    def reader():
+        for _ in range(50):
+            cur = executor.cursor().execute("SELECT worker, COUNT(*) FROM events GROUP BY worker")
+            for worker, count in cur:
+                if not 0 <= count <= 100:
+                    errors.append((worker, count))
+
+    print("Testing concurrent readers and writers...")
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(6)]
+    threads += [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:5]
+
+    expected = [(w, 90) for w in range(6)]
+    assert executor.cursor().execute("SELECT worker, COUNT(*) FROM events GROUP BY worker ORDER BY worker").fetchall() == expected
+    assert executor.cursor().execute("SELECT COUNT(*) FROM events WHERE n = -1").fetchall() == [(15,)]
+    assert executor.cursor().execute("SELECT COUNT(*) FROM events WHERE worker >= 0").fetchall() == [(540,)]
+
+    db2 = Database("test_db_threads")
+    executor2 = SQLExecutor(db2)
+    assert executor2.cursor().execute("SELECT COUNT(*) FROM events WHERE n = -1").fetchall() == [(15,)]
+    assert executor2.cursor().execute("SELECT COUNT(*) FROM events").fetchall() == [(540,)]
+    print("Concurrency tests passed!")
+
+def test_network_server():
+    import threading
+    from net.client import Connection, ConnectionPool
+    from net.server import QueryServer
+
+    if os.path.exists("test_db_server"):
+        shutil.rmtree("test_db_server")
+
+    db = Database("test_db_server")
+    server = QueryServer(SQLExecutor(db), port=0, batch_size=7).start_background()
+
+    print("Testing the network server...")
+    with Connection(port=server.port) as conn:
+        assert conn.execute("CREATE TABLE kv (k int PK, v str, f float)").message == "Table 'kv' created."
+        insert = conn.prepare("INSERT INTO kv (k, v, f) VALUES (?, ?, ?)")
+        assert insert.param_count == 3
+        assert insert.execute((1, "one", 1.5)).message == "1 row inserted."
+
+        # Pipelined requests are answered in order; an error does not stop the rest
+        pipe = conn.pipeline()
+        for k in range(2, 21):
+            pipe.execute_prepared(insert, (k, f"v{k}", None))
+        pipe.execute("INSERT INTO kv (k, v, f) VALUES (1, 'dup', 0.0)")
+        pipe.execute("SELECT COUNT(*) FROM kv")
+        results = pipe.run()
+        assert all(r.message == "1 row inserted." for r in results[:19])
+        assert isinstance(results[19], ValueError)
+        assert results[20].rows == [(20,)]
+
+        # Results larger than a batch arrive in several ROWS frames
+        res = conn.execute("SELECT k, v, f FROM kv WHERE k <= ? ORDER BY k", (15,))
+        assert res.columns == ["k", "v", "f"]
+        assert len(res) == 15
+        assert res.rows[0] == (1, "one", 1.5) and res.rows[14] == (15, "v15", None)
+
+        try:
+            conn.execute("SELEC 1")
+            assert False, "expected a syntax error"
+        except ValueError:
+            pass
+        assert conn.execute("SELECT v FROM kv WHERE k = 2").rows == [("v2",)]
+
+        # A transaction left open by a closed connection is rolled back
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM kv WHERE k > 10")
+
+    pool = ConnectionPool(port=server.port, size=3)
+    errors = []
+
+    def worker(w):
+        try:
+            for i in range(20):
+                pool.execute("INSERT INTO kv (k, v, f) VALUES (?, ?, ?)", (100 + w * 100 + i, "p", float(w)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+    assert pool.execute("SELECT COUNT(*) FROM kv").rows == [(140,)]
+
+    # A block that raises does not hand its open transaction to the next caller
+    try:
+        with pool.connection() as failed:
+            failed.execute("BEGIN")
+            failed.execute("DELETE FROM kv")
+            raise RuntimeError("client failure")
+    except RuntimeError:
+        pass
+    assert failed.closed
+    with pool.connection() as conn:
+        assert conn is not failed
+        assert conn.execute("SELECT COUNT(*) FROM kv").rows == [(140,)]
+    pool.close()
+
+    server.stop()
+    db.close()
+    print("Network server tests passed!")
+
+def test_result_cache():
+    if os.path.exists("test_db_rcache"):
+        shutil.rmtree("test_db_rcache")
+
+    db = Database("test_db_rcache")
+    executor = SQLExecutor(db, result_cache_bytes=64 * 1024)
+    cache = executor.result_cache
+    executor.execute("CREATE TABLE tasks (id int PK, content str, done bool)")
+    executor.execute("CREATE TABLE tags (task int, tag str)")
+    executor.executemany("INSERT INTO tasks (id, content, done) VALUES (?, ?, ?)",
+                         [(i, f"task {i}", i % 2 == 0) for i in range(20)])
+    executor.execute("INSERT INTO tags (task, tag) VALUES (1, 'home')")
+
+    print("Testing the result cache...")
+    query = "SELECT id, content FROM tasks WHERE done = ? ORDER BY id"
+    first = executor.execute(query, (True,))
+    assert cache.stats()["misses"] == 1 and len(cache) == 1
+    # Same statement and parameters, spelled differently: served from the cache
+    assert executor.execute("select id, content from tasks where done = ?  order by id", (True,)) == first
+    assert cache.hits == 1
+    # Different parameters are a different entry
+    executor.execute(query, (False,))
+    assert cache.misses == 2 and len(cache) == 2
+
+    # A write invalidates exactly the results that read the table
+    joined = "SELECT tasks.content, tags.tag FROM tasks JOIN tags ON tasks.id = tags.task"
+    assert executor.cursor().execute(joined).fetchall() == [("task 1", "home")]
+    executor.execute("SELECT COUNT(*) FROM tags")
+    executor.execute("UPDATE tasks SET done = TRUE WHERE id = 3")
+    assert executor.execute("SELECT COUNT(*) FROM tags") == "COUNT(*)\n1"
+    assert cache.hits == 2
+    assert "task 3" in executor.execute(query, (True,))
+    assert cache.invalidations == 1
+    executor.execute("DELETE FROM tags WHERE task = 1")
+    assert executor.cursor().execute(joined).fetchall() == []
+    executor.execute("INSERT INTO tasks (id, content, done) VALUES (99, 'new', TRUE)")
+    assert "new" in executor.execute(query, (True,))
+
+    # Rolled back changes never reach the cache, and rollback invalidates
+    before = executor.execute(query, (True,))
+    executor.execute("BEGIN")
+    executor.execute("DELETE FROM tasks WHERE done = TRUE")
+    assert executor.execute(query, (True,)) == "Empty set"
+    executor.execute("ROLLBACK")
+    assert executor.execute(query, (True,)) == before
+
+    # Dropping and recreating a table does not resurrect old results
+    db.drop_table("tags")
+    executor.execute("CREATE TABLE tags (task int, tag str)")
+    assert executor.execute("SELECT COUNT(*) FROM tags") == "COUNT(*)\n0"
+
+    # A cursor closed early does not cache a partial result
+    entries = len(cache)
+    cur = executor.cursor().execute("SELECT id FROM tasks WHERE id >= 0")
+    cur.fetchone()
+    cur.close()
+    assert len(cache) == entries
+
+    # Memory stays within the bound; least recently used results go first
+    for i in range(200):
+        executor.execute("SELECT * FROM tasks WHERE id != ?", (i,))
+    stats = cache.stats()
+    assert stats["bytes"] <= stats["max_bytes"] and stats["evictions"] > 0
+    print("Result cache tests passed!")
+
+def test_columnar():
+    if os.path.exists("test_db_columnar"):
+        shutil.rmtree("test_db_columnar")
+
+    db = Database("test_db_columnar")
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE rows_t (id int PK, qty int, price float, city str, paid bool)")
+    executor.execute("CREATE TABLE cols_t (id int PK, qty int, price float, city str, paid bool) USING columnar")
+    data = [(i, None if i % 7 == 0 else i % 10, i * 0.5, [None, "nairobi", "kisumu", "mombasa"][i % 4], i % 3 == 0)
+            for i in range(400)]
+    for name in ("rows_t", "cols_t"):
+        executor.executemany(f"INSERT INTO {name} (id, qty, price, city, paid) VALUES (?, ?, ?, ?, ?)", data)
+        executor.execute(f"DELETE FROM {name} WHERE id BETWEEN 10 AND 19")
+        executor.execute(f"UPDATE {name} SET city = 'eldoret' WHERE qty = 3 AND price > 50")
+
+    print("Testing columnar tables...")
+    plan = executor.execute("EXPLAIN SELECT city, SUM(price) FROM cols_t WHERE qty > 4 GROUP BY city")
+    assert "VECTORIZED SCAN cols_t WHERE qty > 4" in plan
+    assert "VECTORIZED HASH AGGREGATE" in plan
+    # Predicates that cannot become masks stay a row filter
+    plan = executor.execute("EXPLAIN SELECT * FROM cols_t WHERE qty > 4 AND city = 5")
+    assert "VECTORIZED SCAN cols_t WHERE qty > 4" in plan and "FILTER city = 5" in plan
+    assert "FULL SCAN rows_t" in executor.execute("EXPLAIN SELECT * FROM rows_t WHERE qty > 4")
+
+    # Same answers as the row layout, NULLs and deleted rows included
+    queries = [
+        "SELECT * FROM {} WHERE qty > 4 AND city != 'kisumu'",
+        "SELECT id FROM {} WHERE NOT (qty < 5 OR city IN ('nairobi', NULL))",
+        "SELECT id FROM {} WHERE qty NOT IN (1, 2) AND price BETWEEN 10 AND 150.5",
+        "SELECT id FROM {} WHERE city IS NULL OR qty IS NULL ORDER BY id DESC LIMIT 5",
+        "SELECT COUNT(*), COUNT(qty), SUM(qty), AVG(price), MIN(city), MAX(paid) FROM {} WHERE paid = TRUE",
+        "SELECT city, paid, COUNT(*), SUM(price), MIN(qty), MAX(city) FROM {} GROUP BY city, paid",
+        "SELECT city, COUNT(*) AS n FROM {} WHERE qty >= 5 GROUP BY city HAVING n > 30 ORDER BY n DESC",
+        "SELECT SUM(qty) FROM {} WHERE qty > 100",
+    ]
+    for query in queries:
+        assert executor.execute(query.format("cols_t")) == executor.execute(query.format("rows_t")), query
+
+    # Sums past 64 bits are exact, as in the row engine
+    for name, layout in (("big_rows", ""), ("big_cols", " USING columnar")):
+        executor.execute(f"CREATE TABLE {name} (id int PK, g int, v int){layout}")
+        executor.executemany(f"INSERT INTO {name} (id, g, v) VALUES (?, ?, ?)",
+                             [(i, i % 2, 2**62 + i) for i in range(6)])
+    assert "VECTORIZED HASH AGGREGATE" in executor.execute("EXPLAIN SELECT g, SUM(v) FROM big_cols GROUP BY g")
+    for query in ("SELECT SUM(v), AVG(v) FROM {}", "SELECT g, SUM(v) FROM {} GROUP BY g"):
+        assert executor.execute(query.format("big_cols")) == executor.execute(query.format("big_rows")), query
+    assert executor.execute("SELECT SUM(v) FROM big_cols").split("\n")[1:] == [str(6 * 2**62 + 15)]
+
+    # Writes through a vectorized scan, rolled back
+    executor.execute("BEGIN")
+    assert executor.execute("DELETE FROM cols_t WHERE qty = 5") == "33 rows deleted."
+    executor.execute("UPDATE cols_t SET qty = 50 WHERE city = 'mombasa'")
+    executor.execute("ROLLBACK")
+    for query in queries:
+        assert executor.execute(query.format("cols_t")) == executor.execute(query.format("rows_t")), query
+
+    # Persisted and reloaded as columnar, typed columns intact
+    executor.execute("UPDATE cols_t SET qty = 123456789012 WHERE id = 1")
+    db.checkpoint()
+    reloaded = Database("test_db_columnar")
+    table = reloaded.get_table("cols_t")
+    assert table.layout == "columnar" and table.get(1)["qty"] == 123456789012
+    assert type(table.slots.vector("price")).__name__ == "NumericVector"
+    assert type(table.slots.vector("city")).__name__ == "DictionaryVector"
+    assert SQLExecutor(reloaded).execute("SELECT COUNT(*) FROM cols_t WHERE city = 'eldoret'") == \
+        executor.execute("SELECT COUNT(*) FROM rows_t WHERE city = 'eldoret'")
+    print("Columnar tests passed!")
+
+def test_parallel_scan():
+    # A low threshold so the small tables here are split over three processes
+    results = []
+    for name, options in (("test_db_serial", {}), ("test_db_parallel", {"parallel_workers": 3, "parallel_min_rows": 10})):
+        if os.path.exists(name):
+            shutil.rmtree(name)
+        db = Database(name, **options)
+        executor = SQLExecutor(db)
+        executor.execute("CREATE TABLE orders (id int PK, customer int, amount float, status str)")
+        executor.execute("CREATE TABLE customers (cid int, name str)")
+        executor.executemany("INSERT INTO orders (id, customer, amount, status) VALUES (?, ?, ?, ?)",
+                             [(i, i % 13, i * 0.25, [None, "open", "paid"][i % 3]) for i in range(600)])
+        executor.executemany("INSERT INTO customers (cid, name) VALUES (?, ?)", [(i % 10, f"c{i}") for i in range(15)])
+        executor.execute("DELETE FROM orders WHERE id < 25")
+        queries = [
+            "SELECT * FROM orders WHERE amount > 40 AND status = 'open'",
+            "SELECT id FROM orders WHERE customer = 3 ORDER BY amount DESC LIMIT 5",
+            "SELECT status, COUNT(*), SUM(amount), AVG(customer), MIN(id), MAX(status) FROM orders "
+            "WHERE customer > 2 GROUP BY status",
+            "SELECT COUNT(*), SUM(amount) FROM orders WHERE status IS NULL",
+            "SELECT orders.id, customers.name FROM orders JOIN customers ON orders.customer = customers.cid "
+            "WHERE orders.amount < 60",
+            "UPDATE orders SET status = 'void' WHERE customer = 7",
+            "SELECT customer, COUNT(*) FROM orders WHERE status = 'void' GROUP BY customer",
+            "DELETE FROM orders WHERE amount > 120",
+            "SELECT COUNT(*) FROM orders",
+        ]
+        results.append([executor.execute(q) for q in queries] +
+                        [db.get_table("orders").select(lambda r: r["customer"] == 9)])
+        db.close()
+
+    print("Testing parallel scans...")
+    assert Parallelism(3, 10).ranges(100)[-1] == (99, 100) and Parallelism(3, 200).applies(100) is False
+    assert Parallelism(2, 10).map(lambda start, stop: stop - start, 100) == [13] * 7 + [9]
+    # Same rows in the same order as the serial run
+    for serial, parallel in zip(*results):
+        assert serial == parallel
+    print("Parallel scan tests passed!")
+
+def test_benchmark():
+    import benchmark
+
+    print("Testing the benchmark harness...")
+    report = benchmark.run_benchmarks(["300"], ["point_lookup", "join", "parse", "delete_by_key"], repeat=2)
+    names = [(r["name"], r["scale"]) for r in report["results"]]
+    assert names == [("point_lookup", "300"), ("join", "300"), ("parse", "-"), ("delete_by_key", "300")]
+    assert all(len(r["seconds"]) == 2 and r["best"] <= r["median"] for r in report["results"])
+    # Synthetic data is the same for the same seed
+    rng_a, rng_b = benchmark.random.Random(7), benchmark.random.Random(7)
+    assert benchmark.user_rows(50, rng_a) == benchmark.user_rows(50, rng_b)
+
+    # Half the speed of the baseline is a regression, twice the speed an improvement
+    baseline = {"results": [dict(r, best=r["best"] / 2) if r["name"] == "join" else
+                            dict(r, best=r["best"] * 2) if r["name"] == "parse" else r
+                            for r in report["results"]]}
+    status = {c["name"]: c["status"] for c in benchmark.compare(report, baseline)}
+    assert status == {"point_lookup": "same", "join": "regression", "parse": "improvement",
+                      "delete_by_key": "same"}
+    assert benchmark.main(["--scales", "2x"]) == 2
+    print("Benchmark harness tests passed!")
+
+def test_instrumentation():
+    path = "test_db_instrument"
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    db = Database(path)
+    executor = SQLExecutor(db, metrics=True, slow_query_log=os.path.join(path, "slow.log"), slow_query_ms=0)
+    executor.execute("CREATE TABLE users (id int PK, name str)")
+    executor.execute("CREATE TABLE posts (id int PK, user_id int, title str)")
+    executor.executemany("INSERT INTO users (id, name) VALUES (?, ?)", [(i, f"user{i}") for i in range(20)])
+    executor.executemany("INSERT INTO posts (id, user_id, title) VALUES (?, ?, ?)",
+                         [(i, i % 25, f"post{i}") for i in range(60)])
+    seen = []
+
+    class Recorder:
+        def on_query(self, stats):
+            seen.append(stats)
+    executor.add_observer(Recorder())
+
+    print("Testing per-statement stats...")
+    executor.execute("SELECT name FROM users WHERE name = 'user4'")
+    stats = seen[-1]
+    assert (stats.type, stats.access, stats.rows_scanned, stats.rows_returned) == ("SELECT", "scan", 20, 1)
+    assert stats.sql == "SELECT name FROM users WHERE name = 'user4'" and stats.parse_time > 0
+    executor.execute("SELECT name FROM users WHERE id = 4")
+    assert (seen[-1].access, seen[-1].rows_scanned, seen[-1].index_lookups) == ("index", 1, 1)
+    # A LIMIT stops the scan early
+    executor.execute("SELECT name FROM users LIMIT 3")
+    assert seen[-1].rows_scanned == 3
+
+    executor.execute("CREATE INDEX idx_posts_user ON posts (user_id)")
+    executor.execute("SELECT users.name, posts.title FROM users JOIN posts ON users.id = posts.user_id")
+    stats = seen[-1]
+    assert (stats.join_strategy, stats.rows_scanned, stats.index_lookups, stats.rows_returned) == \
+        ("index_nested_loop", 20, 20, 50)
+    executor.execute("UPDATE posts SET title = 'x' WHERE user_id = 3")
+    stats = seen[-1]
+    assert (stats.access, stats.index_lookups, stats.rows_scanned, stats.rows_affected) == ("index", 1, 3, 3)
+    assert stats.persist_time > 0 and stats.execute_time >= 0
+    assert executor.execute("SELECT * FROM nope").startswith("Error:")
+    assert seen[-1].error is not None
+
+    print("Testing a cursor SELECT is reported once its rows are read...")
+    count = len(seen)
+    cur = executor.cursor().execute("SELECT id FROM posts WHERE user_id = ?", (5,))
+    assert len(cur.fetchall()) == 3 and len(seen) == count + 1
+    assert (seen[-1].rows_returned, seen[-1].rows_scanned) == (3, 3)
+
+    print("Testing EXPLAIN ANALYZE...")
+    res = executor.execute("EXPLAIN ANALYZE SELECT name FROM users WHERE id > 15")
+    print(res)
+    lines = res.split("\n")
+    assert "\n".join(lines[:-2]) == executor.execute("EXPLAIN SELECT name FROM users WHERE id > 15")
+    assert lines[-2] == "Actual: 4 rows returned, 20 rows scanned, 0 index lookups"
+    assert lines[-1].startswith("Time: parse ") and lines[-1].endswith(" ms")
+    # The statement runs: writes are applied
+    res = executor.execute("EXPLAIN ANALYZE DELETE FROM posts WHERE user_id = 7")
+    assert "Actual: 3 rows affected, 3 rows scanned, 1 index lookup" in res
+    assert executor.execute("SELECT id FROM posts WHERE user_id = 7") == "Empty set"
+    assert executor.execute("EXPLAIN ANALYZE EXPLAIN SELECT * FROM users").startswith("Error:")
+
+    print("Testing cumulative metrics and the slow query log...")
+    snapshot = executor.metrics.snapshot()
+    # Metrics also saw the CREATEs and INSERTs run before the recorder was added
+    assert snapshot["queries"] == len(seen) + 4 and snapshot["errors"] == 1
+    assert snapshot["by_type"]["SELECT"] == 8 and snapshot["by_type"]["INSERT"] == 2
+    assert sum(snapshot["histogram_ms"].values()) == snapshot["queries"]
+    assert snapshot["latency_ms"]["p50"] <= snapshot["latency_ms"]["p99"] <= snapshot["latency_ms"]["max"]
+    assert "Queries: " in executor.metrics.format()
+    logged = executor.slow_log.read()
+    assert len(logged) == snapshot["queries"]
+    entry = next(e for e in logged if e["sql"] == "EXPLAIN ANALYZE SELECT name FROM users WHERE id > 15")
+    assert (entry["type"], entry["access"], entry["rows_returned"], entry["rows_scanned"]) == ("SELECT", "scan", 4, 20)
+    executor.metrics.reset()
+    assert executor.metrics.snapshot()["queries"] == 0
+    db.close()
+    print("Instrumentation tests passed!")
+
+def test_statistics():
+    path = "test_db_stats"
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    db = Database(path)
+    executor = SQLExecutor(db)
+    executor.execute("CREATE TABLE orders (id int PK, cust int, status str, amount float)")
+    executor.execute("CREATE TABLE customers (id int PK, region str)")
+    # Skewed: 1% of the orders are open, 5 of the 500 customers are in 'eu'
+    executor.executemany("INSERT INTO orders (id, cust, status, amount) VALUES (?, ?, ?, ?)",
+                         [(i, i % 500, "open" if i % 100 == 0 else "done", None if i % 10 == 0 else i * 0.5)
+                          for i in range(5000)])
+    executor.executemany("INSERT INTO customers (id, region) VALUES (?, ?)",
+                         [(i, "eu" if i < 5 else "us") for i in range(500)])
+
+    print("Testing ANALYZE...")
+    assert executor.execute("ANALYZE orders") == "1 table analyzed."
+    assert executor.execute("ANALYZE") == "2 tables analyzed."
+    stats = db.get_table("orders").statistics
+    assert stats.rows == 5000
+    status, amount, cust = stats.columns["status"], stats.columns["amount"], stats.columns["cust"]
+    # Only values well above the average frequency are kept as common
+    assert status.distinct == 2 and status.mcv == [["done", 0.99]]
+    assert abs(status.eq_fraction("open") - 0.01) < 1e-9 and status.eq_fraction("pending") == 0
+    assert amount.null_frac == 0.1 and (amount.low, amount.high) == (0.5, 2499.5)
+    assert cust.distinct == 500 and not cust.mcv and len(cust.histogram) == 33
+    assert abs(amount.range_fraction(None, 1250.0) - 0.45) < 0.01
+    assert stats.columns["id"].eq_fraction(42) == 1 / 5000
+
+    # Sampled statistics estimate the distinct values of the whole table
+    table = db.get_table("orders")
+    sampled = analyze(table.names, ["int", "int", "str", "float"], table.slots, len(table), sample_rows=1000)
+    assert 300 < sampled.columns["cust"].distinct <= 500 and sampled.columns["id"].distinct > 4000
+
+    print("Testing the planner picks access paths by estimated cost...")
+    executor.execute("CREATE INDEX idx_orders_status ON orders (status)")
+    executor.execute("CREATE INDEX idx_orders_amount ON orders (amount) USING SORTED")
+    assert "INDEX LOOKUP orders USING idx_orders_status" in \
+        executor.execute("EXPLAIN SELECT id FROM orders WHERE status = 'open'")
+    plan = executor.execute("EXPLAIN SELECT id FROM orders WHERE status = 'done'")
+    print(plan)
+    assert "FULL SCAN orders" in plan and "(~4950 rows)" in plan
+    assert "INDEX RANGE SCAN" in executor.execute("EXPLAIN SELECT id FROM orders WHERE amount > 2400")
+    assert "FULL SCAN" in executor.execute("EXPLAIN SELECT id FROM orders WHERE amount > 100")
+    # The more selective of two indexed predicates drives the lookup
+    plan = executor.execute("EXPLAIN SELECT id FROM orders WHERE status = 'done' AND amount BETWEEN 10 AND 20")
+    assert "INDEX RANGE SCAN orders USING idx_orders_amount" in plan
+    assert executor.execute("SELECT COUNT(*) FROM orders WHERE status = 'done' AND amount BETWEEN 10 AND 20") == \
+        "COUNT(*)\n18"
+
+    print("Testing join strategy and build side from estimates...")
+    query = "SELECT customers.region, orders.id FROM orders JOIN customers ON orders.cust = customers.id"
+    assert "HASH JOIN customers ON orders.cust = customers.id (build inner)" in executor.execute("EXPLAIN " + query)
+    # A selective filter leaves few outer rows: build on them instead
+    plan = executor.execute("EXPLAIN SELECT orders.id FROM customers JOIN orders ON customers.id = orders.cust "
+                            "WHERE customers.region = 'eu'")
+    print(plan)
+    assert "(build outer)" in plan and "(~5 rows)" in plan
+    executor.execute("CREATE INDEX idx_orders_cust ON orders (cust)")
+    plan = executor.execute("EXPLAIN SELECT orders.id FROM customers JOIN orders ON customers.id = orders.cust "
+                            "WHERE customers.region = 'eu'")
+    assert "INDEX NESTED LOOP JOIN orders" in plan and "(~50 rows)" in plan
+    assert executor.execute("SELECT orders.id FROM customers JOIN orders ON customers.id = orders.cust "
+                            "WHERE customers.region = 'eu'").count("\n") == 50
+
+    print("Testing statistics are refreshed after enough changes and persisted...")
+    customers = db.get_table("customers")
+    before = customers.statistics
+    executor.execute("UPDATE customers SET region = 'eu' WHERE id < 20")
+    assert customers.changes == 20 and customers.current_statistics() is before
+    executor.execute("UPDATE customers SET region = 'eu' WHERE id < 100")
+    after = customers.current_statistics()
+    assert after is not before and customers.changes == 0
+    assert after.columns["region"].mcv == [["us", 0.8]]
+    db.checkpoint()
+    db2 = Database(path)
+    assert db2.get_table("customers").statistics.columns["region"].mcv == [["us", 0.8]]
+    assert "(~100 rows)" in SQLExecutor(db2).execute("EXPLAIN SELECT id FROM customers WHERE region = 'eu'")
+    db.close()
+    print("Statistics tests passed!")
+
+def test_partitioning():
+    path = "test_db_partition"
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    db = Database(path)
+    executor = SQLExecutor(db)
+    print("Testing PARTITION BY HASH...")
+    assert "created" in executor.execute(
+        "CREATE TABLE events (id int PK, kind str UNIQUE, score int) PARTITION BY HASH(id) INTO 4")
+    executor.executemany("INSERT INTO events (id, kind, score) VALUES (?, ?, ?)",
+                         [(i, f"k{i}", i % 10) for i in range(400)])
+    events = db.get_table("events")
+    assert [len(part) for part in events.parts] == [100, 100, 100, 100] and len(events) == 400
+    assert "Duplicate value 'k7'" in executor.execute("INSERT INTO events (id, kind) VALUES (1000, 'k7')")
+    assert "Duplicate value '7'" in executor.execute("INSERT INTO events (id, kind) VALUES (7, 'new')")
+    assert "Cannot update partition column 'id'" in executor.execute("UPDATE events SET id = 5000 WHERE id = 2")
+
+    print("Testing partition pruning and per-partition scans...")
+    plan = executor.execute("EXPLAIN SELECT * FROM events WHERE id = 42")
+    assert "INDEX LOOKUP events USING id (id = 42) [1 of 4 partitions]" in plan
+    assert "[4 of 4 partitions]" in executor.execute("EXPLAIN SELECT * FROM events WHERE score = 3")
+    assert executor.cursor().execute("SELECT kind FROM events WHERE id = 42").fetchall() == [("k42",)]
+    assert executor.cursor().execute("SELECT id FROM events WHERE kind = 'k43'").fetchall() == [(43,)]
+    assert executor.execute("SELECT COUNT(*) FROM events WHERE score = 3") == "COUNT(*)\n40"
+    executor.execute("CREATE INDEX idx_events_score ON events (score) USING SORTED")
+    cur = executor.cursor().execute("SELECT score FROM events WHERE score >= 8 ORDER BY score DESC LIMIT 3")
+    assert cur.fetchall() == [(9,), (9,), (9,)]
+    cur = executor.cursor().execute("SELECT score FROM events WHERE score BETWEEN 3 AND 4 ORDER BY score")
+    assert [r[0] for r in cur.fetchall()] == [3] * 40 + [4] * 40
+    assert executor.execute("SELECT MAX(score) FROM events") == "MAX(score)\n9"
+    parallel = Database(path, parallel_workers=2, parallel_min_rows=1)
+    assert sorted(parallel.get_table("events").matching_rids(lambda rec: rec[2] == 5)) == \
+        sorted(events.matching_rids(lambda rec: rec[2] == 5))
+
+    print("Testing writes dirty only their partition...")
+    db.checkpoint()
+    assert executor.execute("DELETE FROM events WHERE id = 1") == "1 rows deleted."
+    assert executor.execute("UPDATE events SET score = 100 WHERE id = 5") == "1 rows updated."
+    db.checkpoint()
+    with open(os.path.join(path, "MANIFEST")) as f:
+        segments = json.load(f)["tables"]["events"]["partitions"]
+    assert [segment["delta_rows"] for segment in segments] == [0, 2, 0, 0]
+    assert executor.execute("BEGIN") and executor.execute("DELETE FROM events WHERE score = 100")
+    executor.execute("INSERT INTO events (id, kind) VALUES (1001, 'x')")
+    executor.execute("ROLLBACK")
+    assert len(events) == 399 and executor.execute("SELECT score FROM events WHERE id = 5") == "score\n100"
+
+    print("Testing partitioned tables reload from their segments...")
+    executor.execute("VACUUM events")
+    executor.execute("INSERT INTO events (id, kind, score) VALUES (1002, 'late', 1)")
+    db2 = Database(path)
+    events2 = db2.get_table("events")
+    assert len(events2) == 400 and [len(part) for part in events2.parts] == [100, 99, 101, 100]
+    assert events2.get(events2.lookup("id", 5)[0])["score"] == 100 and events2.lookup("id", 1) == []
+    assert events2.index_defs == [{"name": "idx_events_score", "column": "score", "kind": "sorted"}]
+    assert db2.load_report["events"]["replayed"] == 1
+    assert sorted(f for f in os.listdir(path) if f.startswith("events")) == \
+        ["events.p0.json", "events.p1.json", "events.p2.json", "events.p3.json"]
+    db2.drop_table("events")
+    assert not [f for f in os.listdir(path) if f.startswith("events")]
+    print("Partitioning tests passed!")
+
 if __name__ == "__main__":
     test_sql()
+    test_explain()
+    test_secondary_index()
+    test_ordered_index()
+    test_join_strategies()
+    test_parser_and_prepared()
+    test_compiled_predicates()
+    test_bulk_insert()
+    test_cursor()
+    test_aggregates()
+    test_transactions()
+    test_concurrency()
+    test_network_server()
+    test_result_cache()
+    test_columnar()
+    test_parallel_scan()
+    test_benchmark()
+    test_instrumentation()
+    test_statistics()
+    test_partitioning()
@@ -10,7 +10,8 @@ DB_PATH = "webapp_db"
 
 # Initialize DB
 db = Database(DB_PATH)
-executor = SQLExecutor(db)
+# The task list is read on every page load and changes rarely
+executor = SQLExecutor(db, result_cache_bytes=1024 * 1024, metrics=True)
 
 # Ensure table exists
 try:
@@ -19,6 +20,10 @@ try:
 except:
     pass # Already exists
 
+# Parsed once, bound per request
+add_task = executor.prepare("INSERT INTO tasks (id, content) VALUES (?, ?)")
+delete_task = executor.prepare("DELETE FROM tasks WHERE id = ?")
+
 class SimpleDBHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
         if self.path == "/":
@@ -26,7 +31,9 @@ class SimpleDBHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header("Content-type", "text/html")
             self.end_headers()
             
-            tasks = db.get_table("tasks").select()
+            # Reads under the table's read lock, so other requests can read concurrently
+            cur = executor.cursor().execute("SELECT id, content FROM tasks")
+            tasks = [dict(zip(cur.columns, row)) for row in cur]
             
             html = """
             <!DOCTYPE html>
@@ -139,6 +146,13 @@ class SimpleDBHandler(http.server.SimpleHTTPRequestHandler):
             </html>
             """
             self.wfile.write(html.encode())
+        elif self.path == "/stats":
+            # Cumulative query counters and latency histogram
+            body = json.dumps(executor.metrics.snapshot(), indent=2)
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
         else:
             self.send_error(404)
 
@@ -151,9 +165,7 @@ class SimpleDBHandler(http.server.SimpleHTTPRequestHandler):
             t_id = params['id'][0]
             content = params['content'][0]
             try:
-                # Basic protection for quotes in content
-                content = content.replace("'", "''") 
-                msg = executor.execute(f"INSERT INTO tasks (id, content) VALUES ({t_id}, '{content}')")
+                msg = add_task.execute((int(t_id), content))
                 print(f"ADD: {msg}")
             except Exception as e:
                 print(f"Error adding: {e}")
@@ -161,7 +173,7 @@ class SimpleDBHandler(http.server.SimpleHTTPRequestHandler):
         elif self.path == "/delete":
             t_id = params['id'][0]
             try:
-                msg = executor.execute(f"DELETE FROM tasks WHERE id={t_id}")
+                msg = delete_task.execute((int(t_id),))
                 print(f"DELETE: {msg}")
             except Exception as e:
                 print(f"Error deleting: {e}")
@@ -175,7 +187,11 @@ def run_server():
     print(f"Starting web server on port {PORT}...")
     # Reuse address to prevent 'Address already in use' errors on restart
     socketserver.TCPServer.allow_reuse_address = True
-    http.server.HTTPServer(("", PORT), SimpleDBHandler).serve_forever()
+    # One thread per request: the Database and SQLExecutor are shared and
+    # synchronize through per-table reader/writer locks
+    server = http.server.ThreadingHTTPServer(("", PORT), SimpleDBHandler)
+    server.daemon_threads = True
+    server.serve_forever()
 
 if __name__ == "__main__":
     run_server()